@@ -39,6 +39,8 @@ from naeural_core.business.mixins_base import (
 )
 
 from naeural_core.utils.mixins.code_executor import _CodeExecutorMixin
+from naeural_core.utils.copy_on_write import cow_copy
+from naeural_core.utils.memory_accounting import AccountedDeque
 
 from naeural_core.data_structures import GeneralPayload
 from naeural_core.utils.config_utils import get_now_value_from_time_dict
@@ -56,6 +58,9 @@ _CONFIG = {
   'INSTANCE_COMMAND_LOG': True,  # log the instance command - default TRUE maybe FALSE in future ?
 
   'COPY_IN_MAIN_THREAD': False,  # flag to switch between copying data in main thread on in plugin instance thread
+  # share upstream inputs between instances: arrays become read-only views and the dicts/lists are
+  # copy-on-write wrappers (use `get_writable_image` to draw on frames); overrides COPY_IN_MAIN_THREAD
+  'SHARED_READONLY_INPUTS': False,
   'ENCRYPT_PAYLOAD': False,  # flag to independent toggle payload encryption
   "USE_LOCAL_COMMS_ONLY": False, # flag to switch to local comms only for a particular plugin instance
 
@@ -76,6 +81,13 @@ _CONFIG = {
 
   'LOG_ON_BLOB': False,
 
+  # `cfg_` handlers return cached read-only views of the dict values instead of copies
+  'CONFIG_READONLY_VIEWS': False,
+
+  # encode the payload images on the node-wide encoding pool: the images of a payload are encoded in
+  # parallel and the same frame sent by several instances is encoded only once
+  'WITNESS_ENCODING_POOL': False,
+
   # "WORKING_HOURS"
   #  this should be one of the following options:
   #     - list of lists (as is)
@@ -89,6 +101,9 @@ _CONFIG = {
 
   'PLUGIN_LOOP_RESOLUTION': 20,   # proposed loop res
   'FORCED_LOOP_SLEEP': None,  # use predefined sleep time
+  # max seconds an idle plugin (no inputs, ALLOW_EMPTY_INPUTS=False) waits for new inputs before running its
+  # periodic work - new inputs and config/commands wake up the loop immediately. None keeps the loop resolution
+  'IDLE_LOOP_WAKEUP': 1,
 
   'CLOSE_PIPELINE_WHEN_DONE': False,
 
@@ -652,7 +667,8 @@ class BasePluginExecutor(
         self._scoring_manager = None
         self.P("Exception when creating scorer:\n{}".format(e), color='r')
     # endif TESTING == True
-    self.__upstream_inputs_deque = deque(maxlen=self.cfg_max_inputs_queue_size)
+    # the queue keeps the estimated memory size of the queued inputs - see `get_plugin_queue_memory`
+    self.__upstream_inputs_deque = AccountedDeque(maxlen=self.cfg_max_inputs_queue_size)
     self.reset_exec_counter_after_config()
     return
 
@@ -994,6 +1010,7 @@ class BasePluginExecutor(
 
   def add_to_inputs_deque(self, data):
     self.upstream_inputs_deque.append(data)
+    self.wakeup_loop()
     return
 
   def copy_simple_data(self, dct_data):
@@ -1093,6 +1110,10 @@ class BasePluginExecutor(
     return self.__dct_last_payload
 
   def get_plugin_used_memory(self, return_tree=False):
+    """
+    Deep measurement of the plugin object (without the input queue). Walks the whole object graph so
+    it must not be used on the main loop - use `get_plugin_queue_memory` for the queued inputs.
+    """
     self.start_timer('get_plugin_memory')
     size_o = self.log.get_obj_size(
       obj=self,
@@ -1109,10 +1130,20 @@ class BasePluginExecutor(
     return size_o
 
   def get_plugin_queue_memory(self):
-    self.start_timer('get_plugin_queue_memory')
-    size_q = self.log.get_obj_size(obj=self.upstream_inputs_deque)
-    self.end_timer('get_plugin_queue_memory')
-    return size_q
+    """
+    Returns the estimated memory (bytes) of the queued inputs - tracked when the inputs are queued and
+    consumed, no object graph walk.
+    """
+    return self.upstream_inputs_deque.nbytes
+
+  def get_plugin_queue_memory_status(self):
+    queue = self.upstream_inputs_deque
+    return {
+      'QUEUE_SIZE'  : len(queue),
+      'QUEUE_BYTES' : queue.nbytes,
+      'MAX_BYTES'   : queue.max_nbytes,
+      'AVG_INPUT'   : round(queue.avg_item_nbytes),
+    }
 
   def mainthread_wait_for_plugin(self):
     # now we introduce a yield loop to allow the thread to consume if possible
@@ -1151,7 +1182,11 @@ class BasePluginExecutor(
     # first things first we have to make a instance specific copy of the original data
     # coming from upstream so that we do not modify data such as numpy by mistake across
     # different parallel instances that use same inputs
-    if self.cfg_copy_in_main_thread:
+    if self.cfg_shared_readonly_inputs:
+      self.log.start_timer('mainthr_share')  # this is run in main thread
+      inp = cow_copy(inp)
+      self.log.stop_timer('mainthr_share')
+    elif self.cfg_copy_in_main_thread:
       self.log.start_timer('mainthr_dcopy')  # this is run in main thread
       inp = deepcopy(inp)
       self.log.stop_timer('mainthr_dcopy')
@@ -1170,22 +1205,21 @@ class BasePluginExecutor(
         # now we log the issue for maintenance!
         self._last_logged_queue_full_count = self.queue_full_delays_count
         self._last_logged_queue_full_time = time()
-        # now we measure queue size
+        # queue size is tracked incrementally - no deep measurement of the plugin on the main thread
         queue_size_gb = self.get_plugin_queue_memory() / (1024**3)
-        plugin_size_gb = self.get_plugin_used_memory() / (1024**3)
-        # end measure queue size
+        input_size_mb = self.upstream_inputs_deque.avg_item_nbytes / (1024**2)
         try:
-          info = "Queue ovrflw {} (q:{}), Lps {:.1f} c/cfg: {:.1f}/{:.0f}, Q/P: {:.3f}/{:.3f} GB, lost: {}".format(
+          info = "Queue ovrflw {} (q:{}), Lps {:.1f} c/cfg: {:.1f}/{:.0f}, Q: {:.3f} GB ({:.2f} MB/inp), lost: {}".format(
             self.queue_full_delays_count, self.cfg_max_inputs_queue_size,
             self.actual_plugin_resolution, self.get_plugin_loop_resolution(), self.cfg_plugin_loop_resolution,
-            queue_size_gb, plugin_size_gb,
+            queue_size_gb, input_size_mb,
             self.lost_inputs_count,
           )
         except:
-          info = "Queue ovrflw {} (q:{}), Lps {} c/cfg: {}/{}, Q/P: {}/{} GB, lost: {}".format(
+          info = "Queue ovrflw {} (q:{}), Lps {} c/cfg: {}/{}, Q: {} GB ({} MB/inp), lost: {}".format(
             self.queue_full_delays_count, self.cfg_max_inputs_queue_size,
             self.actual_plugin_resolution, self.get_plugin_loop_resolution(), self.cfg_plugin_loop_resolution,
-            queue_size_gb, plugin_size_gb,
+            queue_size_gb, input_size_mb,
             self.lost_inputs_count,
           )
 
@@ -1228,6 +1262,7 @@ class BasePluginExecutor(
     self.P(ct.BM_PLUGIN_END_PREFIX +
            "[main-thr] Received STOP {} thread command...".format(self.instance_hash), color='b')
     self.done_loop = True
+    self.wakeup_loop()
     self.thread.join(timeout=TIMEOUT)
     is_alive = self.thread.is_alive()
     self.plugins_shared_mem.clean_instance()
@@ -1349,6 +1384,8 @@ class BasePluginExecutor(
       # reset the command for the upstream config
       self._upstream_config['INSTANCE_COMMAND'] = {}  
       upstream_config['INSTANCE_COMMAND'] = {}
+      # an idle plugin must not wait for its idle wakeup interval to see the command
+      self.wakeup_loop()
       return
     # endif is just a command
 
@@ -1698,7 +1735,7 @@ class BasePluginExecutor(
       result = None
       if self.input_queue_size > 0:
         data = self.upstream_inputs_deque.popleft()
-        if not self.cfg_copy_in_main_thread:
+        if not self.cfg_copy_in_main_thread and not self.cfg_shared_readonly_inputs:
           self.start_timer('thread_dcopy')
           result = deepcopy(data)
           self.stop_timer('thread_dcopy')
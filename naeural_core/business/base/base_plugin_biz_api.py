@@ -114,6 +114,7 @@ class _BasePluginAPIMixin:
     self.P("Default plugin `_on_close` called for plugin cleanup at shutdown...")
     self.maybe_archive_upload_last_files()
     self.on_close()
+    self._diskapi_stop_event_recorders()
     return
 
   def on_command(self, data, **kwargs):
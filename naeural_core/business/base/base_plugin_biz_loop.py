@@ -3,9 +3,16 @@ import numpy as np
 
 from time import time, sleep
 from collections import deque
+from threading import Event
 
 from naeural_core import constants as ct
 
+# max wait (seconds) while the loop is stopped by FORCED_PAUSE / DISABLED / WORKING_HOURS - these states
+# are re-evaluated on each config update (that wakes up the loop) or at least once per interval
+STOPPED_WAKEUP_INTERVAL = 1
+# max wait (seconds) while the loop is paused for a config update (resume wakes up the loop)
+PAUSED_WAKEUP_INTERVAL = 0.1
+
 class _BasePluginLoopMixin(object):
   def __init__(self):
     super(_BasePluginLoopMixin, self).__init__()
@@ -19,6 +26,7 @@ class _BasePluginLoopMixin(object):
 
 
     self.__loop_paused = False
+    self.__loop_wakeup = Event()
     self.__plugin_loop_errors = 0
     self.__plugin_exec_errors = 0
     self.__post_error_ok_count = 0    
@@ -83,6 +91,16 @@ class _BasePluginLoopMixin(object):
   @loop_paused.setter
   def loop_paused(self, val: bool):
     self.__loop_paused = val  
+    if not val:
+      self.wakeup_loop()
+    return
+
+  def wakeup_loop(self):
+    """
+    Wakes up the plugin loop if it is waiting (new inputs, config/command updates, stop).
+    Safe to be called from any thread.
+    """
+    self.__loop_wakeup.set()
     return
         
   def pause_loop(self):
@@ -102,6 +120,29 @@ class _BasePluginLoopMixin(object):
   ###########################################################    
   
   
+  def _wait_loop_wakeup(self, timeout):
+    """
+    Blocks the plugin thread until `wakeup_loop` is called or `timeout` seconds passed.
+    """
+    if timeout is not None and timeout <= 0:
+      return False
+    woken = self.__loop_wakeup.wait(timeout)
+    if woken:
+      # clear after wait so any wakeup issued from now on is not lost
+      self.__loop_wakeup.clear()
+    return woken
+
+  def _get_idle_wait_time(self, sleep_time):
+    """
+    A plugin without queued inputs that does not process empty inputs has nothing to do until the
+    next input (that wakes it up) except its own periodic work (alerts, status resend, auto processes)
+    so it can wait longer than the loop resolution.
+    """
+    idle_wakeup = self.cfg_idle_loop_wakeup
+    if idle_wakeup is None or self.cfg_allow_empty_inputs or self.input_queue_size > 0:
+      return sleep_time
+    return max(sleep_time, idle_wakeup)
+
   def _recalc_plugin_resolution(self):
     if self.last_process_time is not None:
       this_lap = self.time_from_last_process
@@ -374,6 +415,7 @@ class _BasePluginLoopMixin(object):
       # get from instance command the standard COMMAND_PARAMS object
       command_kwargs = {}
       if isinstance(command, dict):
+        command = command.copy()
         command_kwargs = command.pop('COMMAND_PARAMS', {})
       # make the kwargs case insensitive
       processed_kwargs = {k.lower():v for k,v in command_kwargs.items()}
@@ -423,7 +465,7 @@ class _BasePluginLoopMixin(object):
       try:
         # START postpone area
         if self.__loop_paused: # triggered when updating config
-          sleep(0.001)          
+          self._wait_loop_wakeup(PAUSED_WAKEUP_INTERVAL)
           continue
         # INSTANCE_COMMAND: if no imposed parallel updating
         # then we can check for instance commands and trigger callback
@@ -432,21 +474,21 @@ class _BasePluginLoopMixin(object):
         
         # PROCESS_DELAY mechanism
         if self.is_process_postponed:  
-          # skip if postpone is required
-          sleep(0.001)
+          # skip if postpone is required - wait for the remaining delay (or a config/command wakeup)
+          self._wait_loop_wakeup(self.cfg_process_delay - self.time_from_last_process)
           continue
         # END PROCESS_DELAY mechanism
         
         # FORCE_PAUSE mechanism
         if self.is_plugin_temporary_stopped: 
-          sleep(0.001)
+          self._wait_loop_wakeup(STOPPED_WAKEUP_INTERVAL)
           continue
         # END FORCE_PAUSE mechanism
 
         self.is_outside_working_hours = self.outside_working_hours
         if self.is_outside_working_hours: # WORKING_HOURS mechanism
           # always skip if outside hours
-          sleep(0.001)
+          self._wait_loop_wakeup(STOPPED_WAKEUP_INTERVAL)
           continue
         # END postpone area
         # no postponing, now outside of scheduling and no pausing so we proceed
@@ -482,16 +524,29 @@ class _BasePluginLoopMixin(object):
         # now we can check if something strange is happening in the loop such as a
         # abnormal duration of the execute
         self.check_loop_exec_time()
-        if self.cfg_forced_loop_sleep is not None:
+        forced_sleep = self.cfg_forced_loop_sleep is not None
+        if forced_sleep:
           sleep_time = self.cfg_forced_loop_sleep
         else:
           sleep_time = max(1 / self.get_plugin_loop_resolution() - it_time, 0.00001)
         # now check for previous errors
+        forced_sleep = forced_sleep or self.has_exec_error or self.has_loop_error
         sleep_time = self.__maybe_handle_exec_errors(sleep_time=sleep_time)
         # end error checking
         self.start_timer('loop_sleep')
-        if sleep_time > 0:
-          sleep(sleep_time)
+        if forced_sleep:
+          # error delays and FORCED_LOOP_SLEEP must not be shortened by incoming inputs
+          if sleep_time > 0:
+            sleep(sleep_time)
+        else:
+          # the loop resolution interval is always kept so steady inputs do not drive the loop faster than
+          # PLUGIN_LOOP_RESOLUTION; only an idle plugin then waits longer - until the next input (or a
+          # config/stop wakeup)
+          if sleep_time > 0:
+            sleep(sleep_time)
+          idle_wait_time = self._get_idle_wait_time(sleep_time)
+          if idle_wait_time > sleep_time:
+            self._wait_loop_wakeup(idle_wait_time - sleep_time)
         self.end_timer('loop_sleep')
       except:
         self._plugin_loop_in_exec = False
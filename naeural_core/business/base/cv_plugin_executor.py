@@ -14,6 +14,7 @@ from .base_plugin_biz import BasePluginExecutor
 from naeural_core.serving.ai_engines import AI_ENGINES
 from naeural_core.business import utils
 from naeural_core.utils import nms
+from naeural_core.utils.detection_batch import DetectionBatch
 from decentra_vision.draw_utils import DrawUtils
 
 from naeural_core.business.mixins_base import _LimitedDataMixin
@@ -44,6 +45,7 @@ _CONFIG = {
   'SORT_MIN_IOU': 0,
   'SORT_MAX_AGE': 3,
   'SORT_MIN_HITS': 1,
+  'SORT_VECTORIZED': False,
 
 
   'PRC_INTERSECT': 0.5,
@@ -170,6 +172,10 @@ _CONFIG = {
     'SORT_MIN_HITS': {
       'TYPE': 'int',
       'DESCRIPTION': 'Number of identifications to be assigned an id.'
+    },
+    'SORT_VECTORIZED': {
+      'TYPE': 'bool',
+      'DESCRIPTION': 'Use the batched (all tracks in one step) Kalman engine for sort tracking mode'
     }
   },
 }
@@ -328,6 +334,12 @@ class CVPluginExecutor(BasePluginExecutor,
       for model, lst_2d in dct_inference.items():
         new_lst_2d = []
         for lst in lst_2d:
+          if isinstance(lst, DetectionBatch):
+            new_batch = lst.filter(lst.prob >= conf_thr)
+            new_batch.set_column('IS_TRUSTED', (new_batch.prob > self.cfg_trusted_prc).astype(int))
+            new_lst_2d.append(new_batch)
+            continue
+          # endif columnar
           new_lst = []
           for elem in lst:
             if isinstance(elem, dict):
@@ -360,7 +372,11 @@ class CVPluginExecutor(BasePluginExecutor,
     if len(self.cfg_object_type) > 0:
       l_filtered = []
       for lst in lst_2d:
-        l_filtered.append([x for x in lst if x[ct.TYPE] in self.cfg_object_type])
+        if isinstance(lst, DetectionBatch):
+          mask = np.array([x in self.cfg_object_type for x in lst.types.tolist()], dtype=bool)
+          l_filtered.append(lst.filter(mask))
+        else:
+          l_filtered.append([x for x in lst if x[ct.TYPE] in self.cfg_object_type])
     else:
       l_filtered = lst_2d
     return l_filtered
@@ -853,7 +869,33 @@ class CVPluginExecutor(BasePluginExecutor,
         type_to_meta_type_map = {type: meta_type for meta_type, types in meta_type_mapping.items() for type in types}
         types_idx = {meta_type: it for it, meta_type in enumerate(meta_types)}
         other_cnt = len(meta_types) + 100
+        # the results go in a new per-instance list: when no other filter was applied the input list is
+        # the upstream one (shared between instances) and its batches are the ones the filtered batches
+        # rows refer to
+        lst_images = list(detector_inferences)
         for i, lst_2d in enumerate(detector_inferences):
+          if isinstance(lst_2d, DetectionBatch):
+            if len(lst_2d) == 0:
+              continue
+            lst_meta = [type_to_meta_type_map.get(x) for x in lst_2d.types.tolist()]
+            type_ids = []
+            for meta_type in lst_meta:
+              if meta_type is not None:
+                type_ids.append(types_idx[meta_type])
+              else:
+                type_ids.append(other_cnt)
+                other_cnt += 1
+            # endfor meta types
+            kept_objects_indexes = nms.class_non_max_suppression(
+              predictions=np.column_stack([lst_2d.tlbr, lst_2d.prob, type_ids]),
+              iou_threshold=nms_iou_thr
+            )
+            # the filtered batch is a new object so the upstream batch (shared between instances) is untouched
+            new_batch = lst_2d.filter(np.asarray(kept_objects_indexes, dtype=bool))
+            new_batch.set_column(ct.META_TYPE, [m for (j, m) in enumerate(lst_meta) if kept_objects_indexes[j]])
+            lst_images[i] = new_batch
+            continue
+          # endif columnar
           # top, left, bottom, right, confidence, class
           tlbrcc = []
           for inf in lst_2d:
@@ -881,11 +923,37 @@ class CVPluginExecutor(BasePluginExecutor,
               predictions=np.array(tlbrcc),
               iou_threshold=nms_iou_thr
             )
-            detector_inferences[i] = [inf for (j, inf) in enumerate(lst_2d) if kept_objects_indexes[j]]
+            lst_images[i] = [inf for (j, inf) in enumerate(lst_2d) if kept_objects_indexes[j]]
         # endfor all images
+        if ai_engine in dct_plugin_inference:
+          dct_plugin_inference = {
+            **dct_plugin_inference,
+            ai_engine: lst_images,
+          }
       # endif len(meta_types) > 0
       return dct_plugin_inference
 
+    def _materialize_plugin_inferences(self, dct_plugin_inference):
+      """
+      Converts the filtered `DetectionBatch` inferences back to lists of dicts. The objects are taken from
+      the materialized global inferences so both views share the same dicts (as in the non-columnar flow).
+      """
+      dct_global_inferences = None
+      dct_result = {}
+      for model, lst_2d in dct_plugin_inference.items():
+        if not any(isinstance(x, DetectionBatch) for x in lst_2d):
+          dct_result[model] = lst_2d
+          continue
+        if dct_global_inferences is None:
+          dct_global_inferences = self.dataapi_images_inferences()
+        lst_global = dct_global_inferences[model]
+        dct_result[model] = [
+          x.select_objects(lst_global[i]) if isinstance(x, DetectionBatch) else x
+          for i, x in enumerate(lst_2d)
+        ]
+      # endfor models
+      return dct_result
+
     def _pre_process(self):
       """
       Pre-process upstream data:
@@ -897,7 +965,8 @@ class CVPluginExecutor(BasePluginExecutor,
         img = self.dataapi_image()
         self._top, self._left, self._bottom, self._right = 0, 0, img.shape[-3], img.shape[-2]
 
-      dct_global_inferences = self.dataapi_images_inferences()
+      # the filters below work directly on the columnar detections (if any) using masks
+      dct_global_inferences = self.dataapi_images_inferences(materialize=False)
 
       dct_plugin_inference = self._filter_confidence_threshold(dct_global_inferences)
       dct_plugin_inference = self._filter_object_types(dct_plugin_inference)
@@ -907,6 +976,8 @@ class CVPluginExecutor(BasePluginExecutor,
         ai_engine=self._get_detector_ai_engine(),
         nms_iou_thr=self.cfg_meta_nms_iou_thr
       )
+      # the tracker and the zone filters work with (and update) the object dicts
+      dct_plugin_inference = self._materialize_plugin_inferences(dct_plugin_inference)
 
       # call tracker
       dct_plugin_inference = self._track_objects(dct_plugin_inference)
@@ -163,6 +163,33 @@ class BusinessManager(Manager):
       total += tpc
     return total
 
+  def get_plugins_queue_memory(self):
+    """
+    Returns the memory (bytes) held by the input queues of the plugin instances from the incremental
+    queue accounting (no object graph walks).
+
+    Returns
+    -------
+    dict
+      PLUGINS: {"stream:signature:instance": bytes}, STREAMS: {stream: bytes}, TOTAL: bytes
+    """
+    dct_plugins, dct_streams = {}, {}
+    instances = list(self._dct_current_instances.keys())
+    for instance in instances:
+      plg = self._dct_current_instances.get(instance)
+      if plg is None or plg.upstream_inputs_deque is None:
+        continue
+      nbytes = plg.get_plugin_queue_memory()
+      sid = plg._stream_id
+      dct_plugins['{}:{}:{}'.format(sid, plg._signature, plg.cfg_instance_id)] = nbytes
+      dct_streams[sid] = dct_streams.get(sid, 0) + nbytes
+    #endfor instances
+    return {
+      'PLUGINS' : dct_plugins,
+      'STREAMS' : dct_streams,
+      'TOTAL'   : sum(dct_plugins.values()),
+    }
+
   def set_loop_stage(self, s):
     self.owner.set_loop_stage(s)
     return
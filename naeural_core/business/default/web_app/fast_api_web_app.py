@@ -5,7 +5,7 @@ import shutil
 from jinja2 import Environment, FileSystemLoader
 
 from naeural_core.business.base.web_app.base_web_app_plugin import BaseWebAppPlugin as BasePlugin
-from naeural_core.utils.uvicorn_fast_api_ipc_manager import get_server_manager
+from naeural_core.utils.uvicorn_fast_api_ipc_manager import get_server_manager, PluginIpcServer
 from naeural_core.utils.fastapi_utils import PostponedRequest
 
 #TODO: move __sign and __get_response from dauth_manager to base_web_app_plugin or fastapi_web_app or utils
@@ -40,6 +40,10 @@ _CONFIG = {
 
   'PROCESS_DELAY': 0,
 
+  # Direct socket channel with the uvicorn app instead of the multiprocessing manager queues: the
+  # requests wake up the plugin loop as soon as they arrive and the replies are read without polling.
+  'DIRECT_IPC': False,
+
   'VALIDATION_RULES': {
     **BasePlugin.CONFIG['VALIDATION_RULES']
   },
@@ -241,11 +245,24 @@ class FastApiWebAppPlugin(BasePlugin):
 
     # FIXME: move to setup_manager method
     self.manager_auth = b'abc'
-    self._manager = get_server_manager(self.manager_auth)
+    self._manager = None
+    self._ipc_server = None
+    self.manager_port = None
+    self.ipc_address = None
     self.postponed_requests = self.deque()
 
-    self.P("manager address: {}", format(self._manager.address))
-    _, self.manager_port = self._manager.address
+    if self.cfg_direct_ipc:
+      self.manager_auth = os.urandom(16).hex().encode()
+      self._ipc_server = PluginIpcServer(
+        auth=self.manager_auth, on_request=self.wakeup_loop, log_func=self.P,
+      )
+      self.ipc_address = self._ipc_server.start()
+      self.P("Direct IPC address: {}".format(self.ipc_address))
+    else:
+      self._manager = get_server_manager(self.manager_auth)
+      self.P("manager address: {}", format(self._manager.address))
+      _, self.manager_port = self._manager.address
+    #endif direct IPC or manager
 
     # Start the FastAPI app
     self.P('Starting FastAPI app...')
@@ -296,9 +313,24 @@ class FastApiWebAppPlugin(BasePlugin):
       'id': id,
       'value': self.__fastapi_process_response(value)
     }
-    self._manager.get_client_queue().put(response)
+    if self._ipc_server is not None:
+      self._ipc_server.send_response(response)
+    else:
+      self._manager.get_client_queue().put(response)
     return
 
+  def __fastapi_get_requests(self):
+    """
+    Returns all the requests received from the web server since the last call.
+    """
+    if self._ipc_server is not None:
+      return self._ipc_server.get_requests()
+    requests = []
+    server_queue = self._manager.get_server_queue()
+    while not server_queue.empty():
+      requests.append(server_queue.get())
+    return requests
+
   def _process(self):
     super(FastApiWebAppPlugin, self)._process()
     new_postponed_requests = []
@@ -334,8 +366,7 @@ class FastApiWebAppPlugin(BasePlugin):
     for request in new_postponed_requests:
       self.postponed_requests.append(request)
     # endfor all new postponed requests
-    while not self._manager.get_server_queue().empty():
-      request = self._manager.get_server_queue().get()
+    for request in self.__fastapi_get_requests():
       id = request['id']
       value = request['value']
 
@@ -362,12 +393,15 @@ class FastApiWebAppPlugin(BasePlugin):
       else:
         self.__fastapi_handle_response(id, value)
       # endif request is postponed
-    # end while
+    # endfor all requests
 
     return None
 
   def on_close(self):
-    self._manager.shutdown()
+    if self._ipc_server is not None:
+      self._ipc_server.stop()
+    if self._manager is not None:
+      self._manager.shutdown()
     super(FastApiWebAppPlugin, self).on_close()
     return
 
@@ -392,6 +426,7 @@ class FastApiWebAppPlugin(BasePlugin):
       'html_files': dct_pages,
       'manager_port': self.manager_port,
       'manager_auth': self.manager_auth,
+      'ipc_address': repr(self.ipc_address),
       'api_title': repr(self.cfg_api_title or self.get_signature()),
       'api_summary': repr(self.cfg_api_summary or f"Ratio1 WebApp created with {self.get_signature()} plugin"),
       'api_description': repr(self.cfg_api_description or self.get_default_description()),
@@ -1,5 +1,7 @@
 from copy import deepcopy
 
+from naeural_core.utils.detection_batch import materialize_inferences
+
 class _DataAPIMixin(object):
   """
   Mixin for `BasePluginExecutor` that transparently handles the work with a plugin instance input.
@@ -190,8 +192,18 @@ class _DataAPIMixin(object):
       """
       return self.dataapi_full_input().get('INPUTS', [])
 
-    def dataapi_inferences(self, squeeze=False):
+    def dataapi_inferences(self, squeeze=False, materialize=True):
       """
+      Parameters
+      ----------
+      squeeze : bool, optional
+        if True and there is only one serving plugin, its list of inferences is returned directly.
+
+      materialize : bool, optional
+        if True (default) the columnar `DetectionBatch` inferences (see `COLUMNAR_DETECTIONS` in the
+        object detection servings) are converted to the classic list of dicts. Plugins that know how to
+        work with the columns can pass False.
+
       Returns
       -------
       dict{str:list}
@@ -211,7 +223,15 @@ class _DataAPIMixin(object):
             ]
           }
       """
-      dct_inferences = self.dataapi_full_input().get('INFERENCES', {})
+      dct_full_input = self.dataapi_full_input()
+      dct_inferences = dct_full_input.get('INFERENCES', {})
+      if materialize:
+        dct_materialized = materialize_inferences(dct_inferences)
+        if dct_materialized is not dct_inferences:
+          # the instance input is private (copied or copy-on-write) so the dicts are built only once
+          dct_full_input['INFERENCES'] = dct_materialized
+          dct_inferences = dct_materialized
+      #endif materialize
       if squeeze and len(dct_inferences) == 1:
         model_name = list(dct_inferences.keys())[0]
         result = dct_inferences[model_name]
@@ -454,6 +474,34 @@ class _DataAPIMixin(object):
       """
       return self.dataapi_specific_image(idx=0, full=full, raise_if_error=raise_if_error)
 
+    def get_writable_image(self, idx=0):
+      """
+      API for obtaining an image that can be modified (drawn on) by the current plugin instance.
+      When `SHARED_READONLY_INPUTS` is enabled the images are read-only views shared by all the instances
+      of the stream so this method makes a private copy (only once per input) and stores it back in the
+      current instance input. Otherwise the image is returned as is.
+
+      Parameters
+      ----------
+      idx : int, optional
+        The index of the image in the images list - see `dataapi_specific_image`
+        The default value is 0
+
+      Returns
+      -------
+      np.ndarray
+        the writable image or None if there is no such image
+      """
+      dct_img = self.dataapi_specific_image(idx=idx, full=True)
+      if dct_img is None:
+        return None
+      img = dct_img.get('IMG')
+      flags = getattr(img, 'flags', None)
+      if flags is not None and not flags.writeable:
+        img = img.copy()
+        dct_img['IMG'] = img
+      return img
+
     def dataapi_struct_datas(self, full=False, as_list=False):
       """
       API for accessing all the structured datas in the 'INPUTS' list
@@ -731,17 +779,22 @@ class _DataAPIMixin(object):
   Section for methods that handle images inferences
   """
   if True:
-    def dataapi_images_inferences(self):
+    def dataapi_images_inferences(self, materialize=True):
       """
       API for accessing just the images inferences.
       Filters the output of `dataapi_inferences`, keeping only the AI engines that run on images
 
+      Parameters
+      ----------
+      materialize : bool, optional
+        see `dataapi_inferences`
+
       Returns
       -------
       dict{str:list}
         the inferences that comes from the images serving plugins configured for the current plugin instance.
       """
-      dct_inferences = self.dataapi_inferences()
+      dct_inferences = self.dataapi_inferences(materialize=materialize)
       dct_inferences_meta = self.dataapi_inferences_meta()
 
       filtered_dct_inferences = {}
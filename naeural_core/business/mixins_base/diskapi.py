@@ -12,9 +12,11 @@ import cv2
 import os
 import zipfile
 import yaml
+from time import time
 from naeural_core import constants as ct
 from typing import List, Union, Tuple
 from naeural_core.local_libraries.vision.ffmpeg_writer import FFmpegWriter
+from naeural_core.utils.video_recorder import VideoWriterService, AsyncVideoHandle, EventVideoRecorder, DropPolicy
 
 def assert_folder(folder : str):
   assert folder in ['data', 'models', 'output']
@@ -556,7 +558,9 @@ class _DiskAPIMixin(object):
   # Video serialization section
   if True:
     def _diskapi_create_video_file(self, filename : str, folder : str, fps : int, str_codec : str,
-                                   frame_size : Tuple[int,int], universal_codec : str = 'XVID'):
+                                   frame_size : Tuple[int,int], universal_codec : str = 'XVID',
+                                   use_async : bool = False, max_queue : int = 64,
+                                   drop_policy : str = DropPolicy.DROP_OLDEST):
       """
       Parameters:
       -----------
@@ -582,6 +586,16 @@ class _DiskAPIMixin(object):
         applies for all codecs except "H264"!
         The default value is "XVID"
 
+      use_async: bool, optional
+        if True the frames are encoded in background by the shared video writing service and
+        `diskapi_write_video_frame` only queues them. The default value is False
+
+      max_queue: int, optional
+        maximum number of frames waiting to be encoded for this video (async only)
+
+      drop_policy: str, optional
+        what happens when the queue is full (async only): "drop_oldest", "drop_newest" or "block"
+
       Returns:
       --------
       _:
@@ -646,40 +660,51 @@ class _DiskAPIMixin(object):
       if handler.isOpened():
         self.P("  Opened video handler for '{}' with codec '{}'".format(video_path, str_codec), color='g')
 
+      if use_async:
+        handler = VideoWriterService(log=self.log).create_handle(
+          writer=handler, path=video_path,
+          max_queue=max_queue, drop_policy=drop_policy,
+        )
       return handler, video_path
 
 
     def diskapi_create_video_file_to_data(self, filename : str, fps : int, str_codec : str,
-                                          frame_size : Tuple[int,int], universal_codec : str = 'XVID'):
+                                          frame_size : Tuple[int,int], universal_codec : str = 'XVID',
+                                          use_async : bool = False):
       """
       Shortcut to `_diskapi_create_video_file`
       """
       return self._diskapi_create_video_file(
         filename=filename, folder='data',
         fps=fps, str_codec=str_codec,
-        frame_size=frame_size, universal_codec=universal_codec
+        frame_size=frame_size, universal_codec=universal_codec,
+        use_async=use_async,
       )
 
     def diskapi_create_video_file_to_models(self, filename : str, fps : int, str_codec : str,
-                                            frame_size : Tuple[int,int], universal_codec : str = 'XVID'):
+                                            frame_size : Tuple[int,int], universal_codec : str = 'XVID',
+                                            use_async : bool = False):
       """
       Shortcut to `_diskapi_create_video_file`
       """
       return self._diskapi_create_video_file(
         filename=filename, folder='models',
         fps=fps, str_codec=str_codec,
-        frame_size=frame_size, universal_codec=universal_codec
+        frame_size=frame_size, universal_codec=universal_codec,
+        use_async=use_async,
       )
 
     def diskapi_create_video_file_to_output(self, filename : str, fps : int, str_codec : str,
-                                            frame_size : Tuple[int,int], universal_codec : str = 'XVID'):
+                                            frame_size : Tuple[int,int], universal_codec : str = 'XVID',
+                                            use_async : bool = False):
       """
       Shortcut to `_diskapi_create_video_file`
       """
       return self._diskapi_create_video_file(
         filename=filename, folder='output',
         fps=fps, str_codec=str_codec,
-        frame_size=frame_size, universal_codec=universal_codec
+        frame_size=frame_size, universal_codec=universal_codec,
+        use_async=use_async,
       )
 
     def diskapi_write_video_frame(self, handler, frame):
@@ -695,6 +720,106 @@ class _DiskAPIMixin(object):
       """
       handler.write(frame)
       return
+
+    def diskapi_close_video_file(self, handler, wait : bool = False):
+      """
+      Parameters:
+      -----------
+      handler: _, mandatory
+        the handler returned by `diskapi_create_video_file`
+
+      wait: bool, optional
+        for async handlers, wait until all the queued frames are written and the file is closed
+      """
+      if isinstance(handler, AsyncVideoHandle):
+        handler.release(wait=wait)
+      else:
+        handler.release()
+      return
+
+    def _diskapi_get_event_recorder(self, key : str, pre_seconds : float = 10, post_seconds : float = 20,
+                                    fps : int = 25):
+      recorders = self.__dict__.setdefault('_diskapi_event_recorders', {})
+      if key not in recorders:
+        recorders[key] = EventVideoRecorder(pre_seconds=pre_seconds, post_seconds=post_seconds, fps=fps)
+      return recorders[key]
+
+    def diskapi_video_event_add_frame(self, frame, key : str = 'default', pre_seconds : float = 10,
+                                      post_seconds : float = 20, fps : int = 25):
+      """
+      Feeds a frame to the event recorder `key` (usually one per stream): while no event clip is recorded
+      the frame is kept in a ring buffer of the last `pre_seconds`; during a clip it is queued for
+      background encoding. The clip is closed `post_seconds` after the last trigger.
+
+      Parameters:
+      -----------
+      frame: np.ndarray, mandatory
+        the frame (it is only referenced while in the pre-event buffer - pass a copy if drawn on later)
+
+      key: str, optional
+        the recorder name
+
+      pre_seconds, post_seconds, fps : optional
+        used only when the recorder is created (first call for `key`)
+
+      Returns:
+      --------
+      str:
+        the path of the clip that was just completed or None
+      """
+      recorder = self._diskapi_get_event_recorder(
+        key=key, pre_seconds=pre_seconds, post_seconds=post_seconds, fps=fps
+      )
+      finished = recorder.add_frame(frame)
+      return finished.path if finished is not None else None
+
+    def diskapi_video_event_trigger(self, filename : str, fps : int, str_codec : str,
+                                    frame_size : Tuple[int,int], key : str = 'default',
+                                    folder : str = 'output', universal_codec : str = 'XVID'):
+      """
+      Starts a clip for the event recorder `key` containing the buffered pre-event frames and the frames
+      received in the next `post_seconds`. If a clip is already recorded it is extended instead (and
+      `filename` is ignored).
+
+      Returns:
+      --------
+      str:
+        full path of the clip
+      """
+      recorder = self._diskapi_get_event_recorder(key=key)
+
+      def create_handler():
+        handler, _ = self._diskapi_create_video_file(
+          filename=filename, folder=folder, fps=fps, str_codec=str_codec,
+          frame_size=frame_size, universal_codec=universal_codec, use_async=True,
+        )
+        return handler
+
+      return recorder.trigger(handle_factory=create_handler).path
+
+    def diskapi_video_event_stop(self, key : str = 'default'):
+      """
+      Closes the clip being recorded (if any) for the event recorder `key`.
+      """
+      recorders = self.__dict__.get('_diskapi_event_recorders', {})
+      if key in recorders:
+        recorders[key].stop()
+      return
+
+    def _diskapi_stop_event_recorders(self, timeout : float = 10):
+      """
+      Closes the clips of all the event recorders and waits (at most `timeout` seconds in total) until
+      they are finalized. Called when the plugin is closed.
+      """
+      recorders = self.__dict__.pop('_diskapi_event_recorders', {})
+      handles = [x.handle for x in recorders.values() if x.handle is not None]
+      for recorder in recorders.values():
+        recorder.stop()
+      deadline = time() + timeout
+      for handle in handles:
+        if not handle.wait_closed(timeout=max(deadline - time(), 0)):
+          self.P("Event clip '{}' not finalized in {}s".format(handle.path, timeout), color='r')
+      return
   # endif
 
   # Dataset save section
@@ -18,6 +18,7 @@ It is intended to be used as a mixin in classes that provide certain attributes
 - self.cfg_sort_min_hits
 - self.cfg_sort_max_age
 - self.cfg_sort_min_iou
+- self.cfg_sort_vectorized
 - self.cfg_linear_max_dist_scale
 - self.cfg_linear_center_dist_weight
 - self.cfg_linear_hw_dist_weight
@@ -190,6 +191,7 @@ class _MultiClassTrackerMixin:
                   sort_min_hits=self.cfg_sort_min_hits,
                   sort_max_age=self.cfg_sort_max_age,
                   sort_min_iou=self.cfg_sort_min_iou,
+                  sort_vectorized=self.cfg_sort_vectorized,
                   max_dist_scale=self.cfg_linear_max_dist_scale,
                   center_dist_weight=self.cfg_linear_center_dist_weight,
                   hw_dist_weight=self.cfg_linear_hw_dist_weight,
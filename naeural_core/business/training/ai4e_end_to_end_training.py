@@ -172,7 +172,7 @@ class Ai4eEndToEndTrainingPlugin(BasePlugin):
     return
 
   def get_auto_deploy(self):
-    auto_deploy = self.cfg_auto_deploy
+    auto_deploy = self.cfg_auto_deploy.copy()
     if 'BOX_ID' not in auto_deploy or "NODE_ADDRESS" not in auto_deploy:
       auto_deploy['BOX_ID'] = auto_deploy.get('BOX_ID', self.ee_id)
       auto_deploy['NODE_ADDRESS'] = auto_deploy.get('NODE_ADDRESS', self.node_addr)
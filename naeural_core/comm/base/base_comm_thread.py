@@ -26,6 +26,8 @@ from naeural_core.comm.mixins import (
 )
 
 from naeural_core.local_libraries import _ConfigHandlerMixin
+from naeural_core.comm.base.payload_serializer import SanitizedPayload, sanitize_payload, dumps_payload
+from naeural_core.io_formatters.binary_envelope import is_binary_envelope, decode_envelope
 
 
 RUN_ON_THREAD = True
@@ -37,6 +39,10 @@ _CONFIG = {
   
   'ENCRYPTED_COMMS': False,       # if True, all comms are end-to-end encrypted
 
+  # if True the payload is sanitized in a single pass (that also replaces the defensive deepcopy) and the
+  # resulting JSON-native dict is dumped only once with the plain json encoder for encryption / wire
+  'SINGLE_PASS_SERIALIZATION': False,
+
   'DEBUG_LOG_PAYLOADS': False,
   'DEBUG_LOG_PAYLOADS_PIPELINES': [],
   'DEBUG_LOG_PAYLOADS_SIGNATURES': [],
@@ -117,6 +123,7 @@ class BaseCommThread(
 
     self._formatter = None
     self._formatter_name = None
+    self._wire_envelope = None
     self._heavy_ops_manager = None
     self._network_monitor: NetworkMonitor = None
 
@@ -156,6 +163,7 @@ class BaseCommThread(
     self._network_monitor: NetworkMonitor = self.shmem['network_monitor']
     self._io_formatter_manager = self.shmem['io_formatter_manager']
     self._formatter, self._formatter_name = self._io_formatter_manager.get_formatter()
+    self._wire_envelope = self._io_formatter_manager.get_wire_envelope()
     if self._formatter_name is not None:
       self._formatter_name = self._formatter_name.lower()
     return
@@ -226,8 +234,12 @@ class BaseCommThread(
   def __sign(self, data):
     if self.bc_engine is not None:
       self.start_timer('bc_sign')
-      # if inplace=True, it will modify the original data and SAVE deepcopy time
-      prepared_data = self.log.replace_nan(data, inplace=True)
+      if isinstance(data, SanitizedPayload):
+        # already cleaned-up by `sanitize_payload` in `_prepare_message`
+        prepared_data = data
+      else:
+        # if inplace=True, it will modify the original data and SAVE deepcopy time
+        prepared_data = self.log.replace_nan(data, inplace=True)
       # TODO: should serialize sets
       # prepared_data = self.log.serialize_sets(prepared_data)
       signature = self.bc_engine.sign(prepared_data, add_data=True, use_digest=True)
@@ -347,6 +359,36 @@ class BaseCommThread(
     
     
 
+  def _destination_accepts_envelope(self, data):
+    """
+    The binary envelope is used only for payloads explicitly addressed to nodes that all advertise
+    the envelope wire format - any other subscriber would not be able to decode it.
+    """
+    if self._wire_envelope is None or not isinstance(data, dict):
+      return False
+    destination = data.get(ct.PAYLOAD_DATA.EE_DESTINATION)
+    if destination is None:
+      return False
+    lst_destinations = destination if isinstance(destination, list) else [destination]
+    if len(lst_destinations) == 0:
+      return False
+    for addr in lst_destinations:
+      if self._wire_envelope.NAME not in self._network_monitor.network_node_wire_formats(addr):
+        return False
+    return True
+
+  def _serialize(self, data):
+    """
+    Returns the wire message for `data`: a binary envelope if the destination supports it, JSON otherwise.
+    """
+    if self._destination_accepts_envelope(data):
+      try:
+        return self._wire_envelope.encode(data)
+      except Exception as exc:
+        self.P("Binary envelope failed, falling back to JSON: {}".format(exc), color='r')
+    #endif binary envelope
+    return self._jsonify(data)
+
   def send_wrapper(self, data):
     """
     This is the "final exit" function that gets called when the only thing left is to
@@ -367,8 +409,9 @@ class BaseCommThread(
     try:
       # next step will add the signature, hash, addr and also cleanup the payload
       signed_data = self.__sign(data)
-      # transform to json
-      message = self._jsonify(signed_data)
+      # transform to json (or binary envelope for capable destinations)
+      message = self._serialize(signed_data)
+      is_binary = is_binary_envelope(message)
       
       # now use custom send
       if self.cfg_debug_log_payloads_revalidate:
@@ -384,7 +427,7 @@ class BaseCommThread(
           self.P("Failed revalidation on dict for {}: {}".format(msg_id, result.message), color='error')
           self._save_raw_payload(signed_data, prefix='_err-d-', pickle=True)
         #endif valid 
-        json_data = json.loads(message)
+        json_data = decode_envelope(message) if is_binary else json.loads(message)
         result = self.bc_engine.verify(json_data)
         if not result.valid:
           self.P("Failed revalidation on json for {}: {}".format(msg_id, result.message), color='error')
@@ -397,7 +440,7 @@ class BaseCommThread(
         self._send(message)
         is_ok = len(message)
         if is_ok > 0 and self.cfg_debug_log_payloads:
-          self.payload_debugger(message)
+          self.payload_debugger(self._jsonify(signed_data) if is_binary else message)
         self.add_outgoing(is_ok)
         self._last_activity = time()
       else:
@@ -438,6 +481,11 @@ class BaseCommThread(
     """
     From data to json. 
     """
+    if isinstance(data, SanitizedPayload):
+      message = dumps_payload(data)
+      if message is not None:
+        return message
+    #endif fast path for already sanitized payloads
     # no need to `replace_nan=True` as the payload is supposed to be already cleaned up
     message = self.log.safe_dumps_json(data, replace_nan=False, ensure_ascii=False)
     return message
@@ -506,7 +554,12 @@ class BaseCommThread(
       incoming_len = len(str_msg)
       self.add_incoming(incoming_len)
       try:
-        json_msg = json.loads(str_msg)
+        if is_binary_envelope(str_msg):
+          json_msg = decode_envelope(str_msg)
+          if json_msg is None:
+            raise ValueError("invalid binary envelope")
+        else:
+          json_msg = json.loads(str_msg)
         self._last_activity = time()
       except:
         self.P("Cannot decode received message '{}'".format(str_msg), color='r')
@@ -589,7 +642,37 @@ class BaseCommThread(
 
     """
     WARNING_TIME = 0.1
-    dct_original = self.deepcopy(msg) # just to cleanup any possible references still forgotten in the payload
+    sequence_number = msg_id  # sequence number for each communicator
+    
+    # TODO: delete below
+    message_id = str(uuid.uuid4())  # unieuq payload ID
+    
+    ee_timestamp = self.log.now_str(nice_print=True, short=False)
+    ee_timezone = self.log.utc_offset
+    ee_tz = self.log.timezone
+
+    dct_header = {
+      ct.PAYLOAD_DATA.EE_TIMESTAMP: ee_timestamp,
+      ct.PAYLOAD_DATA.EE_TIMEZONE: ee_timezone,
+      ct.PAYLOAD_DATA.EE_TZ: ee_tz,
+      ct.PAYLOAD_DATA.EE_MESSAGE_SEQ: sequence_number, # TODO: delete
+      ct.PAYLOAD_DATA.EE_MESSAGE_ID: message_id,  # TODO: delete (left here for backward compatibility)
+      ct.PAYLOAD_DATA.EE_TOTAL_MESSAGES: self.get_message_count(),
+    }
+
+    if self.cfg_single_pass_serialization:
+      # the sanitized copy is built directly on top of the header and it is owned by this thread so
+      # the upstream dict (shared with the other communicators) is never modified
+      dct_outgoing = sanitize_payload(msg, into=dct_header)
+      dct_original = dct_outgoing
+    else:
+      dct_original = self.deepcopy(msg) # just to cleanup any possible references still forgotten in the payload
+      # now lets re-create the payload
+      dct_outgoing = {
+        **dct_header,
+        **dct_original
+      }
+    #endif single pass
     
     ee_encrypted_payload = dct_original.get(
       ct.PAYLOAD_DATA.EE_IS_ENCRYPTED.lower(), 
@@ -613,28 +696,9 @@ class BaseCommThread(
     signature = dct_original.get(ct.PAYLOAD_DATA.SIGNATURE, None)
     instance_id = dct_original.get(ct.PAYLOAD_DATA.INSTANCE_ID, None)
     payload_path = [ee_id, stream_name, signature, instance_id]
-    sequence_number = msg_id  # sequence number for each communicator
-    
-    # TODO: delete below
-    message_id = str(uuid.uuid4())  # unieuq payload ID
-    
-    ee_timestamp = self.log.now_str(nice_print=True, short=False)
-    ee_timezone = self.log.utc_offset
-    ee_tz = self.log.timezone
     ee_version = dct_original.get(ct.PAYLOAD_DATA.EE_VERSION, None)
     ee_event_type = dct_original.get(ct.PAYLOAD_DATA.EE_EVENT_TYPE, None)
 
-    # now lets re-create the payload
-    dct_outgoing = {
-      ct.PAYLOAD_DATA.EE_TIMESTAMP: ee_timestamp,
-      ct.PAYLOAD_DATA.EE_TIMEZONE: ee_timezone,
-      ct.PAYLOAD_DATA.EE_TZ: ee_tz,
-      ct.PAYLOAD_DATA.EE_MESSAGE_SEQ: sequence_number, # TODO: delete
-      ct.PAYLOAD_DATA.EE_MESSAGE_ID: message_id,  # TODO: delete (left here for backward compatibility)
-      ct.PAYLOAD_DATA.EE_TOTAL_MESSAGES: self.get_message_count(),
-      **dct_original
-    }
-
     formatter_name = None
     formatter = None
 
@@ -647,9 +711,12 @@ class BaseCommThread(
       formatter_name = self._formatter_name
       formatter = self._formatter
 
+    is_sanitized = isinstance(dct_outgoing, SanitizedPayload)
     if formatter is not None:
       max_elapsed = WARNING_TIME
       dct_outgoing, elapsed = formatter.encode_output(dct_outgoing)
+      # the formatter output is not guaranteed to be JSON-native anymore
+      is_sanitized = False
       if elapsed >= max_elapsed:
         self.P(
           "Warning! Formatter time above {} for {}: {:.3f}s".format(
@@ -661,7 +728,7 @@ class BaseCommThread(
     # endif we have formatter
 
     dct_outgoing[ct.PAYLOAD_DATA.EE_FORMATTER] = formatter_name    
-    dct_output = {}
+    dct_output = SanitizedPayload() if self.cfg_single_pass_serialization else {}
     
     if destination_addr is None:
       destination_addr, destination_id = None, None
@@ -674,7 +741,9 @@ class BaseCommThread(
     #endif destination    
     if ee_encrypted_payload and destination_addr is not None:
       # encrypt the payload
-      str_data = self.log.safe_json_dumps(dct_outgoing, ensure_ascii=False)
+      str_data = dumps_payload(dct_outgoing) if is_sanitized else None
+      if str_data is None:
+        str_data = self.log.safe_json_dumps(dct_outgoing, ensure_ascii=False)
       str_enc_data = self.bc_engine.encrypt(
         plaintext=str_data,
         receiver_address=destination_addr, # this can be a address or a list of addresses
@@ -686,11 +755,15 @@ class BaseCommThread(
         self.P("Encrypted {} for '{}' <{}>".format(
           payload_path, destination_id, destination_addr))
     else:
-      # just copy data
-      dct_output = {
-        **dct_outgoing,
-        **dct_output,
-      }
+      if is_sanitized:
+        # the sanitized dict is already owned by this thread so no need to copy it again
+        dct_output = dct_outgoing
+      else:
+        # just copy data
+        dct_output = {
+          **dct_outgoing,
+          **dct_output,
+        }
       dct_output[ct.PAYLOAD_DATA.EE_IS_ENCRYPTED] = False
       if ee_encrypted_payload:
         dct_output[ct.PAYLOAD_DATA.EE_ENCRYPTED_DATA] = "ERROR: No receiver address found!"
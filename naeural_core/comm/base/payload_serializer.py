@@ -0,0 +1,78 @@
+"""
+Single-pass payload preparation for the communication threads.
+
+`sanitize_payload` walks an upstream payload exactly once and builds a fresh, JSON-native copy of it:
+containers are re-created (so the communicator owns the result and the upstream dict - that may be shared
+with other communicators - is never touched), NaNs become None, numpy scalars/arrays become python
+numbers/lists and sets/tuples become lists. This replaces the defensive `deepcopy` followed by the
+`replace_nan` pass and, as the result is already JSON-native, it can be dumped with the plain C json
+encoder instead of the "safe" one for encryption and for the wire.
+"""
+
+import json
+import math
+import numpy as np
+
+
+class SanitizedPayload(dict):
+  """
+  Marker type for payloads whose content is already JSON-native (see `sanitize_payload`).
+  """
+  __slots__ = ()
+
+
+def _sanitize_value(value):
+  if isinstance(value, str) or value is None or isinstance(value, bool):
+    return value
+  if isinstance(value, dict):
+    return {k: _sanitize_value(v) for k, v in value.items()}
+  if isinstance(value, (list, tuple, set)):
+    return [_sanitize_value(v) for v in value]
+  if isinstance(value, float):
+    return None if math.isnan(value) else value
+  if isinstance(value, int):
+    return value
+  if isinstance(value, np.ndarray):
+    return _sanitize_value(value.tolist())
+  if isinstance(value, np.bool_):
+    return bool(value)
+  if isinstance(value, np.integer):
+    return int(value)
+  if isinstance(value, np.floating):
+    value = float(value)
+    return None if math.isnan(value) else value
+  # anything else is left to the safe json encoder fallback
+  return value
+
+
+def sanitize_payload(data, into=None):
+  """
+  Builds a JSON-native copy of `data` in a single pass.
+
+  Parameters
+  ----------
+  data : dict
+    the upstream payload. It is not modified.
+
+  into : dict, optional
+    keys that will precede the payload keys in the result (payload keys override them).
+
+  Returns
+  -------
+  SanitizedPayload
+  """
+  result = SanitizedPayload(into or {})
+  for k, v in data.items():
+    result[k] = _sanitize_value(v)
+  return result
+
+
+def dumps_payload(data):
+  """
+  Serializes a `SanitizedPayload` with the C json encoder. Returns None if the payload still contains
+  values that are not JSON-native so the caller can fall back to the safe encoder.
+  """
+  try:
+    return json.dumps(data, ensure_ascii=False, allow_nan=False)
+  except (TypeError, ValueError):
+    return None
@@ -240,6 +240,10 @@ class SERVING:
   SHM_IMG_MAX_SHAPE = (1520, 2688, 3)
   SHM_MAX_LEN = 50
   COMM_METHOD = 'COMM_METHOD'
+  ASYNC_PREDICT = 'ASYNC_PREDICT'
+  MAX_BATCH_SIZE = 'MAX_BATCH_SIZE'
+  MAX_BATCH_LATENCY = 'MAX_BATCH_LATENCY'
+  MAX_PENDING_REQUESTS = 'MAX_PENDING_REQUESTS'
 
 
 class CONFIG_APP_v2:
@@ -364,6 +368,12 @@ class IMAGE_COMPRESSION:
   ORIG_MAX_HEIGHT = 1080
 
 
+class WIRE_FORMAT:
+  JSON = 'json'
+  MSGPACK = 'msgpack'
+  HB_KEY = 'EE_WIRE_FORMATS'
+
+
 class MINIO:
   ACCESS_KEY = 'access_key'
   SECRET_KEY = 'secret_key'
@@ -1350,6 +1360,9 @@ CONFIG_STARTUP_MANDATORY_KEYS = [
 HB_CONTAINS_PIPELINES_ENV_KEY = 'EE_HB_CONTAINS_PIPELINES'
 HB_CONTAINS_ACTIVE_PLUGINS_ENV_KEY = 'EE_HB_CONTAINS_ACTIVE_PLUGINS'
 
+# heartbeat key of the memory held by the plugins input queues (MB per stream and total)
+HB_PLUGINS_QUEUE_MEMORY = 'EE_PLUGINS_QUEUE_MEMORY'
+
 try:
   from constants import *
 except:
@@ -1,31 +1,36 @@
 from functools import partial
 
-from ratio1 import Logger as BaseLogger
-from .logger_mixins import (
-  _AdvancedTFKerasMixin,
-  _BasicPyTorchMixin,
-  _BasicTFKerasMixin,
-  _BetaInferenceMixin,
-  _ComplexNumpyOperationsMixin,
-  _ConfusionMatrixMixin,
-  _DataFrameMixin,
-  _DeployModelsInProductionMixin,
-  _FitDebugTFKerasMixin,
-  _GPUMixin,
-  _GridSearchMixin,
-  _HistogramMixin,
-  _KerasCallbacksMixin,
-  _MachineMixin,
-  _MatplotlibMixin,
-  _MultithreadingMixin,
-  _NLPMixin,
-  _PackageLoaderMixin,
-  _PublicTFKerasMixin,
-  _TF2ModulesMixin,
-  _TimeseriesBenchmakerMixin,
-  _VectorSpaceMixin,
-  _LlmUtilsMixin
-)
+from naeural_core.utils.lazy_import import timed_import, format_import_report, get_import_report, DEFAULT_IMPORT_BUDGET
+
+with timed_import('ratio1'):
+  from ratio1 import Logger as BaseLogger
+
+with timed_import('logger_mixins'):
+  from .logger_mixins import (
+    _AdvancedTFKerasMixin,
+    _BasicPyTorchMixin,
+    _BasicTFKerasMixin,
+    _BetaInferenceMixin,
+    _ComplexNumpyOperationsMixin,
+    _ConfusionMatrixMixin,
+    _DataFrameMixin,
+    _DeployModelsInProductionMixin,
+    _FitDebugTFKerasMixin,
+    _GPUMixin,
+    _GridSearchMixin,
+    _HistogramMixin,
+    _KerasCallbacksMixin,
+    _MachineMixin,
+    _MatplotlibMixin,
+    _MultithreadingMixin,
+    _NLPMixin,
+    _PackageLoaderMixin,
+    _PublicTFKerasMixin,
+    _TF2ModulesMixin,
+    _TimeseriesBenchmakerMixin,
+    _VectorSpaceMixin,
+    _LlmUtilsMixin
+  )
 
 
 class Logger(
@@ -120,8 +125,21 @@ class Logger(
     if TF_KERAS:
       self.check_tf()
 
+    self.log_import_report()
     return
 
+  def log_import_report(self):
+    """
+    Logs the time spent on the imports so far (the heavy libraries are loaded on first use so they are
+    accounted only when they are actually needed).
+    """
+    budget = DEFAULT_IMPORT_BUDGET
+    if isinstance(self.config_data, dict):
+      budget = self.config_data.get('IMPORT_TIME_BUDGET', budget) or budget
+    report = get_import_report(budget=budget)
+    self.verbose_log("  " + format_import_report(budget=budget), color='r' if report['OVER_BUDGET'] else 'g')
+    return report
+
 
 SBLogger = partial(Logger, lib_name='tst', base_folder='.', app_folder='_local_cache')
 
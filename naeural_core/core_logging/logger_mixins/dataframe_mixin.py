@@ -4,7 +4,9 @@ import sys
 from datetime import datetime as dt
 from io import BytesIO, TextIOWrapper
 
-import pandas as pd
+from naeural_core.utils.lazy_import import lazy_import
+
+pd = lazy_import('pandas')
 
 
 class _DataFrameMixin(object):
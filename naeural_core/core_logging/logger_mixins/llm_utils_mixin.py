@@ -1,4 +1,7 @@
-import torch as th
+from naeural_core.utils.lazy_import import lazy_import
+
+# torch is loaded only when a LLM is prepared
+th = lazy_import('torch')
 
 AVAILABLE_WEIGHTS_SIZES = [4, 8, 16, 32]
 DEFAULT_WEIGHTS_SIZE = 16
@@ -4,8 +4,9 @@ import numpy as np
 import abc
 
 from time import sleep, time
-from threading import Thread
+from threading import Thread, Condition
 from collections import deque
+from itertools import chain
 from datetime import datetime
 
 #local dependencies
@@ -14,6 +15,7 @@ from naeural_core import constants as ct
 from naeural_core.data_structures import MetadataObject
 from naeural_core.data.base import BaseDataCapture
 from naeural_core.data.mixins_base import _AquisitionOnIntervalsMixin, _DCTUtilsMixin
+from naeural_core.utils.shm_frame_ring import SharedFrameRing
 
 
 
@@ -24,6 +26,9 @@ _CONFIG = {
   **BaseDataCapture.CONFIG,
   
   'IS_THREAD' : True,
+
+  # `cfg_` handlers return cached read-only views of the dict values instead of copies
+  'CONFIG_READONLY_VIEWS' : False,
   
   'CAP_RESOLUTION'        : 1,
   
@@ -41,6 +46,12 @@ _CONFIG = {
   
   'NR_SKIP_FRAMES'        : None, 
   
+  ## ZERO-COPY FRAMES
+  'USE_SHM_FRAME_RING'    : False, # frames are written directly in a per-stream shared memory ring
+  'SHM_FRAME_RING_SLOTS'  : 32,    # max frames alive at the same time (DCT queue, plugins, serving)
+  'SHM_FRAME_RING_RETRY'  : 60,    # seconds before retrying a failed ring creation (doubles on each failure)
+  ## END ZERO-COPY FRAMES
+  
   ## SERIALIZATION & PERSISTENCE
   'LOAD_PREVIOUS_SERIALIZATION'   : False,
   'SERIALIZATION_SIGNATURE'       : None,
@@ -79,7 +90,11 @@ class DataCaptureThread(BaseDataCapture,
   def __init__(self, **kwargs):
     self._phase = None
     self._deque = None
+    self._deque_cond = Condition()
     self._thread = None
+    self._frame_ring = None
+    self._frame_ring_failures = 0
+    self._frame_ring_retry_time = 0
     self._stop = False
     self._register_timers = REGISTER_TIMERS
     self._DPS = -1
@@ -99,6 +114,14 @@ class DataCaptureThread(BaseDataCapture,
     self._timers_section = None
     self.__last_add_input_timestamp = time()
 
+    # backpressure stats
+    self.__producer_waits = 0
+    self.__producer_wait_time = 0
+    self.__last_producer_wait = 0
+    self.__max_producer_wait = 0
+    self.__nr_overwritten = 0
+    self.__last_batch_len = 0
+
     self._metadata = MetadataObject(
       current_interval=None,
       payload_context=None,
@@ -285,6 +308,106 @@ class DataCaptureThread(BaseDataCapture,
     return self.log.end_timer(sname=tmr_id, section=self._timers_section, skip_first_timing=skip_first_timing, periodic=periodic)
   
   
+  def _maybe_create_frame_ring(self, nbytes):
+    """
+    Lazily (re)creates the shared frame ring so that a slot fits frames of `nbytes`. Frames of a stream
+    usually have the same size so this happens once, or after a resolution change.
+    If the creation fails the frames are allocated as usual (returns None) until the retry time - the
+    interval doubles on each consecutive failure.
+    """
+    if self._frame_ring is not None and nbytes <= self._frame_ring.slot_bytes:
+      return self._frame_ring
+    if time() < self._frame_ring_retry_time:
+      return None
+    if self._frame_ring is not None:
+      self.P("Frame of {} bytes does not fit in {}. Re-creating ring...".format(nbytes, self._frame_ring), color='y')
+      self._frame_ring.shutdown()
+      self._frame_ring = None
+    ring = SharedFrameRing(
+      stream=self.cfg_name,
+      nr_slots=self.cfg_shm_frame_ring_slots,
+      slot_bytes=nbytes,
+      log=self.log,
+    )
+    if not ring.initialized:
+      ring.shutdown()
+      retry_interval = self.cfg_shm_frame_ring_retry * 2 ** min(self._frame_ring_failures, 4)
+      self._frame_ring_failures += 1
+      self._frame_ring_retry_time = time() + retry_interval
+      self.P("Frame ring unavailable, using regular frames for the next {}s".format(retry_interval), color='r')
+      return None
+    self._frame_ring_failures = 0
+    self._frame_ring_retry_time = 0
+    self._frame_ring = ring
+    return self._frame_ring
+
+
+  def reserve_frame(self, shape, dtype='uint8'):
+    """
+    Returns a writable ndarray backed by the stream shared frame ring (if `USE_SHM_FRAME_RING` is enabled)
+    so the DCT can decode/convert the frame directly in shared memory. Returns None if the ring is disabled
+    or full - in this case the DCT must allocate the frame as usual.
+
+    Parameters
+    ----------
+    shape : tuple
+      shape of the frame.
+      
+    dtype : str, optional
+      type of the frame. The default is 'uint8'.
+    """
+    if not self.cfg_use_shm_frame_ring:
+      return None
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    ring = self._maybe_create_frame_ring(nbytes)
+    if ring is None:
+      return None
+    return ring.reserve(shape, dtype)
+
+
+  def _maybe_move_frame_to_ring(self, img):
+    if not self.cfg_use_shm_frame_ring or not isinstance(img, np.ndarray):
+      return img
+    ring = self._maybe_create_frame_ring(img.nbytes)
+    if ring is None:
+      return img
+    return ring.put(img)
+
+
+  def get_backpressure_status(self):
+    """
+    Returns the DCT queue fill and the time the producer (acquisition) spent waiting for the consumer
+    (only buffered - non live - streams wait, live streams overwrite the unconsumed data).
+    """
+    if self._deque is None:
+      return None
+    maxlen = self._deque.maxlen
+    queue_len = len(self._deque)
+    return {
+      'QUEUE'           : queue_len,
+      'QUEUE_MAX'       : maxlen,
+      'FILL'            : round(queue_len / maxlen, 2) if maxlen else 0,
+      'LAST_BATCH'      : self.__last_batch_len,
+      'PROD_WAITS'      : self.__producer_waits,
+      'PROD_WAIT_TIME'  : round(self.__producer_wait_time, 3),
+      'PROD_LAST_WAIT'  : round(self.__last_producer_wait, 3),
+      'PROD_MAX_WAIT'   : round(self.__max_producer_wait, 3),
+      'OVERWRITTEN'     : self.__nr_overwritten,
+    }
+
+
+  def get_frame_ring_status(self):
+    if self._frame_ring is None:
+      return None
+    return self._frame_ring.get_status()
+
+  def get_decode_schedule_status(self):
+    """
+    Returns the node decode scheduler decision for this capture (only for the video streams that use it).
+    """
+    return None
+
+
   def reset_received_first_data(self):
     self.__has_received_data = False
     return
@@ -335,6 +458,7 @@ class DataCaptureThread(BaseDataCapture,
     if img is not None:
       assert struct_data is None
       _type = 'IMG'
+      img = self._maybe_move_frame_to_ring(img)
 
     if struct_data is not None or init_data is not None:
       assert img is None
@@ -494,26 +618,39 @@ class DataCaptureThread(BaseDataCapture,
 
     if not self.cfg_live_feed:
       #if in `buffer` mode and the buffer is full, wait the buffer to release a position and then add a new item
-      tm_add_inputs_start = time()
-      while True:
-        # break loop if stop or config change
-        if self._stop or self._loop_paused:
-          self.P("Skipping {} frames! STOP:{}  LOOP_PAUSED:{}".format(len(inputs), self._stop, self._loop_paused), color='r')
-          break
-        # very important: update if maxlen==1 although this is already taken care by self.cfg_live_feed
-        elif ((len(self._deque) == self._deque.maxlen) and (self._deque.maxlen > 1)): 
-          self.sleep(0.05)
-          # # now check if too much time wasted          
-          # TODO(AID): add a flag that enables this
-          # if (time() - tm_add_inputs_start) > 2:
-          #   # maybe too much time wasted here so break it
-          #   break
-        else:
-          break
-        #endif
-      #endwhile
+      with self._deque_cond:
+        tm_add_inputs_start = None
+        while True:
+          # break loop if stop or config change
+          if self._stop or self._loop_paused:
+            self.P("Skipping {} frames! STOP:{}  LOOP_PAUSED:{}".format(len(inputs), self._stop, self._loop_paused), color='r')
+            break
+          # very important: update if maxlen==1 although this is already taken care by self.cfg_live_feed
+          elif ((len(self._deque) == self._deque.maxlen) and (self._deque.maxlen > 1)): 
+            if tm_add_inputs_start is None:
+              tm_add_inputs_start = time()
+              self.__producer_waits += 1
+            # woken up by the consumer as soon as it drains the deque, the timeout only covers
+            # stop/pause that are not signalled on this condition
+            self._deque_cond.wait(timeout=0.1)
+          else:
+            break
+          #endif
+        #endwhile
+        if tm_add_inputs_start is not None:
+          elapsed = time() - tm_add_inputs_start
+          self.__producer_wait_time += elapsed
+          self.__last_producer_wait = elapsed
+          self.__max_producer_wait = max(self.__max_producer_wait, elapsed)
+        #endif record wait
+        self._deque.append(inputs)
+      #endwith condition
+    else:
+      if len(self._deque) == self._deque.maxlen:
+        # live feed: the previous (not yet consumed) data is overwritten
+        self.__nr_overwritten += 1
+      self._deque.append(inputs)
     #endif
-    self._deque.append(inputs)
     self.__last_add_input_timestamp = time()
     return
   
@@ -622,8 +759,9 @@ class DataCaptureThread(BaseDataCapture,
       # and receive the last observation
       if len(self._deque) > 0 and not self._stop:
         self.P("thread waiting for manager to consume the queue...")
-      while len(self._deque) > 0 and not self._stop:
-        sleep(1)
+      with self._deque_cond:
+        while len(self._deque) > 0 and not self._stop:
+          self._deque_cond.wait(timeout=1)
       
       # THIS SHOULD BE DEFINED IN SUBCLASS
       self._release()
@@ -668,14 +806,17 @@ class DataCaptureThread(BaseDataCapture,
 
     if self.cfg_live_feed:
       all_inputs = self._deque.pop()
+      self.__last_batch_len = 1
     else:
-      all_inputs = []
-      # TODO: review below section
-      for _ in range(self.cfg_stream_window):
-        if len(self._deque) == 0:
-          break
-        all_inputs += self._deque.popleft()
-      #endfor
+      # drain up to STREAM_WINDOW captures in one go and wake up the (maybe) waiting producer
+      with self._deque_cond:
+        n_batch = min(self.cfg_stream_window, len(self._deque))
+        lst_batch = [self._deque.popleft() for _ in range(n_batch)]
+        if n_batch > 0:
+          self._deque_cond.notify_all()
+      #endwith
+      all_inputs = list(chain.from_iterable(lst_batch))
+      self.__last_batch_len = n_batch
     #endif
 
     metadata = self._stream_metadata
@@ -723,10 +864,15 @@ class DataCaptureThread(BaseDataCapture,
   
   def stop(self, join_time=10):
     self._stop = True
+    with self._deque_cond:
+      # release any producer waiting for free space
+      self._deque_cond.notify_all()
     if join_time:
       self._thread.join(join_time)
     self._deque.clear()
     self._reset_state()
+    if self._frame_ring is not None:
+      self._frame_ring.shutdown()
     return  
     
     
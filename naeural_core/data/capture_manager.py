@@ -9,6 +9,8 @@ from collections import OrderedDict
 from naeural_core.manager import Manager
 from naeural_core import Logger
 from naeural_core.local_libraries import _ConfigHandlerMixin
+from naeural_core.utils.shm_frame_ring import get_readonly_frame_view
+from naeural_core.data.decode_scheduler import get_decode_scheduler_status
 
 DEFAULT_DISALLOWED_URL_DUPLICATES = ['VIDEOSTREAM']
 WARNING_REDISPLAY_TIME = 30
@@ -344,6 +346,24 @@ class CaptureManager(Manager, _ConfigHandlerMixin):
     #endif
     return has_data, captured_data
 
+  def _get_metastream_input(self, dct_inp, dct_stream_data, copy_inputs):
+    """
+    Prepares a collected stream input for a meta-stream. Unless the meta-stream declares that it
+    mutates pixels (`POST_PROCESS_MUTATES_PIXELS`) no deep copy is made: the image is shared as
+    a read-only view and the input metadata is layered with the stream metadata in a new dict.
+    """
+    if copy_inputs:
+      dct_res = deepcopy(dct_inp)
+    else:
+      dct_res = {**dct_inp}
+      dct_res['IMG'] = get_readonly_frame_view(dct_inp.get('IMG'))
+    dct_res['METADATA'] = {
+      **dct_inp['METADATA'],
+      **dct_stream_data['STREAM_METADATA'],
+      'SOURCE_STREAM_NAME' : dct_stream_data['STREAM_NAME'],
+    }
+    return dct_res
+
   def _aggregate_captured_data_in_metastreams(self, dct_captured_data):
     """
     This function populates meta-streams with data from normal DCTs
@@ -359,6 +379,7 @@ class CaptureManager(Manager, _ConfigHandlerMixin):
         all_collected_streams = capture.cfg_collected_streams
         lst_datas = []
         call_metastream_post_process = True
+        copy_inputs = capture.config_data.get('POST_PROCESS_MUTATES_PIXELS', True)
         for collected_stream in all_collected_streams:
           ### if any of the collected streams is not captured, then the meta-stream can't feed data because errors may occur (unless it is not configured to be loose: "IS_LOOSE")
           if collected_stream not in dct_captured_data:
@@ -373,14 +394,12 @@ class CaptureManager(Manager, _ConfigHandlerMixin):
           crt_inputs = dct_captured_data[collected_stream]['INPUTS']
           self.log.start_timer('prepare_meta_capture_data')
           for dct_inp in crt_inputs:
-            # we take each input and deep-copy it
-            dct_res = deepcopy(dct_inp)
-            # now we add original metadata & other info
-            dct_res['METADATA'] = {
-              **dct_res['METADATA'],
-              **dct_captured_data[collected_stream]['STREAM_METADATA'],
-              **{'SOURCE_STREAM_NAME' : dct_captured_data[collected_stream]['STREAM_NAME']}
-            }
+            # we take each input and copy it only if the meta-stream will alter the pixels
+            dct_res = self._get_metastream_input(
+              dct_inp=dct_inp,
+              dct_stream_data=dct_captured_data[collected_stream],
+              copy_inputs=copy_inputs,
+            )
             lst_datas.append(dct_res)
           self.log.stop_timer('prepare_meta_capture_data')
         # endfor each collected stream (if any)
@@ -522,6 +541,9 @@ class CaptureManager(Manager, _ConfigHandlerMixin):
           'FAILS'       : capture.nr_connection_issues,
           'NOW'         : now_str,
           'GET_DPS'     : capture.generate_resolution,
+          'FRAME_RING'  : capture.get_frame_ring_status(),
+          'BACKPRESSURE': capture.get_backpressure_status(),
+          'DECODE'      : capture.get_decode_schedule_status(),
         }
         dct_msg['Status'].append(dct_cap_status[key]['FLOW'])
         dct_msg['Name'].append(key[:name_maxlen])
@@ -603,6 +625,9 @@ class CaptureManager(Manager, _ConfigHandlerMixin):
           title, pd.DataFrame(dct_msg),
           all_cap_timer.lstrip()
         )
+        decode_status = get_decode_scheduler_status()
+        if decode_status is not None:
+          info_text += "\nDecode scheduler: {}".format(decode_status)
         pd.set_option("display.float_format", prec)
       #endif
       self.P(info_text, color='r' if is_alert else 'g')
@@ -0,0 +1,242 @@
+"""
+Node-wide decode scheduler for the video stream DCTs.
+
+Each video DCT decodes its stream in its own thread (`grab` loops followed by `retrieve`). Left alone,
+each stream tunes its own rate based on its own timings and, with tens of streams on the same CPU, the
+independent heuristics fight each other. The scheduler owns the node decode budget (seconds of decoding
+per wall-clock second, i.e. roughly the number of cores given to decoding) and splits it between the
+registered streams.
+
+Cost model of a stream decoding at `dps` frames/s from a `fps` source, where `g` is the mean cost of a
+`grab` and `r` the mean cost of a `retrieve` (both measured by the streams as thread CPU time, so the
+time a live source blocks waiting for its next frame is not counted, and smoothed):
+  cost(dps) = fps * g + dps * (g + r)
+the first term is the cost of staying live (all the frames must be grabbed) and the second one the cost
+of the delivered frames.
+
+Allocation (every `interval` seconds):
+  - if the total cost at the target DPS of all streams fits in the budget each stream gets its target
+  - otherwise the budget left after the fixed costs is water-filled by priority: each stream gets a share
+    proportional to its priority, capped at its target; the leftovers of the capped streams go to the
+    others. No stream goes below `min_dps`.
+A new allocation is applied to a stream only if it differs by more than `hysteresis` from the current one
+so the streams do not oscillate around the budget.
+"""
+import os
+
+from threading import Lock
+from time import time
+
+from naeural_core.utils.singletons import Singleton
+
+DEFAULT_CPU_SHARE = 0.5     # fraction of the cores given to decoding when no budget is configured
+DEFAULT_INTERVAL = 5        # seconds between two allocations
+DEFAULT_MIN_DPS = 0.5
+DEFAULT_HYSTERESIS = 0.1
+DEFAULT_STALE_TIME = 30     # streams that did not report for this long do not take part in the allocation
+COST_ALPHA = 0.2            # smoothing factor of the measured costs
+
+
+class _StreamInfo:
+  def __init__(self, name, priority, target_dps, fps):
+    self.name = name
+    self.priority = priority
+    self.target_dps = target_dps
+    self.fps = fps
+    self.grab_cost = None
+    self.retrieve_cost = None
+    self.allocated_dps = None
+    self.last_report = time()
+    return
+
+  def update_cost(self, grab_time, nr_grabs, retrieve_time):
+    if nr_grabs > 0:
+      grab_cost = grab_time / nr_grabs
+      if self.grab_cost is None:
+        self.grab_cost = grab_cost
+      else:
+        self.grab_cost += COST_ALPHA * (grab_cost - self.grab_cost)
+    if self.retrieve_cost is None:
+      self.retrieve_cost = retrieve_time
+    else:
+      self.retrieve_cost += COST_ALPHA * (retrieve_time - self.retrieve_cost)
+    self.last_report = time()
+    return
+
+  @property
+  def fixed_cost(self):
+    return (self.fps or 0) * (self.grab_cost or 0)
+
+  @property
+  def frame_cost(self):
+    return (self.grab_cost or 0) + (self.retrieve_cost or 0)
+
+
+class DecodeScheduler(Singleton):
+  def build(self, budget=None, interval=DEFAULT_INTERVAL, min_dps=DEFAULT_MIN_DPS,
+            hysteresis=DEFAULT_HYSTERESIS):
+    self.interval = interval
+    self.min_dps = min_dps
+    self.hysteresis = hysteresis
+    self.budget = None
+    self.set_budget(budget)
+    self._streams = {}
+    self._lock = Lock()
+    self._last_allocation = 0
+    self._last_required = 0
+    self._nr_allocations = 0
+    return
+
+  def P(self, s, color=None, **kwargs):
+    return self.log.P('[DSCH] ' + s, color=color, **kwargs)
+
+  def set_budget(self, budget):
+    """
+    Sets the node decode budget in seconds per second. None or <= 0 means a share of the cores.
+    """
+    if budget is None or budget <= 0:
+      budget = max((os.cpu_count() or 1) * DEFAULT_CPU_SHARE, 1)
+    self.budget = float(budget)
+    return
+
+  def register(self, name, priority=1, target_dps=None, fps=None):
+    """
+    Registers (or updates) a stream. Called by the video DCTs on each iteration so configuration
+    changes are seen immediately.
+    """
+    with self._lock:
+      info = self._streams.get(name)
+      if info is None:
+        info = _StreamInfo(name=name, priority=priority, target_dps=target_dps, fps=fps)
+        self._streams[name] = info
+        self._last_allocation = 0
+      else:
+        if info.target_dps != target_dps or info.priority != priority:
+          self._last_allocation = 0
+        info.priority, info.target_dps, info.fps = priority, target_dps, fps
+    return
+
+  def unregister(self, name):
+    with self._lock:
+      if self._streams.pop(name, None) is not None:
+        self._last_allocation = 0
+    return
+
+  def report(self, name, grab_time, nr_grabs, retrieve_time):
+    """
+    Reports the timings of one acquisition iteration: `nr_grabs` grabs that took `grab_time` CPU seconds
+    in total followed by a retrieve (or a full read with `nr_grabs=0`) that took `retrieve_time` CPU seconds.
+    """
+    with self._lock:
+      info = self._streams.get(name)
+      if info is not None:
+        info.update_cost(grab_time=grab_time, nr_grabs=nr_grabs, retrieve_time=retrieve_time)
+    return
+
+  def get_allocation(self, name):
+    """
+    Returns the DPS allocated to the stream or None if the stream should decode at its own target.
+    """
+    with self._lock:
+      if (time() - self._last_allocation) >= self.interval:
+        self._allocate()
+      info = self._streams.get(name)
+      return None if info is None else info.allocated_dps
+
+  def _allocate(self):
+    now = time()
+    active = [
+      x for x in self._streams.values()
+      if (now - x.last_report) < DEFAULT_STALE_TIME and x.target_dps and x.frame_cost > 0
+    ]
+    new_dps = {x.name: x.target_dps for x in active}
+    required = sum(x.fixed_cost + x.target_dps * x.frame_cost for x in active)
+    if required > self.budget:
+      left = self.budget - sum(x.fixed_cost for x in active)
+      unsaturated = list(active)
+      while left > 0 and len(unsaturated) > 0:
+        total_priority = sum(x.priority for x in unsaturated)
+        capped = []
+        for x in unsaturated:
+          dps = (left * x.priority / total_priority) / x.frame_cost
+          if dps >= x.target_dps:
+            capped.append(x)
+        #endfor
+        if len(capped) == 0:
+          for x in unsaturated:
+            new_dps[x.name] = (left * x.priority / total_priority) / x.frame_cost
+          break
+        for x in capped:
+          # capped streams get their target and give back the rest of their share
+          left -= x.target_dps * x.frame_cost
+          unsaturated.remove(x)
+        #endfor
+      #endwhile water-filling
+      if left <= 0:
+        for x in unsaturated:
+          new_dps[x.name] = 0
+      for x in active:
+        new_dps[x.name] = round(max(min(new_dps[x.name], x.target_dps), self.min_dps), 1)
+    #endif over budget
+
+    changes = []
+    for x in self._streams.values():
+      if x.name not in new_dps:
+        continue
+      dps = new_dps[x.name]
+      dps = None if dps >= x.target_dps else dps
+      current = x.allocated_dps
+      if dps is None or current is None:
+        changed = dps != current
+      else:
+        changed = abs(dps - current) > self.hysteresis * current
+      if changed:
+        changes.append((x.name, current, dps))
+        x.allocated_dps = dps
+    #endfor apply
+    if len(changes) > 0:
+      self.P("Decode budget {:.2f}s/s, required {:.2f}s/s for {} streams. Changes: {}".format(
+        self.budget, required, len(active),
+        ", ".join("{}: {}->{}".format(name, old, new) for name, old, new in changes),
+      ), color='m')
+    self._last_required = required
+    self._last_allocation = now
+    self._nr_allocations += 1
+    return
+
+  def get_stream_status(self, name):
+    with self._lock:
+      info = self._streams.get(name)
+      if info is None:
+        return None
+      return {
+        'PRIORITY'    : info.priority,
+        'TARGET_DPS'  : info.target_dps,
+        'ALLOC_DPS'   : info.allocated_dps if info.allocated_dps is not None else info.target_dps,
+        'GRAB_MS'     : round(info.grab_cost * 1000, 2) if info.grab_cost is not None else None,
+        'RETRIEVE_MS' : round(info.retrieve_cost * 1000, 2) if info.retrieve_cost is not None else None,
+        'COST'        : round(info.fixed_cost + (info.allocated_dps or info.target_dps or 0) * info.frame_cost, 3),
+      }
+
+  def get_status(self):
+    with self._lock:
+      used = sum(
+        x.fixed_cost + (x.allocated_dps or x.target_dps or 0) * x.frame_cost
+        for x in self._streams.values()
+      )
+      return {
+        'BUDGET'      : round(self.budget, 2),
+        'REQUIRED'    : round(self._last_required, 3),
+        'USED'        : round(used, 3),
+        'STREAMS'     : len(self._streams),
+        'THROTTLED'   : sum(x.allocated_dps is not None for x in self._streams.values()),
+        'ALLOCATIONS' : self._nr_allocations,
+      }
+
+
+def get_decode_scheduler_status():
+  """
+  Returns the scheduler summary or None if no stream uses the scheduler.
+  """
+  instance = getattr(DecodeScheduler, '_instance', None)
+  return None if instance is None else instance.get_status()
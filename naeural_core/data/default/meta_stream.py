@@ -34,6 +34,11 @@ _CONFIG = {
   'IS_THREAD'         : False,
   'COLLECTED_STREAMS' : [],
   
+  # By default the meta-stream receives read-only views of the collected images (shared with the
+  # original streams) and a shallow copy of their metadata. Set this to True if `post_process_inputs`
+  # modifies the pixels of the images in-place and it needs its own deep copy of the inputs.
+  'POST_PROCESS_MUTATES_PIXELS' : False,
+  
   
   'VALIDATION_RULES' : {
     **BaseDataCapture.CONFIG['VALIDATION_RULES'],
@@ -9,10 +9,11 @@ import numpy as np
 import cv2
 import traceback
 from naeural_core import constants as ct
-from time import sleep
+from time import sleep, time, thread_time
 
 from naeural_core.data.base import DataCaptureThread
 from naeural_core.data.mixins_libs import _VideoConfigMixin
+from naeural_core.data.decode_scheduler import DecodeScheduler
 
 _CONFIG = {
   **DataCaptureThread.CONFIG,
@@ -29,6 +30,10 @@ _CONFIG = {
   "CONFIGURED_H": -1,
   "CONFIGURED_W": -1,
 
+  # share the node decode budget (`DECODE_BUDGET` startup config) with the other video streams
+  # instead of using the per-stream read time heuristic
+  "DECODE_SCHEDULER": False,
+  "DECODE_PRIORITY": 1,
 
   'VALIDATION_RULES': {
     **DataCaptureThread.CONFIG['VALIDATION_RULES'],
@@ -36,7 +41,18 @@ _CONFIG = {
     "AMD_TARGET_DPS": {
       "DESCRIPTION": "For AMD architectures (as of 2023-04-28 with no plans to use also on Intel) forces number of grabs per iteration based on the target required DPS. Set this to 3 for example to (hopefully) get 3 FPS on a 15 FPS camera",
       "TYPE": "int"
-    }
+    },
+
+    "DECODE_SCHEDULER": {
+      "DESCRIPTION": "Use the node-wide decode scheduler that splits the node decode budget between all the video streams by priority and target DPS",
+      "TYPE": "bool"
+    },
+
+    "DECODE_PRIORITY": {
+      "DESCRIPTION": "Weight of the stream in the decode budget split when the node cannot decode all the streams at their target DPS",
+      "TYPE": "float",
+      "MIN_VAL": 0.01,
+    },
   },
 }
 
@@ -48,6 +64,7 @@ class VideoStreamCv2DataCapture(DataCaptureThread, _VideoConfigMixin):
     self._capture = None
     self._crt_frame = 0
     self.__configured_size_error = False
+    self.__decode_scheduler = None
 
     super(VideoStreamCv2DataCapture, self).__init__(**kwargs)
     return
@@ -81,6 +98,9 @@ class VideoStreamCv2DataCapture(DataCaptureThread, _VideoConfigMixin):
   def _release(self):
     self._release_capture()
     del self._capture
+    if self.__decode_scheduler is not None:
+      self.__decode_scheduler.unregister(self.cfg_name)
+      self.__decode_scheduler = None
     return
 
   def _release_capture(self):
@@ -267,6 +287,41 @@ class VideoStreamCv2DataCapture(DataCaptureThread, _VideoConfigMixin):
             color='m')
     return
 
+  def _get_decode_scheduler(self):
+    if self.__decode_scheduler is None:
+      config_startup = self.shmem.get('config_startup', {}) or {}
+      self.__decode_scheduler = DecodeScheduler(log=self.log, budget=config_startup.get('DECODE_BUDGET'))
+    return self.__decode_scheduler
+
+  def _maybe_apply_decode_schedule(self, grab_time, nr_grabs, retrieve_time):
+    if not self.cfg_decode_scheduler:
+      if self.__decode_scheduler is not None:
+        # scheduler disabled from config - back to the per-stream heuristic
+        self.__decode_scheduler.unregister(self.cfg_name)
+        self.__decode_scheduler = None
+        self._heuristic_cap_resolution = None
+      return
+    scheduler = self._get_decode_scheduler()
+    scheduler.register(
+      name=self.cfg_name,
+      priority=self.cfg_decode_priority,
+      target_dps=self.get_cap_or_forced_resolution(),
+      fps=self._metadata.fps,
+    )
+    scheduler.report(
+      name=self.cfg_name,
+      grab_time=grab_time,
+      nr_grabs=nr_grabs,
+      retrieve_time=retrieve_time,
+    )
+    self._heuristic_cap_resolution = scheduler.get_allocation(self.cfg_name)
+    return
+
+  def get_decode_schedule_status(self):
+    if self.__decode_scheduler is None:
+      return None
+    return self.__decode_scheduler.get_stream_status(self.cfg_name)
+
   def _capture_read(self):
     has_frame, frame = False, None
 
@@ -277,13 +332,18 @@ class VideoStreamCv2DataCapture(DataCaptureThread, _VideoConfigMixin):
     if (self.cap_resolution >= self._get_stream_fps_max_thr() and self.cfg_amd_target_dps == 0) or self.is_intel():
       self.start_timer('cv2_read')  # DO NOT REMOVE - needs to "wrap" custom dps reads for _recalc_cap_resolution
       self.start_timer('cv2_read_dps{}'.format(self.cap_resolution))
+      # decode costs are measured in thread CPU time - on live sources `read`/`grab` block until the next
+      # frame arrives and the wall-clock time would count the waiting as decoding
+      start_read = thread_time()
       has_frame, frame = self._capture.read()
+      grab_time, nr_grabs, retrieve_time = 0, 0, thread_time() - start_read
       self.end_timer('cv2_read_dps{}'.format(self.cap_resolution))
       self.end_timer('cv2_read')
     else:
       self.start_timer('cv2_grab_retrv_dps{}'.format(self.cap_resolution))
       nr_grabs = self._get_nr_grabs()
       self.start_timer('cv2_grab_x{}'.format(nr_grabs))
+      start_grab = thread_time()
       for _ in range(nr_grabs):
         self.start_timer('cv2_grab')
         try:
@@ -292,12 +352,17 @@ class VideoStreamCv2DataCapture(DataCaptureThread, _VideoConfigMixin):
           break
         self.end_timer('cv2_grab')
       # endfor all grabs
+      grab_time = thread_time() - start_grab
       self.end_timer('cv2_grab_x{}'.format(nr_grabs))
       self.start_timer('cv2_retrieve')
+      start_retrieve = thread_time()
       has_frame, frame = self._capture.retrieve()
+      retrieve_time = thread_time() - start_retrieve
       self.end_timer('cv2_retrieve')
       self.end_timer('cv2_grab_retrv_dps{}'.format(self.cap_resolution))
-    if not self.is_intel() and self.cfg_amd_target_dps == 0:
+    if has_frame:
+      self._maybe_apply_decode_schedule(grab_time=grab_time, nr_grabs=nr_grabs, retrieve_time=retrieve_time)
+    if not self.is_intel() and self.cfg_amd_target_dps == 0 and not self.cfg_decode_scheduler:
       self._recalc_cap_resolution()
     return has_frame, frame
 
@@ -310,7 +375,13 @@ class VideoStreamCv2DataCapture(DataCaptureThread, _VideoConfigMixin):
         frame = self._maybe_resize_crop(frame)
         # end universal video stream code
 
-        frame = np.ascontiguousarray(frame[:, :, ::-1])  # transform to rgb & contiguous
+        # transform to rgb & contiguous - directly in the shared frame ring if enabled
+        rgb_frame = self.reserve_frame(frame.shape, frame.dtype)
+        if rgb_frame is not None:
+          np.copyto(rgb_frame, frame[:, :, ::-1])
+          frame = rgb_frame
+        else:
+          frame = np.ascontiguousarray(frame[:, :, ::-1])
 
         # check for HW issues on some nvr/dvr
         if ((self.cfg_configured_h > 0 and self.cfg_configured_h != frame.shape[0])
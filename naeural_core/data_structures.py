@@ -6,6 +6,7 @@ import numpy as np
 
 from naeural_core import constants as ct
 from naeural_core.utils.img_utils import maybe_prepare_img_payload
+from naeural_core.utils.img_encoding_pool import ImageEncodingPool
 
 from naeural_core.utils.debug_save_img import save_images_and_payload_to_output
 
@@ -297,11 +298,16 @@ class GeneralPayload:
       # TODO: check with ORIGINAL_FRAME maybe delete that old code
       dct_payload['IMG_ORIG'] = self.owner.dataapi_image()
     
+    encoding_pool = None
+    if self.owner.config_data.get('WITNESS_ENCODING_POOL', False):
+      encoding_pool = ImageEncodingPool(log=self.owner.log)
+    
     maybe_prepare_img_payload(
       sender=self.owner, 
       dct=dct_payload, 
       keys=['IMG', 'IMG_ORIG'],
       force_list=False, # set this to True in order to always encode the imgs in arrays
+      encoding_pool=encoding_pool,
     )
 
     if self.owner.cfg_log_on_blob:
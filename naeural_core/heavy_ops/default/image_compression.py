@@ -1,4 +1,5 @@
 from naeural_core.utils.img_utils import maybe_prepare_img_payload
+from naeural_core.utils.img_encoding_pool import ImageEncodingPool
 from naeural_core.heavy_ops.base import BaseHeavyOp
 
 class ImageCompressionHeavyOp(BaseHeavyOp):
@@ -12,6 +13,11 @@ class ImageCompressionHeavyOp(BaseHeavyOp):
     # should run only in comm thread and not async as it replaces inplace the
     # 'IMG' with the base64 string
     assert not self.comm_async 
+    self._encoding_pool = None
+    if self._config.get('USE_ENCODING_POOL', False):
+      # the comm thread only waits for the images of the payload that are encoded in parallel
+      self._encoding_pool = ImageEncodingPool(log=self.log)
+    return
 
   def _register_payload_operation(self, payload):
     """
@@ -20,5 +26,5 @@ class ImageCompressionHeavyOp(BaseHeavyOp):
     return payload # we just return original dict so we can change it inplace
 
   def _process_dct_operation(self, dct):
-    maybe_prepare_img_payload(sender=self, dct=dct)
+    maybe_prepare_img_payload(sender=self, dct=dct, encoding_pool=self._encoding_pool)
     return
@@ -0,0 +1,162 @@
+"""
+Binary wire envelope for outgoing payloads.
+
+The default wire format is JSON. When a node enables a binary envelope (`WIRE_FORMAT` in the app config)
+it advertises it in its heartbeats and payloads explicitly addressed to nodes that advertise the same
+format are sent as:
+
+  ENVELOPE_MAGIC + msgpack({'H': header, 'D': signed payload})
+
+where base64 image strings (`IMG`, `IMG_ORIG`) travel as raw bytes and numpy arrays as raw buffers.
+The header lists the fields that were converted so the receiver restores the exact JSON-equivalent
+payload (base64 strings, lists) before the signature verification. Everybody else still gets JSON.
+"""
+
+import base64
+import binascii
+import numpy as np
+
+from naeural_core import constants as ct
+
+try:
+  import msgpack
+  MSGPACK_AVAILABLE = True
+except ImportError:
+  msgpack = None
+  MSGPACK_AVAILABLE = False
+
+__VER__ = '0.1.0'
+
+ENVELOPE_MAGIC = b'\x00EEB'
+ENVELOPE_VERSION = 1
+
+_EXT_NDARRAY = 1
+
+_HEADER = 'H'
+_DATA = 'D'
+_H_FORMAT = 'F'
+_H_VERSION = 'V'
+_H_BINARY_KEYS = 'B'
+
+
+def _b64_to_bytes(value):
+  try:
+    raw = base64.b64decode(value, validate=True)
+  except (binascii.Error, ValueError, TypeError):
+    return None
+  # only lossless conversions are accepted as the receiver must rebuild the exact signed string
+  if base64.b64encode(raw).decode() != value:
+    return None
+  return raw
+
+
+def _pack_default(obj):
+  if isinstance(obj, np.ndarray):
+    arr = np.ascontiguousarray(obj)
+    meta = msgpack.packb([arr.dtype.str, list(arr.shape)], use_bin_type=True)
+    return msgpack.ExtType(_EXT_NDARRAY, len(meta).to_bytes(4, 'little') + meta + arr.tobytes())
+  if isinstance(obj, np.generic):
+    return obj.item()
+  if isinstance(obj, (set, tuple)):
+    return list(obj)
+  return str(obj)
+
+
+def _unpack_ext(code, data):
+  if code == _EXT_NDARRAY:
+    meta_len = int.from_bytes(data[:4], 'little')
+    dtype, shape = msgpack.unpackb(data[4:4 + meta_len], raw=False)
+    arr = np.frombuffer(data[4 + meta_len:], dtype=np.dtype(dtype)).reshape(shape)
+    # JSON receivers get lists so we do the same in order to keep the payload (and its hash) identical
+    return arr.tolist()
+  return msgpack.ExtType(code, data)
+
+
+def is_binary_envelope(message):
+  return isinstance(message, (bytes, bytearray)) and bytes(message[:len(ENVELOPE_MAGIC)]) == ENVELOPE_MAGIC
+
+
+def decode_envelope(message):
+  """
+  Decodes a binary envelope back to the JSON-equivalent payload dict. Returns None on any failure.
+  """
+  if not MSGPACK_AVAILABLE or not is_binary_envelope(message):
+    return None
+  try:
+    envelope = msgpack.unpackb(
+      bytes(message[len(ENVELOPE_MAGIC):]), raw=False, ext_hook=_unpack_ext, strict_map_key=False,
+    )
+    data = envelope[_DATA]
+    for key in envelope[_HEADER].get(_H_BINARY_KEYS, []):
+      value = data.get(key)
+      if isinstance(value, list):
+        data[key] = [base64.b64encode(x).decode() if isinstance(x, bytes) else x for x in value]
+      elif isinstance(value, bytes):
+        data[key] = base64.b64encode(value).decode()
+    #endfor restore binary keys
+    return data
+  except Exception:
+    return None
+
+
+class MsgPackEnvelope:
+  NAME = ct.WIRE_FORMAT.MSGPACK
+
+  def __init__(self, binary_keys=('IMG', 'IMG_ORIG')):
+    self._binary_keys = tuple(binary_keys)
+    return
+
+  def _maybe_binary(self, value):
+    if isinstance(value, str):
+      return _b64_to_bytes(value)
+    if isinstance(value, list) and len(value) > 0 and all(isinstance(x, str) for x in value):
+      lst_raw = [_b64_to_bytes(x) for x in value]
+      if all(x is not None for x in lst_raw):
+        return lst_raw
+    return None
+
+  def encode(self, data):
+    """
+    Returns the binary envelope (bytes) for the already signed `data` dict.
+    """
+    body = dict(data)
+    binary_keys = []
+    for key in self._binary_keys:
+      value = body.get(key)
+      if value is None:
+        continue
+      raw = self._maybe_binary(value)
+      if raw is not None:
+        body[key] = raw
+        binary_keys.append(key)
+    #endfor binary keys
+    envelope = {
+      _HEADER: {
+        _H_FORMAT: self.NAME,
+        _H_VERSION: ENVELOPE_VERSION,
+        _H_BINARY_KEYS: binary_keys,
+      },
+      _DATA: body,
+    }
+    return ENVELOPE_MAGIC + msgpack.packb(envelope, default=_pack_default, use_bin_type=True)
+
+  def decode(self, message):
+    return decode_envelope(message)
+
+
+_WIRE_ENVELOPES = {
+  ct.WIRE_FORMAT.MSGPACK: (MsgPackEnvelope, MSGPACK_AVAILABLE),
+}
+
+
+def create_wire_envelope(name):
+  """
+  Returns the envelope for the `name` wire format or None if the format is unknown or its package
+  is not installed (in which case the node falls back to JSON).
+  """
+  if not isinstance(name, str):
+    return None
+  envelope_class, available = _WIRE_ENVELOPES.get(name.lower(), (None, False))
+  if envelope_class is None or not available:
+    return None
+  return envelope_class()
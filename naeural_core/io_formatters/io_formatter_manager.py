@@ -1,5 +1,6 @@
 from naeural_core.manager import Manager
-# from naeural_core import constants as ct
+from naeural_core import constants as ct
+from naeural_core.io_formatters.binary_envelope import create_wire_envelope
 from ratio1.io_formatter import IOFormatterWrapper
 
 class IOFormatterManager(Manager):
@@ -7,6 +8,7 @@ class IOFormatterManager(Manager):
   def __init__(self, log, **kwargs):
     self._io_formatter_wrapper = IOFormatterWrapper(log)
     self._formatter, self._formatter_name = None, None
+    self._wire_envelope = None
     super(IOFormatterManager, self).__init__(
         log=log, prefix_log='[FMTM]', **kwargs)
     return
@@ -31,3 +33,27 @@ class IOFormatterManager(Manager):
 
   def get_required_formatter_from_payload(self, payload):
     return self._io_formatter_wrapper.get_required_formatter_from_payload(payload)
+
+  def create_wire_envelope(self, name):
+    """
+    Creates the binary wire envelope used for payloads addressed to nodes that advertise the same
+    wire format. Falls back to JSON-only if the format (or its package) is not available.
+    """
+    self._wire_envelope = create_wire_envelope(name)
+    if self._wire_envelope is None:
+      self.P("Wire format '{}' not available, using JSON only".format(name), color='r')
+    else:
+      self.P("Wire format '{}' enabled for capable destinations".format(name), color='g')
+    return
+
+  def get_wire_envelope(self):
+    return self._wire_envelope
+
+  def get_wire_formats(self):
+    """
+    Returns the wire formats this node accepts (advertised in heartbeats).
+    """
+    formats = [ct.WIRE_FORMAT.JSON]
+    if self._wire_envelope is not None:
+      formats.append(self._wire_envelope.NAME)
+    return formats
@@ -6,6 +6,10 @@ INFO:
     - create_config_handlers - after we have final config_data we can create implicit `cfg_` handlers
     - validation  & run_validation_rules - finally check if all is ok
 
+  the merged configs are `ConfigSnapshot`s: dicts that get a new `version` on each change and that can serve
+  the dict values of the `cfg_` handlers as cached read-only views (no copy on each access) when the config
+  has `CONFIG_READONLY_VIEWS=True`. Otherwise the handlers return a copy of the dict values as before.
+
 TODO:
   
   
@@ -13,6 +17,7 @@ TODO:
 """
 from copy import deepcopy
 from collections import deque
+from itertools import count
 import traceback
 
 class VALIDATION_KEYS:
@@ -36,9 +41,125 @@ class CONST(VALIDATION_KEYS):
   PROP_PREFIX = 'cfg_'
   
 
+READONLY_VIEWS_KEY = 'CONFIG_READONLY_VIEWS'
+
+_IMMUTABLE_TYPES = (str, int, float, bool, bytes, type(None))
+
+_VERSIONS = count(1)
+
+_MISSING = object()
+
+
+class FrozenConfigDict(dict):
+  """
+  Read-only view of a dict config value. `copy()` returns a plain (modifiable) dict.
+  """
+  __slots__ = ()
+
+  def _readonly(self, *args, **kwargs):
+    raise TypeError("Config values are read-only, use `.copy()` to get a modifiable dict")
+
+  __setitem__ = __delitem__ = __ior__ = _readonly
+  update = pop = popitem = setdefault = clear = _readonly
+
+  def copy(self):
+    return dict(self)
+
+  def __reduce__(self):
+    # copies and pickles are plain dicts
+    return (dict, (dict(self),))
+
+
+class ConfigSnapshot(dict):
+  """
+  Config dict with a version that changes on each modification (versions are unique across snapshots so a
+  new snapshot never has the version of an older one). The read-only views of the dict values are cached
+  until the next modification.
+  """
+  __slots__ = ('version', 'readonly_views', '_views')
+
+  def __init__(self, *args, **kwargs):
+    super(ConfigSnapshot, self).__init__(*args, **kwargs)
+    self._views = {}
+    self._changed()
+    return
+
+  def _changed(self):
+    self.version = next(_VERSIONS)
+    self.readonly_views = bool(dict.get(self, READONLY_VIEWS_KEY, False))
+    self._views.clear()
+    return
+
+  def __setitem__(self, key, value):
+    super(ConfigSnapshot, self).__setitem__(key, value)
+    self._changed()
+    return
+
+  def __delitem__(self, key):
+    super(ConfigSnapshot, self).__delitem__(key)
+    self._changed()
+    return
+
+  def __ior__(self, other):
+    self.update(other)
+    return self
+
+  def update(self, *args, **kwargs):
+    super(ConfigSnapshot, self).update(*args, **kwargs)
+    self._changed()
+    return
+
+  def pop(self, *args):
+    result = super(ConfigSnapshot, self).pop(*args)
+    self._changed()
+    return result
+
+  def popitem(self):
+    result = super(ConfigSnapshot, self).popitem()
+    self._changed()
+    return result
+
+  def setdefault(self, key, default=None):
+    if key not in self:
+      self[key] = default
+    return self[key]
+
+  def clear(self):
+    super(ConfigSnapshot, self).clear()
+    self._changed()
+    return
+
+  def touch(self):
+    """
+    Must be called after modifying inplace a (nested) value of the config.
+    """
+    self._changed()
+    return
+
+  def view(self, key):
+    view = self._views.get(key, _MISSING)
+    if view is _MISSING:
+      view = self.get(key)
+      if isinstance(view, dict):
+        view = FrozenConfigDict(view)
+      self._views[key] = view
+    return view
+
+  def __reduce__(self):
+    return (ConfigSnapshot, (dict(self),))
+
+
+def _copy_config_value(value):
+  return value if isinstance(value, _IMMUTABLE_TYPES) else deepcopy(value)
+
+
 from functools import partial
 def getter(slf, key=None):
-  val = slf.config_data.get(key)
+  cfg = slf.config_data
+  if type(cfg) is ConfigSnapshot and cfg.readonly_views:
+    view = cfg._views.get(key, _MISSING)
+    return cfg.view(key) if view is _MISSING else view
+  val = cfg.get(key)
   if isinstance(val, dict):
     return val.copy()
   else:
@@ -119,12 +240,14 @@ class _ConfigHandlerMixin(object):
       msg_delta += ": {}".format(list(delta_config.keys()))
     
     # start delta_config prepare
-    # now deepcopy delta_config to a local variable to ensure mutable values will not
-    # be modified in _upstream_config thus triggering a diff from actual config    
-    delta_config = deepcopy(delta_config)
+    # now copy delta_config to a local variable to ensure mutable values will not
+    # be modified in _upstream_config thus triggering a diff from actual config 
+    # (only the mutable values are deep-copied)
     # convert to upper default    
     if uppercase_keys:
-      delta_config = {k.upper():v for k,v in delta_config.items()}
+      delta_config = {k.upper():_copy_config_value(v) for k,v in delta_config.items()}
+    else:
+      delta_config = {k:_copy_config_value(v) for k,v in delta_config.items()}
     # end delta_config prepare 
     lst_msg = []
     
@@ -141,9 +264,13 @@ class _ConfigHandlerMixin(object):
     if default_config is None:
       self.P("WARNING: no default config was provided at {} startup!".format(
         self.__class__.__name__), color='r')
-      final_config = {}
+      final_config = ConfigSnapshot()
     else:
-      final_config = deepcopy(default_config)
+      # the default values that are replaced by the delta are not copied
+      final_config = ConfigSnapshot({
+        k: v if (k in delta_config and delta_config[k] != v) else _copy_config_value(v)
+        for k, v in default_config.items()
+      })
     #endif
     all_keys = set(final_config.keys()).union(set(delta_config.keys()))
     for k in all_keys:
@@ -165,13 +292,14 @@ class _ConfigHandlerMixin(object):
           else:
             lst_msg[-1] += k + '; '
           #endif verbose
-        final_config[k] = delta_config[k]
+        dict.__setitem__(final_config, k, delta_config[k])
         #endif new key or value
       #endif key not in delta_config
     #endfor all keys
     if len(lst_msg) > 0 and verbose > 0:      
       full_dump = "\n".join(["    " + x for x in lst_msg])        
       self.P(full_dump.lstrip(), color='b')
+    final_config.touch()
     return final_config
   
   def update_config_data(self, new_config_data):
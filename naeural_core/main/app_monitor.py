@@ -10,6 +10,7 @@ from naeural_core import constants as ct
 from collections import deque, defaultdict
 from naeural_core import DecentrAIObject
 from naeural_core.utils.sys_mon import SystemMonitor
+from naeural_core.main.heartbeat_delta import HeartbeatDeltaEncoder, HB_DELTA
 
 MAX_LOG_SIZE = 10_000
 
@@ -24,6 +25,8 @@ MIN_PROCESS_INCREASE_GB = MIN_PROCESS_INCREASE_MB / 1000
 
 WARMUP_READINGS = 5
 
+MAX_STAGE_TIMINGS = 1000
+
 class ApplicationMonitor(DecentrAIObject):
   def __init__(self, log, owner, **kwargs):
     self.owner = owner
@@ -50,7 +53,9 @@ class ApplicationMonitor(DecentrAIObject):
     self.__last_delivered_error_notifs = defaultdict(int)
     self._done_first_smi_error = False
     self.dct_curr_nr = defaultdict(lambda:0)
+    self.dct_stage_timings = defaultdict(lambda: deque(maxlen=MAX_STAGE_TIMINGS))
     self.__last_temperature_info = None
+    self.__hb_delta_encoder = None
     self.__local_data_history = {
       'cpu_load'            : deque(maxlen=MAX_LOCAL_HISTORY),
       'cpu_temp'            : deque(maxlen=MAX_LOCAL_HISTORY),
@@ -227,12 +232,29 @@ class ApplicationMonitor(DecentrAIObject):
     str_log += "\n\r                         Inc / Last Inc / Mean Inc : {:>6,.2f} / {:>6,.2f} / {:6,.2f} (GB)".format(delta_process_start, delta_process_last, avg)
     if self.owner_mem > 0:
       str_log += "\n\r                         Object tree mem eval      :{:>3,.3f} GB".format(self.owner_mem / 1024**3)
+    dct_queue_mem = self.get_plugins_queue_memory()
+    if dct_queue_mem is not None:
+      top_plugins = sorted(dct_queue_mem['PLUGINS'].items(), key=lambda x: -x[1])[:5]
+      str_log += "\n\r                        -------------------------------------------------------------"
+      str_log += "\n\r                       Plugins input queues      : {:>6,.3f} (GB)".format(dct_queue_mem['TOTAL'] / 1024**3)
+      for name, nbytes in top_plugins:
+        str_log += "\n\r                         {:<40} {:>8,.1f} (MB)".format(name[:40], nbytes / 1024**2)
     str_log += "\n\r==========================================================================================="
     str_log += "\n\r==========================================================================================="
     self.P(str_log, color=color)
     return
       
   
+  def get_plugins_queue_memory(self):
+    """
+    Returns the memory held by the plugins input queues (see `BusinessManager.get_plugins_queue_memory`)
+    or None before the business manager is available.
+    """
+    if self.owner.business_manager is None:
+      return None
+    return self.owner.business_manager.get_plugins_queue_memory()
+
+
   def log_avail_memory(self):
     avail_memory = self.log.get_avail_memory(gb=True)
     self.avail_memory_log.append(avail_memory)
@@ -289,6 +311,22 @@ class ApplicationMonitor(DecentrAIObject):
   def add_data_info(self, val, stage):
     self.dct_curr_nr[stage] += val
     return
+
+  def add_stage_timing(self, stage, elapsed):
+    """
+    Records the duration of a main loop stage (or of a pipelined main loop stage running on its own thread)
+    """
+    self.dct_stage_timings[stage].append(elapsed)
+    return
+
+  def get_stage_timings(self):
+    """
+    Returns the average duration (in seconds) of each recorded main loop stage
+    """
+    return {
+      stage : round(float(np.mean(timings)), 5)
+      for stage, timings in list(self.dct_stage_timings.items()) if len(timings) > 0
+    }
   
   def get_basic_perf_info(self):
     str_info = ''
@@ -495,7 +533,11 @@ class ApplicationMonitor(DecentrAIObject):
     return
   
 
-  def get_status(self, status=None, full=True, send_log=False):
+  def get_status(self, status=None, full=True, send_log=False, encode=True, force_full=False):
+    """
+    Returns the heartbeat status. With `encode=False` the status is returned as a plain dict and
+    `encode_status` must be called before sending it.
+    """
     machine_ip = self.log.get_localhost_ip()
     machine_memory = round(self.log.total_memory,3)
     cpu_usage = self.log.get_cpu_usage()
@@ -575,7 +617,10 @@ class ApplicationMonitor(DecentrAIObject):
       loops_timings = {
         'main_loop_avg_time' : self.owner.avg_loop_timings,
         'comm_loop_avg_time' : self.owner.comm_manager.avg_comm_loop_timings,
+        'stages_avg_time'    : self.get_stage_timings(),
       }
+      if self.owner.main_loop_pipeline is not None:
+        loops_timings['pipeline'] = self.owner.main_loop_pipeline.get_status()
 
     active_serving_processes = []
     serving_pids = []
@@ -678,6 +723,14 @@ class ApplicationMonitor(DecentrAIObject):
     is_supervisor = self.owner.is_supervisor_node
     
     whitelist = self.owner.whitelist
+
+    dct_queue_memory = None
+    dct_queue_mem = self.get_plugins_queue_memory()
+    if dct_queue_mem is not None:
+      dct_queue_memory = {
+        'STREAMS' : {k: round(v / 1024**2, 1) for k, v in dct_queue_mem['STREAMS'].items()},
+        'TOTAL'   : round(dct_queue_mem['TOTAL'] / 1024**2, 1),
+      }
     
     
 
@@ -689,6 +742,7 @@ class ApplicationMonitor(DecentrAIObject):
       ct.HB.EE_WHITELIST      : whitelist,
       ct.HB.EE_IS_SUPER       : is_supervisor,
       ct.HB.EE_FORMATTER      : self.owner.cfg_io_formatter,
+      ct.WIRE_FORMAT.HB_KEY   : self.owner._io_formatter_manager.get_wire_formats(),
       
       # ALERTS
       ct.HB.IS_ALERT_RAM      : self.is_ram_alert(),
@@ -733,6 +787,7 @@ class ApplicationMonitor(DecentrAIObject):
       ct.HB.COMM_INFO.OUT_KB  : round(outkB, 3),
         
       ct.HB.SERVING_PIDS      : serving_pids, 
+      ct.HB_PLUGINS_QUEUE_MEMORY : dct_queue_memory,
       ct.HB.LOOPS_TIMINGS     : loops_timings,
 
       ct.HB.TIMERS            : 'Timers not available in summary',
@@ -749,6 +804,31 @@ class ApplicationMonitor(DecentrAIObject):
       for k, v in dct_ext_status.items():
         dct_status[k] = v
         
+    if not self.first_payload_prepared:
+      self.__first_payload_prepared = True
+      self.P("First hb for {}".format(address), boxed=True)
+
+    if encode:
+      dct_status = self.encode_status(dct_status, force_full=force_full)
+    return dct_status
+
+
+  def encode_status(self, dct_status, force_full=False):
+    """
+    Prepares the status returned by `get_status(encode=False)` for sending: delta encoding (if enabled)
+    and compression.
+    """
+    hb_delta = None
+    if self.owner.cfg_heartbeat_delta:
+      if self.__hb_delta_encoder is None:
+        self.__hb_delta_encoder = HeartbeatDeltaEncoder(full_every=self.owner.cfg_heartbeat_full_every)
+        self.P("INFO: Delta heartbeats with full snapshot every {} beats".format(
+          self.__hb_delta_encoder.full_every), boxed=True
+        )
+      dct_status = self.__hb_delta_encoder.encode(dct_status, force_full=force_full)
+      hb_delta = dct_status.pop(HB_DELTA)
+    #endif delta encoding
+
     if self.owner.cfg_compress_heartbeat:
       str_text = "{}"
       try:
@@ -759,18 +839,17 @@ class ApplicationMonitor(DecentrAIObject):
       dct_status = {
         ct.HB.ENCODED_DATA : str_encoded,
         # needed in caller...
-        ct.HB.NR_INFERENCES     : n_inferences,
-        ct.HB.NR_PAYLOADS       : n_payloads,
-        ct.HB.NR_STREAMS_DATA   : n_stream_data,        
+        ct.HB.NR_INFERENCES     : dct_status.get(ct.HB.NR_INFERENCES),
+        ct.HB.NR_PAYLOADS       : dct_status.get(ct.HB.NR_PAYLOADS),
+        ct.HB.NR_STREAMS_DATA   : dct_status.get(ct.HB.NR_STREAMS_DATA),
         ct.HB.HEARTBEAT_VERSION : ct.HB.V2, 
       }
     else:
       dct_status[ct.HB.HEARTBEAT_VERSION] = ct.HB.V1
-      
-    if not self.first_payload_prepared:
-      self.__first_payload_prepared = True
-      self.P("First hb for {}".format(address), boxed=True)
 
+    if hb_delta is not None:
+      # outside the compressed data so the receivers see it without decompressing
+      dct_status[HB_DELTA] = hb_delta
     return dct_status
   
   
@@ -0,0 +1,158 @@
+"""
+Compact heartbeat timestamps of a node for one epoch.
+
+The timestamps are kept as integer UTC seconds in an `array('q')` (8 bytes each instead of a set of
+timezone aware `datetime` objects) and the availability is accumulated as the heartbeats arrive:
+for in-order heartbeats the availability of the current epoch is available in O(1). Out of order or
+duplicated heartbeats only mark the series as "dirty" and the next query recomputes it with numpy.
+
+Availability rule (same as the original set based computation): the sorted unique timestamps are split
+in intervals whenever the delta between two consecutive heartbeats is bigger than the heartbeat interval
+plus 5 seconds or smaller than half of the heartbeat interval; the availability is the sum of the
+interval lengths, i.e. the sum of all the "valid" deltas.
+"""
+
+import numpy as np
+
+from array import array
+from datetime import datetime, timezone
+
+DEFAULT_TIME_BETWEEN_HEARTBEATS = 10
+
+
+def _valid_deltas_mask(deltas, time_between_heartbeats):
+  return (deltas <= (time_between_heartbeats + 5)) & (deltas >= (time_between_heartbeats / 2))
+
+
+def avail_seconds_from_timestamps(timestamps, time_between_heartbeats=DEFAULT_TIME_BETWEEN_HEARTBEATS):
+  """
+  Vectorized availability for a (not necessarily sorted or unique) sequence of integer timestamps.
+  """
+  np_ts = np.unique(np.asarray(timestamps, dtype=np.int64))
+  if np_ts.shape[0] <= 1:
+    return 0
+  deltas = np.diff(np_ts)
+  return int(deltas[_valid_deltas_mask(deltas, time_between_heartbeats)].sum())
+
+
+def batch_avail_seconds(lst_series, time_between_heartbeats=DEFAULT_TIME_BETWEEN_HEARTBEATS):
+  """
+  Computes the availability of many `EpochHeartbeats` in a single numpy pass (used when closing epochs).
+
+  Returns
+  -------
+  list[int]
+    the availability seconds of each series.
+  """
+  lst_arrays = [x.as_numpy() for x in lst_series]
+  sizes = np.array([x.shape[0] for x in lst_arrays], dtype=np.int64)
+  if sizes.sum() == 0:
+    return [0] * len(lst_arrays)
+  np_ts = np.concatenate(lst_arrays)
+  owners = np.repeat(np.arange(len(lst_arrays)), sizes)
+  deltas = np.diff(np_ts)
+  valid = (owners[1:] == owners[:-1]) & _valid_deltas_mask(deltas, time_between_heartbeats)
+  result = np.bincount(owners[1:][valid], weights=deltas[valid], minlength=len(lst_arrays))
+  return [int(x) for x in result]
+
+
+class EpochHeartbeats:
+  __slots__ = ('_ts', '_dirty', '_avail')
+
+  def __init__(self, timestamps=None):
+    """
+    Parameters
+    ----------
+    timestamps : iterable, optional
+      initial timestamps as integer UTC seconds or `datetime` objects (legacy sets of dates).
+    """
+    self._ts = array('q')
+    self._dirty = False
+    self._avail = 0
+    if timestamps:
+      self._ts.extend(sorted(set(self._to_seconds(x) for x in timestamps)))
+      self._avail = avail_seconds_from_timestamps(self._ts)
+    return
+
+  @staticmethod
+  def _to_seconds(value):
+    if isinstance(value, datetime):
+      return int(value.timestamp())
+    return int(value)
+
+  def __getstate__(self):
+    self._normalize()
+    return (self._ts.tobytes(), self._avail)
+
+  def __setstate__(self, state):
+    raw, avail = state
+    self._ts = array('q')
+    self._ts.frombytes(raw)
+    self._dirty = False
+    self._avail = avail
+    return
+
+  def __len__(self):
+    self._normalize()
+    return len(self._ts)
+
+  def __iter__(self):
+    # legacy view: sorted timezone aware datetimes
+    self._normalize()
+    return (datetime.fromtimestamp(x, timezone.utc) for x in self._ts)
+
+  def __repr__(self):
+    return "EpochHeartbeats({} hbs, {}s avail)".format(len(self), self.avail_seconds())
+
+  def _normalize(self):
+    if self._dirty:
+      np_ts = np.unique(np.array(self._ts, dtype=np.int64))
+      self._ts = array('q', np_ts.tobytes())
+      self._avail = avail_seconds_from_timestamps(np_ts)
+      self._dirty = False
+    return
+
+  def add(self, timestamp):
+    """
+    Registers a heartbeat timestamp (integer UTC seconds or datetime) and updates the running availability.
+    """
+    ts = self._to_seconds(timestamp)
+    n = len(self._ts)
+    if n == 0:
+      self._ts.append(ts)
+      return
+    last = self._ts[-1]
+    if ts == last:
+      # same heartbeat (or same second) - ignored as in the set based version
+      return
+    self._ts.append(ts)
+    if ts < last or self._dirty:
+      # out of order arrival - recomputed on next query
+      self._dirty = True
+      return
+    delta = ts - last
+    if DEFAULT_TIME_BETWEEN_HEARTBEATS / 2 <= delta <= DEFAULT_TIME_BETWEEN_HEARTBEATS + 5:
+      self._avail += delta
+    return
+
+  def as_numpy(self):
+    """
+    Returns the sorted unique timestamps as a int64 numpy array.
+    """
+    self._normalize()
+    # a copy - a view would block the appends of the underlying array
+    return np.array(self._ts, dtype=np.int64)
+
+  def avail_seconds(self, time_between_heartbeats=DEFAULT_TIME_BETWEEN_HEARTBEATS):
+    self._normalize()
+    if time_between_heartbeats != DEFAULT_TIME_BETWEEN_HEARTBEATS:
+      return avail_seconds_from_timestamps(self.as_numpy(), time_between_heartbeats=time_between_heartbeats)
+    return self._avail
+
+  def first_date(self):
+    self._normalize()
+    return datetime.fromtimestamp(self._ts[0], timezone.utc) if len(self._ts) > 0 else None
+
+  def last_date(self):
+    self._normalize()
+    return datetime.fromtimestamp(self._ts[-1], timezone.utc) if len(self._ts) > 0 else None
@@ -33,6 +33,8 @@ from naeural_core import constants as ct
 from naeural_core.utils import Singleton
 
 from naeural_core.main.ver import __VER__ as CORE_VERSION
+from naeural_core.main.epoch_heartbeats import EpochHeartbeats, batch_avail_seconds
+from naeural_core.utils.state_journal import StateJournal
 from ratio1 import version as SDK_VERSION
 
 try:
@@ -55,6 +57,7 @@ FN_SUBFOLDER = 'network_monitor'
 FN_FULL = FN_SUBFOLDER + '/' + FN_NAME
 
 EPOCHMON_MUTEX = 'epochmon_mutex'
+EPOCHMON_SAVE_MUTEX = 'epochmon_save_mutex'
 
 
 INITIAL_SYNC_EPOCH = 0  # TODO: add initial sync epoch
@@ -142,12 +145,12 @@ _NODE_TEMPLATE = {
   
   EPCT.CURRENT_EPOCH  : {
     EPCT.ID               : None,
-    EPCT.HB_TIMESTAMPS   : set(),
+    EPCT.HB_TIMESTAMPS   : EpochHeartbeats(),
   },
   
   EPCT.LAST_EPOCH : {
     EPCT.ID : None,
-    EPCT.HB_TIMESTAMPS : set(),
+    EPCT.HB_TIMESTAMPS : EpochHeartbeats(),
   }
 }
 
@@ -178,6 +181,12 @@ class EpochsManager(Singleton):
     self.__data = {}
     self.__full_data = {}
     self.__eth_to_node = {}
+    # heartbeats registered since the last save (see `save_status`)
+    self.__journal = StateJournal(
+      snapshot_path=os.path.join(self.log.get_data_folder(), FN_SUBFOLDER, FN_NAME),
+    )
+    self.__journal_pending = []
+    self.__journal_failed = False
     try:
       debug = int(debug)
     except Exception as e:
@@ -347,30 +356,74 @@ class EpochsManager(Singleton):
     return
 
 
-  def save_status(self):
-    with self.log.managed_lock_resource(EPOCHMON_MUTEX):
-      self.__save_status()
+  def save_status(self, force_snapshot=False):
+    """
+    Saves the epochs status. Usually only the heartbeats registered since the previous save are appended
+    to the journal; a full snapshot (that resets the journal) is written at each epoch change, when the
+    journal grows too large, when there is no snapshot yet or after a failed append.
+    The epochs lock is held only while the data to be saved is prepared - the disk writes are done 
+    outside of it.
+    """
+    with self.log.managed_lock_resource(EPOCHMON_SAVE_MUTEX):
+      compact = (
+        force_snapshot or self.__journal_failed or
+        not os.path.isfile(self.__journal.snapshot_path) or self.__journal.needs_compaction()
+      )
+      with self.log.managed_lock_resource(EPOCHMON_MUTEX):
+        lst_pending, _full_data_copy = self.__prepare_save(compact=compact)
+      # endwith epochs lock
+      try:
+        if compact:
+          self.__journal.write_snapshot(_full_data_copy)
+        elif len(lst_pending) > 0:
+          self.__journal.append(lst_pending)
+        self.__journal_failed = False
+      except Exception as exc:
+        # the next save will write a full snapshot
+        self.__journal_failed = True
+        self.P("Error saving epochs status: {}".format(exc), color='r')
+    # endwith save lock
     return
 
       
-  def __save_status(self):
+  def __prepare_save(self, compact):
     """
-    Saves the epochs status to disk called ONLY by `maybe_close_epoch` method - uses the critical section of the maybe_close_epoch method.
-    If used separately, make sure to use a lock.
+    Returns the journal pending heartbeats and, for snapshots, a copy of the full data.
+    Must be called under the `EPOCHMON_MUTEX` lock.
     """
-    self.P(f"{self.__class__.__name__} saving epochs status for {len(self.__data)} nodes...")
-    
-    self.__full_data[SYNC_SAVES_TS].append(self.date_to_str())
-    self.__full_data[SYNC_SAVES_EP].append(self.__current_epoch)
-    self.__trim_history()
-    _full_data_copy = deepcopy(self.__full_data) # maybe not needed
-
-    self.log.save_pickle_to_data(
-      data=_full_data_copy, 
-      fn=FN_NAME,
-      subfolder_path=FN_SUBFOLDER,
-    )
-    return
+    lst_pending = self.__journal_pending
+    self.__journal_pending = []
+    _full_data_copy = None
+    if compact:
+      self.P(f"{self.__class__.__name__} saving epochs status for {len(self.__data)} nodes...")
+      self.__full_data[SYNC_SAVES_TS].append(self.date_to_str())
+      self.__full_data[SYNC_SAVES_EP].append(self.__current_epoch)
+      self.__trim_history()
+      _full_data_copy = deepcopy(self.__full_data)
+    return lst_pending, _full_data_copy
+
+
+  def __replay_journal(self, lst_journaled, epoch):
+    """
+    Re-applies the heartbeats journaled after the loaded snapshot (only the ones from `epoch`, the epoch
+    of the snapshot).
+    """
+    nr_replayed = 0
+    for lst_records in lst_journaled:
+      for node_addr, timestamp, str_date, hb_epoch in lst_records:
+        if hb_epoch != epoch:
+          continue
+        if node_addr not in self.__data:
+          self.__initialize_new_node(node_addr)
+        node_data = self.__data[node_addr]
+        node_data[EPCT.CURRENT_EPOCH][EPCT.HB_TIMESTAMPS].add(timestamp)
+        if node_data[EPCT.FIRST_SEEN] is None:
+          node_data[EPCT.FIRST_SEEN] = str_date
+        node_data[EPCT.LAST_SEEN] = str_date
+        nr_replayed += 1
+      #endfor records
+    #endfor journal entries
+    return nr_replayed
   
   
   def _load_status(self):
@@ -378,7 +431,7 @@ class EpochsManager(Singleton):
     NOTE: 2025-01-23 / AID: 
     ----------------------------
     This method is called only once at the beginning of the class initialization and it will
-    load the data previously saved to disk (via `__save_status` method) that in turn is called
+    load the data previously saved to disk (via `save_status` method) that in turn is called
     by `maybe_close_epoch` method. Thus the status is saved only when the epoch changes (and the
     hb timestamps are reset).
     This means that if a restart is done during a epoch, the data will be loaded from the last 
@@ -393,6 +446,7 @@ class EpochsManager(Singleton):
     result = False
     exists = self.log.get_data_file(FN_FULL) is not None
     last_epoch_save = None
+    lst_journaled = []
     if exists:
       self.P("Previous epochs state found. Current oracle era specs:\n{}".format(
         json.dumps(self.get_era_specs(), indent=2)
@@ -401,6 +455,10 @@ class EpochsManager(Singleton):
         fn=FN_NAME,
         subfolder_path=FN_SUBFOLDER
       )
+      # the snapshot plus the heartbeats journaled after it
+      _full_data, _journaled, discarded = self.__journal.recover(_full_data)
+      if discarded > 0:
+        self.P("Discarded {} bytes of incomplete epochs journal".format(discarded), color='r')
       if _full_data is not None:
         missing_fields = False
         try:
@@ -448,6 +506,7 @@ class EpochsManager(Singleton):
             # loaded data is full data
             self.__full_data = _full_data
             self.__data = _full_data[SYNC_NODES]
+            lst_journaled = _journaled
         # end if using new format
 
         # This is for the third version of the format and is done in this way
@@ -473,6 +532,9 @@ class EpochsManager(Singleton):
     self.__current_epoch = last_epoch_save
     self.__add_empty_fields()
     self.__compute_eth_to_internal()
+    nr_replayed = self.__replay_journal(lst_journaled, epoch=last_epoch_save)
+    if nr_replayed > 0:
+      self.P(f"Replayed {nr_replayed} journaled heartbeats of epoch {last_epoch_save}")
     if result:
       self.__full_data[SYNC_RELOADS].append(self.date_to_str())
       self.P(f"Epochs status loaded with {len(self.__data)} nodes", boxed=True)
@@ -492,7 +554,13 @@ class EpochsManager(Singleton):
     for node_addr in self.__data:
       for key in template:
         if key not in self.__data[node_addr]:
-          self.__data[node_addr][key] = template[key]
+          self.__data[node_addr][key] = deepcopy(template[key])
+      # previous versions kept the heartbeats as sets of datetimes
+      for epoch_key in [EPCT.CURRENT_EPOCH, EPCT.LAST_EPOCH]:
+        epoch_data = self.__data[node_addr][epoch_key]
+        if not isinstance(epoch_data.get(EPCT.HB_TIMESTAMPS), EpochHeartbeats):
+          epoch_data[EPCT.HB_TIMESTAMPS] = EpochHeartbeats(epoch_data.get(EPCT.HB_TIMESTAMPS))
+      #endfor epoch keys
 
     if SYNC_NODES not in self.__full_data:
       self.__full_data[SYNC_NODES] = self.__data
@@ -607,7 +675,11 @@ class EpochsManager(Singleton):
     """
     ts = hb[ct.PAYLOAD_DATA.EE_TIMESTAMP]
     tz = hb.get(ct.PAYLOAD_DATA.EE_TIMEZONE, "UTC+0")        
-    remote_datetime = datetime.strptime(ts, ct.HB.TIMESTAMP_FORMAT)
+    try:
+      # the C ISO parser is an order of magnitude faster than `strptime`
+      remote_datetime = datetime.fromisoformat(ts)
+    except ValueError:
+      remote_datetime = datetime.strptime(ts, ct.HB.TIMESTAMP_FORMAT)
     offset_hours = int(tz.replace("UTC", ""))
     utc_datetime = remote_datetime - timedelta(hours=offset_hours)
     # the utc_datetime is naive so we need to add the timezone info
@@ -625,9 +697,16 @@ class EpochsManager(Singleton):
     node_addr : str
       The node address.
     """
-    self.__data[node_addr][EPCT.LAST_EPOCH] = deepcopy(self.__data[node_addr][EPCT.CURRENT_EPOCH])
-    self.__data[node_addr][EPCT.CURRENT_EPOCH][EPCT.HB_TIMESTAMPS] = set()
-    self.__data[node_addr][EPCT.CURRENT_EPOCH][EPCT.ID] = self.get_time_epoch()
+    # the closed epoch data is moved (not copied) as the current epoch gets a fresh container
+    current_epoch_data = self.__data[node_addr][EPCT.CURRENT_EPOCH]
+    self.__data[node_addr][EPCT.LAST_EPOCH] = {
+      EPCT.ID             : current_epoch_data[EPCT.ID],
+      EPCT.HB_TIMESTAMPS  : current_epoch_data[EPCT.HB_TIMESTAMPS],
+    }
+    self.__data[node_addr][EPCT.CURRENT_EPOCH] = {
+      EPCT.ID             : self.get_time_epoch(),
+      EPCT.HB_TIMESTAMPS  : EpochHeartbeats(),
+    }
     return
 
 
@@ -636,58 +715,6 @@ class EpochsManager(Singleton):
       self.__reset_timestamps(node_addr)
     return
   
-  # FIXME: this method does not work as expected
-  def __calculate_avail_seconds(self, timestamps, time_between_heartbeats=10):
-    """
-    This method calculates the availability of a node in the current epoch 
-    based on the timestamps.
-
-    Parameters
-    ----------
-    timestamps : set
-      The set of timestamps for the current epoch.
-
-    time_between_heartbeats: int
-      Mandatory time between heartbeats in seconds.
-    
-    Returns
-    -------
-    int
-      The availability seconds interval.
-    """
-    avail_seconds = 0
-    nr_timestamps = len(timestamps)
-    
-    # need at least 2 hb timestamps to compute an interval 
-    if nr_timestamps <= 1:
-      return 0
-
-    start_timestamp = timestamps[0]
-    end_timestamp = timestamps[0]
-    for i in range(1, nr_timestamps):
-      # timestams should and must be sorted and in the same epoch
-      delta = (timestamps[i] - timestamps[i - 1]).seconds
-      # the delta between timestamps is bigger than the max heartbeat interval
-      # or less than half the heartbeat interval (ignore same heartbeat)
-      # TODO(AID): how can a heartbeat be sent more than once?
-      # TODO: detect fraud mechanism (someone spams with heartbeats)
-      if delta > (time_between_heartbeats + 5) or delta < (time_between_heartbeats / 2):
-        # this gets triggered when the delta is too big or too small so last interval 
-        # is considered invalid thus we compute up-to-last-valid interval availability
-        # (ended with the last set of end_timestamp as end of interval
-        avail_seconds += (end_timestamp - start_timestamp).seconds
-        start_timestamp = timestamps[i]
-      # endif delta
-
-      # change the end of the current interval
-      end_timestamp = timestamps[i]
-    #endfor each hb timestamp
-
-    # add the last interval length
-    avail_seconds += (end_timestamp - start_timestamp).seconds
-    return avail_seconds    
-
-
   def __calc_node_avail_seconds(self, node_addr, time_between_heartbeats=10, return_timestamps=False):
     if node_addr not in self.__data:
       self.__initialize_new_node(node_addr)
@@ -697,12 +724,10 @@ class EpochsManager(Singleton):
     current_epoch_data = node_data[EPCT.CURRENT_EPOCH]
     timestamps = current_epoch_data[EPCT.HB_TIMESTAMPS]
     current_epoch = current_epoch_data[EPCT.ID]
-    lst_timestamps = sorted(list(timestamps))
-    avail_seconds = self.__calculate_avail_seconds(
-      lst_timestamps, time_between_heartbeats=time_between_heartbeats
-    )
+    # O(1) for in-order heartbeats as the availability is accumulated in `register_data`
+    avail_seconds = timestamps.avail_seconds(time_between_heartbeats=time_between_heartbeats)
     if return_timestamps:
-      return avail_seconds, lst_timestamps, current_epoch
+      return avail_seconds, timestamps, current_epoch
     return avail_seconds
     
   def get_current_epoch_availability(self, node_addr=None, time_between_heartbeats=10):
@@ -729,7 +754,7 @@ class EpochsManager(Singleton):
     return prc_available
 
 
-  def __recalculate_current_epoch_for_node(self, node_addr, time_between_heartbeats=10):
+  def __recalculate_current_epoch_for_node(self, node_addr, time_between_heartbeats=10, avail_seconds=None):
     """
     This method recalculates the current epoch availability for a node. 
     It should be used when the epoch changes just before resetting the timestamps.
@@ -738,11 +763,16 @@ class EpochsManager(Singleton):
     ----------
     node_addr : str
       The node address.
+
+    avail_seconds : int, optional
+      The already computed availability seconds (see `__recalculate_current_epoch_for_all`).
     """
-    avail_seconds, lst_timestamps, current_epoch = self.__calc_node_avail_seconds(
+    computed_avail_seconds, timestamps, current_epoch = self.__calc_node_avail_seconds(
       node_addr, time_between_heartbeats=time_between_heartbeats,
       return_timestamps=True
     )
+    if avail_seconds is None:
+      avail_seconds = computed_avail_seconds
     max_possible = self.epoch_length
     prc_available = round(avail_seconds / max_possible, 4) # DO NOT USE 100% but 1.0 
     record_value = round(prc_available * EPOCH_MAX_VALUE)
@@ -753,9 +783,9 @@ class EpochsManager(Singleton):
         node_name = self.__data[node_addr][EPCT.NAME]
         node_name = node_name[:8]
         start_date, end_date = None, None
-        if len(lst_timestamps) >= 1:
-          start_date = self.date_to_str(lst_timestamps[0])
-          end_date = self.date_to_str(lst_timestamps[-1])
+        if len(timestamps) >= 1:
+          start_date = self.date_to_str(timestamps.first_date())
+          end_date = self.date_to_str(timestamps.last_date())
         str_node_addr = node_addr[:8] + '...' + node_addr[-3:]
         self.P("{:<8}<{}> avail in ep {}: {} ({:.2f}%) from {} to {}".format(
           node_name, str_node_addr, current_epoch, 
@@ -801,10 +831,13 @@ class EpochsManager(Singleton):
       self.P(msg, color='r')
     else:
       self.start_timer('recalc_all_nodes_epoch')
-      for node_addr in self.__data:
-        self.start_timer('recalc_node_epoch')
-        self.__recalculate_current_epoch_for_node(node_addr)
-        self.stop_timer('recalc_node_epoch')
+      # all the nodes are recomputed in a single vectorized pass
+      lst_nodes = list(self.__data.keys())
+      lst_avail_seconds = batch_avail_seconds([
+        self.__data[node_addr][EPCT.CURRENT_EPOCH][EPCT.HB_TIMESTAMPS] for node_addr in lst_nodes
+      ])
+      for node_addr, avail_seconds in zip(lst_nodes, lst_avail_seconds):
+        self.__recalculate_current_epoch_for_node(node_addr, avail_seconds=avail_seconds)
       self.stop_timer('recalc_all_nodes_epoch')
     # endif current node was not 100% available
     return
@@ -817,6 +850,7 @@ class EpochsManager(Singleton):
     for all nodes and then resetting the timestamps.
     """
     result = 0 # assume no epoch change
+    epoch_changed = False
     with self.log.managed_lock_resource(EPOCHMON_MUTEX):
       current_epoch = self.get_time_epoch()
       if self.__current_epoch is None:
@@ -833,9 +867,11 @@ class EpochsManager(Singleton):
         self.P("Starting epoch: {}".format(current_epoch))
         self.__current_epoch = current_epoch 
         self.__reset_all_timestamps()
-        self.__save_status()  # save fresh status current epoch
+        epoch_changed = True
         #endif epoch is not the same as the current one
       #endif current epoch is not None
+    if epoch_changed:
+      self.save_status(force_snapshot=True)  # save fresh status current epoch
     return result
 
 
@@ -898,8 +934,10 @@ class EpochsManager(Singleton):
       # the remote epoch is the same as the local epoch so we can register the heartbeat
       with self.log.managed_lock_resource(EPOCHMON_MUTEX):
         # add the heartbeat timestamp for the current epoch
-        self.__data[node_addr][EPCT.CURRENT_EPOCH][EPCT.HB_TIMESTAMPS].add(dt_remote_utc)
+        timestamp = int(dt_remote_utc.timestamp())
+        self.__data[node_addr][EPCT.CURRENT_EPOCH][EPCT.HB_TIMESTAMPS].add(timestamp)
         self.__data[node_addr][EPCT.LAST_SEEN] = str_date
+        self.__journal_pending.append((node_addr, timestamp, str_date, remote_epoch))
       # endwith lock
     else:
       self.P("Received invalid epoch {} from node {} on epoch {}".format(
@@ -1220,9 +1258,8 @@ class EpochsManager(Singleton):
           node_current_epoch_data = self.data[node_addr][EPCT.CURRENT_EPOCH]
           node_current_epoch_id = node_current_epoch_data[EPCT.ID]
           node_current_epoch_hb_timestamps = node_current_epoch_data[EPCT.HB_TIMESTAMPS]
-          node_current_epoch_hb_timestamps = sorted(list(node_current_epoch_hb_timestamps))
-          node_current_epoch_1st_hb = node_current_epoch_hb_timestamps[0] if len(node_current_epoch_hb_timestamps) > 0 else None
-          node_current_epoch_last_hb = node_current_epoch_hb_timestamps[-1] if len(node_current_epoch_hb_timestamps) > 0 else None
+          node_current_epoch_1st_hb = node_current_epoch_hb_timestamps.first_date()
+          node_current_epoch_last_hb = node_current_epoch_hb_timestamps.last_date()
           node_current_epoch_nr_hb = len(node_current_epoch_hb_timestamps)
         except:
           pass
@@ -1232,14 +1269,11 @@ class EpochsManager(Singleton):
         node_last_epoch_data = self.data[node_addr][EPCT.LAST_EPOCH]
         node_last_epoch_id = node_last_epoch_data[EPCT.ID]
         node_last_epoch_hb_timestamps = node_last_epoch_data[EPCT.HB_TIMESTAMPS]
-        node_last_epoch_hb_timestamps = sorted(list(node_last_epoch_hb_timestamps))
-        node_last_epoch_1st_hb = node_last_epoch_hb_timestamps[0] if len(node_last_epoch_hb_timestamps) > 0 else None
-        node_last_epoch_1st_hb = self.date_to_str(node_last_epoch_1st_hb)
-        node_last_epoch_last_hb = node_last_epoch_hb_timestamps[-1] if len(node_last_epoch_hb_timestamps) > 0 else None
-        node_last_epoch_last_hb = self.date_to_str(node_last_epoch_last_hb)
+        node_last_epoch_1st_hb = self.date_to_str(node_last_epoch_hb_timestamps.first_date())
+        node_last_epoch_last_hb = self.date_to_str(node_last_epoch_hb_timestamps.last_date())
         node_last_epoch_nr_hb = len(node_last_epoch_hb_timestamps)
         node_last_epoch_avail = round(
-          self.__calculate_avail_seconds(node_last_epoch_hb_timestamps) / self.epoch_length, 4
+          node_last_epoch_hb_timestamps.avail_seconds() / self.epoch_length, 4
         )
         
         epochs_ids = sorted(list(dct_epochs.keys()))
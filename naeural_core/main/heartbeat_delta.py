@@ -0,0 +1,171 @@
+"""
+Delta encoding of the heartbeats.
+
+Most of a heartbeat (pipelines, active plugins, GPU info, versions, whitelist, etc.) does not change between
+two consecutive beats. With delta encoding enabled a node sends a full snapshot every `full_every` beats and
+in between only the fields that differ from the last full snapshot (plus a few fields that are always
+sent). As the deltas are relative to the snapshot and not to the previous beat, a lost delta does not affect
+the following ones - only the loss of a snapshot does, until the next one.
+
+The delta information is carried in the `HB_DELTA` key of the heartbeat:
+  BASE    : id of the full snapshot (unique for each sender process)
+  SEQ     : heartbeat sequence number
+  FULL    : True for a full snapshot
+  REMOVED : the keys of the snapshot that are not present anymore (deltas only)
+
+Receivers rebuild the full heartbeat with `HeartbeatDeltaDecoder`; heartbeats without `HB_DELTA` are
+returned unchanged.
+"""
+import json
+import uuid
+
+from naeural_core import constants as ct
+
+HB_DELTA = 'HB_DELTA'
+HB_DELTA_BASE = 'BASE'
+HB_DELTA_SEQ = 'SEQ'
+HB_DELTA_FULL = 'FULL'
+HB_DELTA_REMOVED = 'REMOVED'
+
+DEFAULT_FULL_EVERY = 10
+
+# fields sent in each heartbeat even if unchanged (used as such by the sender and the receivers)
+ALWAYS_SENT_KEYS = [
+  ct.HB.CURRENT_TIME,
+  ct.HB.TIMESTAMP,
+  ct.HB.EE_ADDR,
+  ct.HB.DEVICE_STATUS,
+  ct.HB.EE_HB_TIME,
+  ct.HB.NR_INFERENCES,
+  ct.HB.NR_PAYLOADS,
+  ct.HB.NR_STREAMS_DATA,
+]
+
+
+def _serialize_value(value):
+  try:
+    return json.dumps(value)
+  except Exception:
+    # not comparable - always sent
+    return None
+
+
+class HeartbeatDeltaEncoder:
+  def __init__(self, full_every=DEFAULT_FULL_EVERY):
+    """
+    Parameters
+    ----------
+    full_every : int
+      a full snapshot is sent every `full_every` heartbeats (1 disables the deltas).
+    """
+    self.full_every = max(int(full_every), 1)
+    self._session = uuid.uuid4().hex[:8]
+    self._base = None
+    self._base_id = None
+    self._seq = 0
+    self._since_full = 0
+    self.nr_full = 0
+    self.nr_delta = 0
+    return
+
+  def encode(self, dct_status, force_full=False):
+    """
+    Returns the heartbeat to be sent (full snapshot or delta) with its `HB_DELTA` information.
+    """
+    self._seq += 1
+    serialized = {k: _serialize_value(v) for k, v in dct_status.items()}
+    is_full = force_full or self._base is None or self._since_full >= self.full_every - 1
+    if is_full:
+      self._base = serialized
+      self._base_id = '{}:{}'.format(self._session, self._seq)
+      self._since_full = 0
+      self.nr_full += 1
+      result = dict(dct_status)
+      result[HB_DELTA] = {
+        HB_DELTA_BASE : self._base_id,
+        HB_DELTA_SEQ  : self._seq,
+        HB_DELTA_FULL : True,
+      }
+      return result
+    #endif full snapshot
+
+    self._since_full += 1
+    self.nr_delta += 1
+    result = {}
+    for k, v in dct_status.items():
+      s = serialized[k]
+      if k in ALWAYS_SENT_KEYS or s is None or self._base.get(k) != s:
+        result[k] = v
+    #endfor changed keys
+    result[HB_DELTA] = {
+      HB_DELTA_BASE     : self._base_id,
+      HB_DELTA_SEQ      : self._seq,
+      HB_DELTA_FULL     : False,
+      HB_DELTA_REMOVED  : [k for k in self._base if k not in dct_status],
+    }
+    return result
+
+  def get_status(self):
+    return {
+      'FULL_EVERY'  : self.full_every,
+      'SEQ'         : self._seq,
+      'FULL'        : self.nr_full,
+      'DELTA'       : self.nr_delta,
+    }
+
+
+class HeartbeatDeltaDecoder:
+  def __init__(self):
+    self._bases = {}
+    self._missed = {}
+    self.nr_full = 0
+    self.nr_delta = 0
+    self.nr_missed = 0
+    return
+
+  def decode(self, addr, data):
+    """
+    Returns the full heartbeat of the `addr` sender or None for a delta whose snapshot was not received
+    (the sender will send a new snapshot in at most `full_every` beats).
+    """
+    info = data.pop(HB_DELTA, None)
+    if not isinstance(info, dict):
+      return data
+    base_id = info.get(HB_DELTA_BASE)
+    if info.get(HB_DELTA_FULL):
+      # copy as the receiver pipeline consumes some of the keys of the returned heartbeat
+      self._bases[addr] = (base_id, dict(data))
+      self._missed.pop(addr, None)
+      self.nr_full += 1
+      return data
+    #endif full snapshot
+
+    base = self._bases.get(addr)
+    if base is None or base[0] != base_id:
+      self.nr_missed += 1
+      missed_base, count = self._missed.get(addr, (None, 0))
+      self._missed[addr] = (base_id, count + 1 if missed_base == base_id else 1)
+      return None
+    #endif missing snapshot
+    result = {
+      **base[1],
+      **data,
+    }
+    for k in info.get(HB_DELTA_REMOVED, []):
+      result.pop(k, None)
+    self.nr_delta += 1
+    return result
+
+  def get_missed(self, addr):
+    """
+    Returns the number of consecutive deltas of `addr` dropped while waiting for their snapshot.
+    """
+    return self._missed.get(addr, (None, 0))[1]
+
+  def get_status(self):
+    return {
+      'NODES'   : len(self._bases),
+      'FULL'    : self.nr_full,
+      'DELTA'   : self.nr_delta,
+      'MISSED'  : self.nr_missed,
+    }
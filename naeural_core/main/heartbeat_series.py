@@ -0,0 +1,255 @@
+"""
+Columnar heartbeat history for the network monitor.
+
+Each remote node gets a `HeartbeatSeries`: the time-series values of its heartbeats are extracted once,
+at ingestion, into numpy columns (received timestamp as epoch float, cpu, memory, disk, default gpu
+load/memory/temperature) plus a few light object columns (remote timestamps, device status, temperature
+info). Only the latest heartbeat is kept as the full dict.
+
+The columns live in a contiguous window `[start, end)` of buffers that are twice the history size: new
+rows are appended at the end and, when the buffers are exhausted, the last `maxlen` rows are moved at the
+beginning (amortized O(1)). This keeps the received timestamps sorted and contiguous so interval queries
+are simple binary searches.
+"""
+
+import numpy as np
+
+from datetime import datetime as dt
+
+from naeural_core import constants as ct
+
+
+FLOAT_COLUMNS = [
+  'ts',             # local epoch of the moment the heartbeat was received
+  'cpu',            # CPU_USED
+  'avail_mem',      # AVAILABLE_MEMORY
+  'proc_mem',       # PROCESS_MEMORY
+  'avail_disk',     # AVAILABLE_DISK
+  'gpu_idx',        # index of the default gpu (nan if the heartbeat has no info for it)
+  'gpu_used',
+  'gpu_free_mem',
+  'gpu_total_mem',
+  'gpu_temp',
+  'gpu_temp_max',
+  'gpu_fan',
+]
+
+OBJECT_COLUMNS = [
+  'current_time',   # CURRENT_TIME
+  'ee_timestamp',   # EE_TIMESTAMP
+  'received_time',  # RECEIVED_TIME
+  'status',         # DEVICE_STATUS
+  'temp_info',      # TEMPERATURE_INFO
+]
+
+GPU_KEYS = {
+  'gpu_used'      : 'GPU_USED',
+  'gpu_free_mem'  : 'FREE_MEM',
+  'gpu_total_mem' : 'TOTAL_MEM',
+  'gpu_temp'      : 'GPU_TEMP',
+  'gpu_temp_max'  : 'GPU_TEMP_MAX',
+  'gpu_fan'       : 'GPU_FAN_SPEED',
+}
+
+_INITIAL_CAPACITY = 32
+
+
+def _to_float(value):
+  if isinstance(value, bool) or not isinstance(value, (int, float, np.number)):
+    return np.nan
+  return float(value)
+
+
+def _to_value(value):
+  return None if np.isnan(value) else float(value)
+
+
+def _default_gpu_index(hb):
+  default_cuda = hb.get(ct.HB.DEFAULT_CUDA)
+  if not isinstance(default_cuda, str) or ':' not in default_cuda:
+    return None
+  try:
+    return int(default_cuda.split(':')[1])
+  except ValueError:
+    return None
+
+
+class HeartbeatSeries:
+  def __init__(self, maxlen):
+    self.maxlen = maxlen
+    self.last = None
+    self._start = 0
+    self._end = 0
+    self._capacity = 0
+    self._float = np.zeros((len(FLOAT_COLUMNS), 0), dtype=np.float64)
+    self._object = np.empty((len(OBJECT_COLUMNS), 0), dtype=object)
+    self._float_idx = {k: i for i, k in enumerate(FLOAT_COLUMNS)}
+    self._object_idx = {k: i for i, k in enumerate(OBJECT_COLUMNS)}
+    return
+
+  def __len__(self):
+    return self._end - self._start
+
+  def __getstate__(self):
+    # only the used window is saved
+    state = self.__dict__.copy()
+    state['_float'] = self._float[:, self._start:self._end].copy()
+    state['_object'] = self._object[:, self._start:self._end].copy()
+    state['_start'], state['_end'] = 0, len(self)
+    state['_capacity'] = len(self)
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    return
+
+  def copy(self):
+    """
+    Returns a detached copy of the used window (the rows are copied, the object values are shared).
+    """
+    clone = HeartbeatSeries.__new__(HeartbeatSeries)
+    clone.__setstate__(self.__getstate__())
+    return clone
+
+  def _make_room(self):
+    if self._end < self._capacity:
+      return
+    count = self._end - self._start
+    if self._capacity < 2 * self.maxlen:
+      # grow (the history of most nodes is short lived so we do not pre-allocate)
+      new_capacity = min(2 * self.maxlen, max(_INITIAL_CAPACITY, 2 * self._capacity))
+      new_float = np.full((len(FLOAT_COLUMNS), new_capacity), np.nan, dtype=np.float64)
+      new_object = np.empty((len(OBJECT_COLUMNS), new_capacity), dtype=object)
+      new_float[:, :count] = self._float[:, self._start:self._end]
+      new_object[:, :count] = self._object[:, self._start:self._end]
+      self._float, self._object = new_float, new_object
+      self._capacity = new_capacity
+    else:
+      # move the window at the beginning of the buffers
+      self._float[:, :count] = self._float[:, self._start:self._end]
+      self._object[:, :count] = self._object[:, self._start:self._end]
+      self._object[:, count:] = None
+    #endif grow or compact
+    self._start, self._end = 0, count
+    return
+
+  def append(self, hb, received_ts):
+    """
+    Extracts the time-series values of `hb` and keeps `hb` as the latest full heartbeat.
+
+    Parameters
+    ----------
+    hb : dict
+      the heartbeat.
+
+    received_ts : float
+      local epoch of the moment the heartbeat was received.
+    """
+    self._make_room()
+    i = self._end
+    col = self._float_idx
+    fl = self._float
+    fl[:, i] = np.nan
+    fl[col['ts'], i] = received_ts
+    fl[col['cpu'], i] = _to_float(hb.get(ct.HB.CPU_USED))
+    fl[col['avail_mem'], i] = _to_float(hb.get(ct.HB.AVAILABLE_MEMORY))
+    fl[col['proc_mem'], i] = _to_float(hb.get(ct.HB.PROCESS_MEMORY))
+    fl[col['avail_disk'], i] = _to_float(hb.get(ct.HB.AVAILABLE_DISK))
+    gpus = hb.get(ct.HB.GPUS)
+    gpu_idx = _default_gpu_index(hb)
+    if isinstance(gpus, list) and gpu_idx is not None and gpu_idx < len(gpus) and isinstance(gpus[gpu_idx], dict):
+      dct_gpu = gpus[gpu_idx]
+      fl[col['gpu_idx'], i] = gpu_idx
+      for column, key in GPU_KEYS.items():
+        fl[col[column], i] = _to_float(dct_gpu.get(key))
+    #endif gpu info
+
+    ob = self._object
+    ocol = self._object_idx
+    ob[ocol['current_time'], i] = hb.get(ct.HB.CURRENT_TIME)
+    ob[ocol['ee_timestamp'], i] = hb.get(ct.PAYLOAD_DATA.EE_TIMESTAMP)
+    ob[ocol['received_time'], i] = hb.get(ct.HB.RECEIVED_TIME)
+    ob[ocol['status'], i] = hb.get(ct.HB.DEVICE_STATUS)
+    ob[ocol['temp_info'], i] = hb.get(ct.HB.TEMPERATURE_INFO)
+
+    self._end += 1
+    if self._end - self._start > self.maxlen:
+      self._start += 1
+    self.last = hb
+    return
+
+  def interval(self, minutes, dt_now=None):
+    """
+    Returns the absolute `(lo, hi)` window of the rows received in the last `minutes` before `dt_now`.
+    """
+    if dt_now is None:
+      dt_now = dt.now()
+    now_ts = dt_now.timestamp()
+    ts = self._float[self._float_idx['ts'], self._start:self._end]
+    lo = np.searchsorted(ts, now_ts - minutes * 60, side='left')
+    hi = np.searchsorted(ts, now_ts, side='right')
+    return self._start + lo, self._start + max(lo, hi)
+
+  def last_rows(self, nr):
+    return max(self._start, self._end - nr), self._end
+
+  def column(self, name, lo, hi, reverse_order=True):
+    """
+    Returns the `name` column values for the absolute window `(lo, hi)` as a list.
+    """
+    if name in self._float_idx:
+      values = self._float[self._float_idx[name], lo:hi]
+    else:
+      values = self._object[self._object_idx[name], lo:hi]
+    if reverse_order:
+      values = values[::-1]
+    return values.tolist()
+
+  def default_gpu_statuses(self, lo, hi, reverse_order=True):
+    """
+    Returns the default gpu status dicts for the window or None if any of the heartbeats has no gpu info.
+    """
+    fl = self._float[:, lo:hi]
+    if np.isnan(fl[self._float_idx['gpu_idx']]).any():
+      return None
+    columns = {key: fl[self._float_idx[column]].tolist() for column, key in GPU_KEYS.items()}
+    result = [
+      {key: _to_value(values[i]) for key, values in columns.items()}
+      for i in range(hi - lo)
+    ]
+    if reverse_order:
+      result = result[::-1]
+    return result
+
+  def to_heartbeats(self, lo=None, hi=None):
+    """
+    Rebuilds light heartbeat dicts (time-series values only) for the window, oldest first. The last
+    heartbeat is returned complete.
+    """
+    lo = self._start if lo is None else lo
+    hi = self._end if hi is None else hi
+    result = []
+    for i in range(lo, hi):
+      if i == self._end - 1 and self.last is not None:
+        result.append(self.last)
+        continue
+      fl = {k: _to_value(self._float[j, i]) for k, j in self._float_idx.items()}
+      ob = {k: self._object[j, i] for k, j in self._object_idx.items()}
+      hb = {
+        ct.HB.CURRENT_TIME: ob['current_time'],
+        ct.PAYLOAD_DATA.EE_TIMESTAMP: ob['ee_timestamp'],
+        ct.HB.RECEIVED_TIME: ob['received_time'],
+        ct.HB.DEVICE_STATUS: ob['status'],
+        ct.HB.TEMPERATURE_INFO: ob['temp_info'],
+        ct.HB.CPU_USED: fl['cpu'],
+        ct.HB.AVAILABLE_MEMORY: fl['avail_mem'],
+        ct.HB.PROCESS_MEMORY: fl['proc_mem'],
+        ct.HB.AVAILABLE_DISK: fl['avail_disk'],
+      }
+      if fl['gpu_idx'] is not None:
+        gpu_idx = int(fl['gpu_idx'])
+        hb[ct.HB.DEFAULT_CUDA] = 'cuda:{}'.format(gpu_idx)
+        hb[ct.HB.GPUS] = [{} for _ in range(gpu_idx)] + [{key: fl[column] for column, key in GPU_KEYS.items()}]
+      result.append(hb)
+    #endfor rows
+    return result
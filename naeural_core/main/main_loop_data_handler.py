@@ -1,12 +1,24 @@
 from naeural_core import DecentrAIObject
 from naeural_core import Logger
 import json
+from collections import namedtuple
 from naeural_core.serving.ai_engines.utils import (
   get_serving_process_given_ai_engine,
   get_ai_engine_given_serving_process,
   get_params_given_ai_engine
 )
 
+# one (stream, inference params) entry of a serving process with everything needed at inference time
+_ServingRoute = namedtuple('_ServingRoute', [
+  'stream',           # stream name
+  'ai_engine',        # ai engine key used in the business plugins INFERENCES
+  'biz_params_json',  # `INFERENCE_AI_ENGINE_PARAMS` as json string (upstream key)
+  'biz_params',       # decoded `INFERENCE_AI_ENGINE_PARAMS`
+  'serving_params',   # ai engine params overwritten by `biz_params`
+  'instances',        # hashes of the instances that receive the inference
+])
+
+
 class MainLoopDataHandler(DecentrAIObject):
   """
   In order to understand the methods of this class please study below data inputs:
@@ -129,6 +141,11 @@ class MainLoopDataHandler(DecentrAIObject):
     self._dct_serving_processes_details = None
 
     self.dct_business_inputs = None
+    # routing table compiled from `_dct_serving_processes_details` (see `_maybe_compile_routing`)
+    self._routing_details = None
+    self._routing = {}
+    # async serving: ticket -> business inputs waiting for inferences (see `defer_business_inputs`)
+    self._async_bundles = {}
     super(MainLoopDataHandler, self).__init__(log=log, prefix_log='[DAGGM]', **kwargs)
     return
 
@@ -154,6 +171,53 @@ class MainLoopDataHandler(DecentrAIObject):
     self._dct_captures = dct_captures
     self._dct_instances_details = dct_instances_details
     self._dct_serving_processes_details = dct_serving_processes_details
+    self._maybe_compile_routing()
+    return
+
+  def _maybe_compile_routing(self):
+    """
+    Compiles the serving routing table whenever the serving processes details change:
+      {
+        serving_process : [_ServingRoute(stream, ai_engine, biz_params_json, biz_params, serving_params, instances), ...],
+        ...
+      }
+    so that the per-iteration aggregation and inferences distribution do not need any json decoding
+    or ai engine lookups. The details are rebuilt by the business manager on each iteration so the
+    (cheap) equality check is used instead of identity.
+    """
+    if self._routing_details is not None and self._routing_details == self._dct_serving_processes_details:
+      return
+    self.log.start_timer('compile_routing')
+    dct_routing = {}
+    for ai_engine, dct in self._dct_serving_processes_details.items():
+      serving_process = get_serving_process_given_ai_engine(ai_engine)
+      # next we get params from AI ENGINE config
+      ai_engine_params = get_params_given_ai_engine(ai_engine)
+      # keep the key used by the business plugins as returned by the serving process reverse lookup
+      inference_ai_engine = get_ai_engine_given_serving_process(
+        serving_process=serving_process,
+        params=ai_engine_params,
+      )
+      lst_routes = dct_routing.setdefault(serving_process, [])
+      for (stream, biz_plugin_model_params_json), instances in dct.items():
+        biz_params = json.loads(biz_plugin_model_params_json)
+        lst_routes.append(_ServingRoute(
+          stream=stream,
+          ai_engine=inference_ai_engine,
+          biz_params_json=biz_plugin_model_params_json,
+          biz_params=biz_params,
+          # order is important - biz plugin should overwrite AI_ENGINE params
+          serving_params={**ai_engine_params, **biz_params},
+          instances=tuple(self._dct_serving_processes_details.get(inference_ai_engine, {}).get(
+            (stream, biz_plugin_model_params_json), instances
+          )),
+        ))
+      #endfor
+    #endfor
+    self._routing = dct_routing
+    # deep enough copy for later comparison as the details might be altered in-place upstream
+    self._routing_details = {k: {t: list(v) for t, v in dct.items()} for k, dct in self._dct_serving_processes_details.items()}
+    self.log.stop_timer('compile_routing')
     return
 
   def _get_stream_captured_data(self, stream_name):
@@ -218,26 +282,26 @@ class MainLoopDataHandler(DecentrAIObject):
     self._dct_models_stream_idx = {}
     dct_servers_inputs = {}
     
-    for ai_engine, dct in self._dct_serving_processes_details.items():
-      # TODO:
-      #   AI_ENGINE handling should be done in ServingManager
-      serving_process = get_serving_process_given_ai_engine(ai_engine)
-      # next we get params from AI ENGINE config
-      ai_engine_params = get_params_given_ai_engine(ai_engine)
-      dct_servers_inputs[serving_process] = []
-      self._dct_models_stream_idx[serving_process] = {}
-      i = 0
-      for _, (stream, biz_plugin_model_params_json) in enumerate(list(dct.keys())):
-        server_input = self._get_stream_captured_data(stream)
+    # the routes are compiled in `update` only when the serving processes details change
+    for serving_process, lst_routes in self._routing.items():
+      lst_server_inputs = []
+      dct_stream_idx = {}
+      runs_on_empty_input = None
+      for route in lst_routes:
+        server_input = self._get_stream_captured_data(route.stream)
         ### make sure that data was collected on this particular stream
-        if bool(server_input) or self.owner.serving_manager.server_runs_on_empty_input(serving_process): 
-          # order is important - biz plugin should overwrite AI_ENGINE params
-          server_input['SERVING_PARAMS'] = {**ai_engine_params, **json.loads(biz_plugin_model_params_json)}
-          dct_servers_inputs[serving_process].append(server_input)
-          self._dct_models_stream_idx[serving_process][i] = (stream, biz_plugin_model_params_json, ai_engine_params)
-          i += 1
-        #endif
+        if not server_input:
+          if runs_on_empty_input is None:
+            runs_on_empty_input = self.owner.serving_manager.server_runs_on_empty_input(serving_process)
+          if not runs_on_empty_input:
+            continue
+        #endif no data
+        server_input['SERVING_PARAMS'] = {**route.serving_params}
+        dct_stream_idx[len(lst_server_inputs)] = route
+        lst_server_inputs.append(server_input)
       #endfor
+      dct_servers_inputs[serving_process] = lst_server_inputs
+      self._dct_models_stream_idx[serving_process] = dct_stream_idx
     #endfor
 
     """
@@ -257,6 +321,29 @@ class MainLoopDataHandler(DecentrAIObject):
 
     return dct_servers_inputs ## this object will be input for ServingManager's `predict_parallel`
 
+  def _append_server_output(self, dct_business_inputs, dct_models_stream_idx, serving_process, dct_output):
+    if dct_output is None:
+      return
+    for i, model_inference in enumerate(dct_output['INFERENCES']):
+      route = dct_models_stream_idx[serving_process][i]
+      ai_engine = route.ai_engine
+      for instance in route.instances:
+        if instance not in dct_business_inputs:
+          continue
+        if 'SERVING_PARAMS' not in dct_business_inputs[instance]:
+          dct_business_inputs[instance]['SERVING_PARAMS'] = {}
+        if 'INFERENCES' not in dct_business_inputs[instance]:
+          dct_business_inputs[instance]['INFERENCES'] = {}
+        if 'INFERENCES_META' not in dct_business_inputs[instance]:
+          dct_business_inputs[instance]['INFERENCES_META'] = {}
+
+        dct_business_inputs[instance]['SERVING_PARAMS'][ai_engine] = {**route.biz_params}
+        dct_business_inputs[instance]['INFERENCES'][ai_engine] = model_inference
+        dct_business_inputs[instance]['INFERENCES_META'][ai_engine] = dct_output['INFERENCES_META']
+      # endfor - each business plugin that should receive the input from the current inference
+    # endfor - each inference for current model
+    return
+
   def append_inferences(self, dct_models_outputs):
     """
     
@@ -297,29 +384,12 @@ class MainLoopDataHandler(DecentrAIObject):
     """
 
     for serving_process, dct_output in dct_models_outputs.items():
-      if dct_output is None:
-        continue
-      for i, model_inference in enumerate(dct_output['INFERENCES']):
-        stream, biz_plugin_model_params_json, ai_engine_params = self._dct_models_stream_idx[serving_process][i]
-        ai_engine = get_ai_engine_given_serving_process(
-          serving_process=serving_process, 
-          params=ai_engine_params
-        )
-        key = (stream, biz_plugin_model_params_json)
-        suited_instances_for_crt_inference = self._dct_serving_processes_details[ai_engine][key]
-        for instance in suited_instances_for_crt_inference:
-          if 'SERVING_PARAMS' not in self.dct_business_inputs[instance]:
-            self.dct_business_inputs[instance]['SERVING_PARAMS'] = {}
-          if 'INFERENCES' not in self.dct_business_inputs[instance]:
-            self.dct_business_inputs[instance]['INFERENCES'] = {}
-          if 'INFERENCES_META' not in self.dct_business_inputs[instance]:
-            self.dct_business_inputs[instance]['INFERENCES_META'] = {}
-
-          self.dct_business_inputs[instance]['SERVING_PARAMS'][ai_engine] = json.loads(biz_plugin_model_params_json)
-          self.dct_business_inputs[instance]['INFERENCES'][ai_engine] = model_inference
-          self.dct_business_inputs[instance]['INFERENCES_META'][ai_engine] = dct_output['INFERENCES_META']
-        # endfor - each business plugin that should receive the input from the current inference
-      # endfor - each inference for current model
+      self._append_server_output(
+        dct_business_inputs=self.dct_business_inputs,
+        dct_models_stream_idx=self._dct_models_stream_idx,
+        serving_process=serving_process,
+        dct_output=dct_output,
+      )
     # endfor - each model with its inferences
 
     """
@@ -373,3 +443,88 @@ class MainLoopDataHandler(DecentrAIObject):
     }
     """
     return
+
+  def defer_business_inputs(self, ticket):
+    """
+    Async serving (see `ServingManager.predict_parallel_async`): moves the business inputs of the
+    instances that expect inferences for the current collected data out of `self.dct_business_inputs`
+    into a bundle identified by `ticket`. The bundle keeps its own routing info (as the routing table
+    may be recompiled until the inferences arrive) and is completed by `append_async_inferences`.
+    Must be called after `aggregate_for_inference` and `append_captures`.
+    """
+    dct_waiting = {}
+    dct_waiting_by_server = {}
+    for serving_process, dct_stream_idx in self._dct_models_stream_idx.items():
+      for route in dct_stream_idx.values():
+        for instance in route.instances:
+          if instance not in self.dct_business_inputs:
+            continue
+          dct_waiting.setdefault(instance, set()).add(serving_process)
+          dct_waiting_by_server.setdefault(serving_process, set()).add(instance)
+        # endfor instances
+      # endfor streams
+    # endfor serving processes
+
+    if len(dct_waiting) == 0:
+      return
+
+    self._async_bundles[ticket] = {
+      'INPUTS'            : {instance : self.dct_business_inputs.pop(instance) for instance in dct_waiting},
+      'WAITING'           : dct_waiting,
+      'WAITING_BY_SERVER' : dct_waiting_by_server,
+      'STREAM_IDX'        : self._dct_models_stream_idx,
+    }
+    return
+
+  def append_async_inferences(self, lst_completed):
+    """
+    Appends the async inferences to their deferred business inputs.
+
+    Parameters:
+    ----------
+    lst_completed:
+      The response of ServingManager's `predict_parallel_async` - list of `(ticket, serving_process, output)`
+
+    Returns
+    -------
+    list of business inputs dicts (same format as `dct_business_inputs`) in ticket order, the current
+    `dct_business_inputs` being the last one. Each instance appears at most once in each dict.
+    """
+    for ticket, serving_process, dct_output in lst_completed:
+      bundle = self._async_bundles.get(ticket)
+      if bundle is None:
+        continue
+      self._append_server_output(
+        dct_business_inputs=bundle['INPUTS'],
+        dct_models_stream_idx=bundle['STREAM_IDX'],
+        serving_process=serving_process,
+        dct_output=dct_output,
+      )
+      for instance in bundle['WAITING_BY_SERVER'].pop(serving_process, []):
+        bundle['WAITING'][instance].discard(serving_process)
+    # endfor completed requests
+
+    lst_business_inputs = []
+    blocked = set() # instances still waiting in older bundles must receive their inputs in order
+    for ticket in list(self._async_bundles.keys()):
+      bundle = self._async_bundles[ticket]
+      ready = [
+        instance for instance, servers in bundle['WAITING'].items() 
+        if len(servers) == 0 and instance not in blocked
+      ]
+      dct_ready = {}
+      for instance in ready:
+        bundle['WAITING'].pop(instance)
+        inputs = bundle['INPUTS'].pop(instance)
+        if instance in self._dct_instances_details:
+          # the instance might have been closed in the meantime
+          dct_ready[instance] = inputs
+      # endfor ready instances
+      blocked.update(bundle['WAITING'].keys())
+      if len(dct_ready) > 0:
+        lst_business_inputs.append(dct_ready)
+      if len(bundle['WAITING']) == 0:
+        del self._async_bundles[ticket]
+    # endfor bundles in ticket order
+    lst_business_inputs.append(self.dct_business_inputs)
+    return lst_business_inputs
@@ -0,0 +1,125 @@
+"""
+Pipelined main loop support.
+
+When `PIPELINED_MAIN_LOOP` is enabled the capture collection stage of the main loop (draining the DCTs
+queues and aggregating the meta-streams) runs on its own thread and pushes the collected data in a bounded
+queue. This way the collection for iteration N+1 overlaps with the inference and business plugins
+execution of iteration N (the communication stage already runs on its own `async_comm` thread).
+The bounded queue gives backpressure: when the main loop falls behind, the collection stage waits and the
+DCTs apply their own dropping policy on their deques.
+"""
+
+import traceback
+
+from queue import Queue, Empty, Full
+from threading import Thread, RLock, get_ident
+from time import sleep, perf_counter
+
+from naeural_core import constants as ct
+from naeural_core import DecentrAIObject
+
+__VER__ = '0.1.0'
+
+
+class MainLoopPipeline(DecentrAIObject):
+  def __init__(self, owner, queue_size=2, idle_sleep=0.001, **kwargs):
+    """
+    Parameters
+    ----------
+    owner : Orchestrator
+      the orchestrator that owns the capture manager and the application monitor.
+
+    queue_size : int
+      max number of collected iterations waiting for the main loop.
+
+    idle_sleep : float
+      sleep time of the collection stage when no data is available.
+    """
+    self.owner = owner
+    self._queue_size = max(1, int(queue_size))
+    self._idle_sleep = idle_sleep
+    self._queue = None
+    self._thread = None
+    self._thread_id = None
+    self._done = False
+    self.lock = RLock()
+    self._nr_collected = 0
+    self._nr_full_waits = 0
+    super(MainLoopPipeline, self).__init__(prefix_log='[MLPIPE]', **kwargs)
+    return
+
+  def startup(self):
+    super().startup()
+    self._queue = Queue(maxsize=self._queue_size)
+    return
+
+  def start(self):
+    self._done = False
+    self._thread = Thread(
+      target=self._run_collect_stage,
+      args=(),
+      name=ct.THREADS_PREFIX + 'mloop_collect',
+      daemon=True,
+    )
+    self._thread.start()
+    self.P("Pipelined main loop collection stage started (queue size: {})".format(self._queue_size), color='g')
+    return
+
+  def stop(self):
+    self._done = True
+    if self._thread is not None and self._thread.is_alive():
+      self._thread.join(timeout=5)
+    self._thread = None
+    return
+
+  def is_stage_thread(self):
+    return self._thread_id is not None and get_ident() == self._thread_id
+
+  def _put(self, dct_captures):
+    while not self._done:
+      try:
+        self._queue.put(dct_captures, timeout=0.1)
+        return True
+      except Full:
+        self._nr_full_waits += 1
+    return False
+
+  def _run_collect_stage(self):
+    self._thread_id = get_ident()
+    app_monitor = self.owner._app_monitor
+    while not self._done:
+      try:
+        start_time = perf_counter()
+        with self.lock:
+          dct_captures = self.owner._capture_manager.get_all_captured_data()
+        app_monitor.add_stage_timing('pipe_collect', perf_counter() - start_time)
+        if len(dct_captures) == 0:
+          sleep(self._idle_sleep)
+          continue
+        start_time = perf_counter()
+        if self._put(dct_captures):
+          self._nr_collected += 1
+        app_monitor.add_stage_timing('pipe_collect_queue_wait', perf_counter() - start_time)
+      except Exception as exc:
+        self.P("Exception in pipelined collection stage: {}\n{}".format(exc, traceback.format_exc()), color='r')
+        sleep(0.1)
+    # endwhile
+    self.P("Pipelined main loop collection stage stopped.", color='y')
+    return
+
+  def get_captures(self, timeout):
+    """
+    Returns the oldest collected data or a empty dict if nothing was collected in `timeout` seconds.
+    """
+    try:
+      return self._queue.get(timeout=timeout)
+    except Empty:
+      return {}
+
+  def get_status(self):
+    return {
+      'QUEUE'       : self._queue.qsize() if self._queue is not None else 0,
+      'QUEUE_SIZE'  : self._queue_size,
+      'COLLECTED'   : self._nr_collected,
+      'FULL_WAITS'  : self._nr_full_waits,
+    }
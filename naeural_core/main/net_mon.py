@@ -14,7 +14,11 @@ from naeural_core import DecentrAIObject
 from naeural_core import constants as ct
 from naeural_core.bc import DefaultBlockEngine, BCct
 
+from naeural_core.utils.state_journal import StateJournal
+
 from .epochs_manager import EpochsManager
+from .heartbeat_series import HeartbeatSeries
+from .heartbeat_delta import HeartbeatDeltaDecoder
 
 UNUSEFULL_HB_KEYS = [
   ct.HB.DEVICE_LOG,
@@ -47,6 +51,7 @@ def exponential_score(left, right, val, right_is_better=False, normed=False):
 
 
 NETMON_MUTEX = 'NETMON_MUTEX'
+NETMON_SAVE_MUTEX = 'NETMON_SAVE_MUTEX'
 
 NETMON_DB = 'db.pkl'
 NETMON_DB_SUBFOLDER = 'network_monitor'
@@ -64,6 +69,13 @@ class NetworkMonitor(DecentrAIObject):
     self.node_name = node_name
     self.node_addr = node_addr
     self.__network_heartbeats = {}
+    # heartbeats received since the last save (see `network_save_status`)
+    self.__journal = None
+    self.__journal_pending = []
+    self.__journal_failed = False
+    self.__snapshot_needed = False
+    # rebuilds the delta-encoded heartbeats from their last full snapshot
+    self.__hb_delta_decoder = HeartbeatDeltaDecoder()
     self.network_hashinfo = {}
     # simple pipeline caching mechanism for live node monitoring
     self.__nodes_pipelines = {} 
@@ -79,6 +91,9 @@ class NetworkMonitor(DecentrAIObject):
 
   @property
   def all_heartbeats(self):
+    """
+    Returns the per-node heartbeat history as a dict of `HeartbeatSeries` (addresses without prefix).
+    """
     result = self.__network_heartbeats
     return result
 
@@ -158,9 +173,24 @@ class NetworkMonitor(DecentrAIObject):
             # for the same public key address
             self.P("Found multiple entries for address with no prefix: {}. This entry will require sorting".format(__addr_no_prefix), color='r')
             need_sorting.append(__addr_no_prefix)
-          new_network_heartbeats[__addr_no_prefix].extend(network_heartbeats[addr])
+          new_network_heartbeats[__addr_no_prefix].append(network_heartbeats[addr])
         # endfor loop through network heartbeats entries
 
+        for addr_no_prefix in new_network_heartbeats:
+          lst_sources = new_network_heartbeats[addr_no_prefix]
+          if len(lst_sources) == 1 and isinstance(lst_sources[0], HeartbeatSeries):
+            # already columnar (saved by this version) so it can be used as it is
+            lst_sources[0].maxlen = self.HB_HISTORY
+            new_network_heartbeats[addr_no_prefix] = lst_sources[0]
+            continue
+          lst_heartbeats = []
+          for node_heartbeats in lst_sources:
+            if isinstance(node_heartbeats, HeartbeatSeries):
+              node_heartbeats = node_heartbeats.to_heartbeats()
+            lst_heartbeats.extend(node_heartbeats)
+          new_network_heartbeats[addr_no_prefix] = lst_heartbeats
+        # endfor merge sources
+
         for addr_no_prefix in need_sorting:
           # sort the heartbeats by sent time
           new_network_heartbeats[addr_no_prefix] = sorted(
@@ -170,16 +200,23 @@ class NetworkMonitor(DecentrAIObject):
         # end for sort required entries
 
         for addr_no_prefix in new_network_heartbeats:
-          for hb in new_network_heartbeats[addr_no_prefix][:-1]:
-            self.__pop_repeating_info_from_heartbeat(hb)
-          # endfor pop repeating info
+          lst_heartbeats = new_network_heartbeats[addr_no_prefix]
+          if isinstance(lst_heartbeats, HeartbeatSeries) or len(lst_heartbeats) == 0:
+            continue
           for key_to_delete in UNUSEFULL_HB_KEYS:
-            new_network_heartbeats[addr_no_prefix][-1].pop(key_to_delete, None)
-            
-          new_network_heartbeats[addr_no_prefix] = deque(new_network_heartbeats[addr_no_prefix], maxlen=self.HB_HISTORY)
-        # endfor pop repeating info
+            lst_heartbeats[-1].pop(key_to_delete, None)
+          series = HeartbeatSeries(maxlen=self.HB_HISTORY)
+          for hb in lst_heartbeats[-self.HB_HISTORY:]:
+            series.append(hb, received_ts=self.__heartbeat_received_ts(hb))
+          new_network_heartbeats[addr_no_prefix] = series
+        # endfor ingest heartbeats
+        new_network_heartbeats = {k: v for k, v in new_network_heartbeats.items() if isinstance(v, HeartbeatSeries)}
 
         self.__network_heartbeats = new_network_heartbeats
+        # the pending deltas and the journal on disk refer to the replaced history so the next save
+        # must write a full snapshot (that also resets the journal)
+        self.__journal_pending = []
+        self.__snapshot_needed = True
       else:
         self.P("Error setting network heartbeats. Invalid type: {}".format(type(network_heartbeats)), color='r')
     # endwith lock
@@ -200,52 +237,18 @@ class NetworkMonitor(DecentrAIObject):
     return self.__blockchain_manager.node_address_to_eth_address(addr)
 
 
-  def __pop_repeating_info_from_heartbeat(self, hb):
-    """This method will remove the extra info from the heartbeat that is not required for time series analysis"""
-    hb.pop(ct.HB.ACTIVE_PLUGINS, None)
-    hb.pop(ct.HB.CONFIG_STREAMS, None)
-    hb.pop(ct.HB.DCT_STATS, None)
-    hb.pop(ct.HB.COMM_STATS, None)
-
-    hb.pop(ct.HB.EE_WHITELIST, None)
-    hb.pop(ct.PAYLOAD_DATA.EE_PAYLOAD_PATH, None)
-
-    hb.pop(ct.HB.TIMERS, None)
-    hb.pop(ct.HB.DEVICE_LOG, None)
-    hb.pop(ct.HB.ERROR_LOG, None)
-
-    hb.pop(ct.PAYLOAD_DATA.EE_VERSION, None)
-    hb.pop(ct.HB.LOGGER_VERSION, None)
-    hb.pop(ct.HB.VERSION, None)
-    hb.pop(ct.HB.PY_VER, None)
-    hb.pop(ct.HB.HEARTBEAT_VERSION, None)
-
-    hb.pop(ct.HB.GIT_BRANCH, None)
-    hb.pop(ct.HB.CONDA_ENV, None)
-    hb.pop(ct.HB.CPU, None)
-    hb.pop(ct.HB.DEFAULT_CUDA, None)
-    hb.pop(ct.HB.GPU_INFO, None)
-    hb.pop(ct.HB.MACHINE_IP, None)
-    hb.pop(ct.HB.SECURED, None)
-    hb.pop(ct.HB.EE_IS_SUPER, None)
-
-    hb.pop(ct.PAYLOAD_DATA.EE_ID, None)
-    hb.pop(ct.PAYLOAD_DATA.INITIATOR_ID, None)
-    hb.pop(ct.PAYLOAD_DATA.EE_IS_ENCRYPTED, None)
-    hb.pop(ct.PAYLOAD_DATA.EE_EVENT_TYPE, None)
-    hb.pop(ct.PAYLOAD_DATA.EE_FORMATTER, None)
-    
-    return
+  def __heartbeat_received_ts(self, hb):
+    """Returns the local epoch of the moment the heartbeat was received (falls back to the remote time)."""
+    ts = hb.get(ct.HB.RECEIVED_TIME)
+    if ts is None:
+      remote_time = hb[ct.HB.CURRENT_TIME]
+      remote_tz = hb.get(ct.PAYLOAD_DATA.EE_TIMEZONE)
+      dt_ts = self.log.utc_to_local(remote_time, remote_utc=remote_tz, fmt=ct.HB.TIMESTAMP_FORMAT)
+    else:
+      dt_ts = dt.strptime(ts, ct.HB.TIMESTAMP_FORMAT)
+    return dt_ts.timestamp()
+
 
-  def __pop_repeating_info_from_previous_heartbeat(self, addr):
-    __addr_no_prefix = self.__remove_address_prefix(addr)
-    hb_deque = self.__network_heartbeats[__addr_no_prefix]
-    if len(hb_deque) < 2:
-      return
-    self.__pop_repeating_info_from_heartbeat(hb_deque[-2])
-    return
-  
-  
   def __register_node_pipelines(self, addr, pipelines):
     if isinstance(pipelines, list):      
       __addr_no_prefix = self.__remove_address_prefix(addr)
@@ -267,7 +270,15 @@ class NetworkMonitor(DecentrAIObject):
     return
   
 
-  def __register_heartbeat(self, addr, data):
+  def __get_journal(self):
+    if self.__journal is None:
+      self.__journal = StateJournal(
+        snapshot_path=os.path.join(self.log.get_data_folder(), NETMON_DB_SUBFOLDER, NETMON_DB),
+      )
+    return self.__journal
+
+
+  def __register_heartbeat(self, addr, data, received_ts=None, journal=True):
     # first check if data is encoded (as it always should be)
     if ct.HB.ENCODED_DATA in data:
       str_data = data.pop(ct.HB.ENCODED_DATA)
@@ -280,30 +291,44 @@ class NetworkMonitor(DecentrAIObject):
 
     __eeid = data.get(ct.EE_ID, MISSING_ID)
     __addr_no_prefix = self.__remove_address_prefix(addr) 
+
+    data = self.__hb_delta_decoder.decode(__addr_no_prefix, data)
+    if data is None:
+      if self.__hb_delta_decoder.get_missed(__addr_no_prefix) == 1:
+        self.P("Delta heartbeats from {}:{} ignored until its next full snapshot.".format(addr, __eeid), color='y')
+      return
+    #endif delta without snapshot
     
     # we remove any extra bloaded info from the HB inside the network monitor
     for key_to_delete in UNUSEFULL_HB_KEYS:
       data.pop(key_to_delete, None)
     # end remove
 
+    if received_ts is None:
+      received_ts = self.__heartbeat_received_ts(data)
+
     with self.log.managed_lock_resource(NETMON_MUTEX):
       if __addr_no_prefix not in self.__network_heartbeats:
         self.P("Box alive: {}:{}.".format(addr, __eeid), color='y')
-        self.__network_heartbeats[__addr_no_prefix] = deque(maxlen=self.HB_HISTORY)
+        self.__network_heartbeats[__addr_no_prefix] = HeartbeatSeries(maxlen=self.HB_HISTORY)
       #endif
-      self.__network_heartbeats[__addr_no_prefix].append(data)
+      # the time-series values are extracted in the node columns and only this heartbeat is kept as a dict
+      self.__network_heartbeats[__addr_no_prefix].append(data, received_ts=received_ts)
+      if journal:
+        self.__journal_pending.append((addr, data, received_ts))
       # now register pipelines if avail
       self.__maybe_register_hb_pipelines(addr, data)
-      # now remove the extra info from the previous heartbeat
-      # this is done to avoid having the same info in multiple sequential heartbeats
-      self.__pop_repeating_info_from_previous_heartbeat(addr)
     # endwith lock
     return
 
 
   def get_box_heartbeats(self, addr):
+    """
+    Returns the heartbeats history of a node rebuilt from the columnar store (time-series values only,
+    the last heartbeat is complete).
+    """
     __addr_no_prefix = self.__remove_address_prefix(addr) 
-    box_heartbeats = deque(self.all_heartbeats[__addr_no_prefix], maxlen=self.HB_HISTORY)
+    box_heartbeats = deque(self.all_heartbeats[__addr_no_prefix].to_heartbeats(), maxlen=self.HB_HISTORY)
     return box_heartbeats
 
   def start_timer(self, tmr_id):
@@ -322,7 +347,7 @@ class NetworkMonitor(DecentrAIObject):
       if from_hb:          
         nodes_addrs = []
         for key in self.all_heartbeats:
-          hb = self.all_heartbeats[key][-1]
+          hb = self.all_heartbeats[key].last
           addr = hb.get(ct.HB.EE_ADDR, None)
           if addr is not None:
             nodes_addrs.append(addr)
@@ -331,50 +356,36 @@ class NetworkMonitor(DecentrAIObject):
 
       return nodes_addrs
 
-    def __network_node_past_hearbeats_by_number(self, addr, nr=1, reverse_order=True):
+    def __network_node_series(self, addr):
       addr = self.__remove_address_prefix(addr)
-      if addr not in self.__network_nodes_list():
-        self.P("`_network_node_past_hearbeats_by_number`: ADDR '{}' not available".format(addr))
-        return
-      
-      box_heartbeats = self.get_box_heartbeats(addr)
-      if reverse_order:
-        lst_heartbeats = list(reversed(box_heartbeats))[:nr]
-      else:
-        lst_heartbeats = box_heartbeats[-nr:]
-      return lst_heartbeats
+      return self.__network_heartbeats.get(addr)
 
-    def __network_node_past_heartbeats_by_interval(
-      self, addr, minutes=60, dt_now=None, reverse_order=True,
-      debug_unavailable=False
-    ):
-      addr = self.__remove_address_prefix(addr)
-      if addr not in self.__network_nodes_list():
+    def __network_node_past_values_by_number(self, addr, column, nr=1, reverse_order=True):
+      series = self.__network_node_series(addr)
+      if series is None:
+        self.P("`_network_node_past_values_by_number`: ADDR '{}' not available".format(addr))
+        return []
+      lo, hi = series.last_rows(nr)
+      return series.column(column, lo, hi, reverse_order=reverse_order)
+
+    def __network_node_past_window_by_interval(self, addr, minutes=60, dt_now=None, debug_unavailable=False):
+      """
+      Returns the node series and the (lo, hi) window of the heartbeats received in the last `minutes`
+      (binary search on the received timestamps).
+      """
+      series = self.__network_node_series(addr)
+      if series is None:
         if debug_unavailable:
-          self.P("`_network_node_past_heartbeats_by_interval`: ADDR '{}' not available".format(addr), color='r')
+          self.P("`_network_node_past_window_by_interval`: ADDR '{}' not available".format(addr), color='r')
+        return None, 0, 0
+      lo, hi = series.interval(minutes=minutes, dt_now=dt_now)
+      return series, lo, hi
+
+    def __network_node_past_values_by_interval(self, addr, column, minutes=60, dt_now=None, reverse_order=True):
+      series, lo, hi = self.__network_node_past_window_by_interval(addr=addr, minutes=minutes, dt_now=dt_now)
+      if series is None:
         return []
-      
-      if dt_now is None:
-        dt_now = dt.now()
-        
-      lst_heartbeats = []
-      box_heartbeats = self.get_box_heartbeats(addr)
-      for heartbeat in reversed(box_heartbeats):
-        ts = heartbeat.get(ct.HB.RECEIVED_TIME)
-        if ts is None:
-          remote_time = heartbeat[ct.HB.CURRENT_TIME]
-          remote_tz = heartbeat.get(ct.PAYLOAD_DATA.EE_TIMEZONE)
-          ts = self.log.utc_to_local(remote_time, remote_utc=remote_tz, fmt=ct.HB.TIMESTAMP_FORMAT)
-        else:
-          ts = dt.strptime(ts, ct.HB.TIMESTAMP_FORMAT)
-        passed_minutes = (dt_now - ts).total_seconds() / 60.0
-        if passed_minutes < 0 or passed_minutes > minutes:
-          break
-        lst_heartbeats.append(heartbeat)
-      #endfor
-      if not reverse_order:
-        lst_heartbeats = list(reversed(lst_heartbeats))
-      return lst_heartbeats
+      return series.column(column, lo, hi, reverse_order=reverse_order)
 
     def __network_node_last_heartbeat(self, addr, return_empty_dict=False, debug_unavailable=False):
       __addr_no_prefix = self.__remove_address_prefix(addr) 
@@ -387,14 +398,14 @@ class NetworkMonitor(DecentrAIObject):
             self.P(msg, color='r')
           return {}
         #endif raise or return
-      return self.all_heartbeats[__addr_no_prefix][-1]
+      return self.all_heartbeats[__addr_no_prefix].last
 
     def __network_node_last_valid_heartbeat(self, addr, minutes=3):
-      past_heartbeats = self.__network_node_past_heartbeats_by_interval(addr=addr, minutes=minutes, )
-      if len(past_heartbeats) == 0:
+      series, lo, hi = self.__network_node_past_window_by_interval(addr=addr, minutes=minutes)
+      if series is None or hi <= lo:
         return
 
-      return past_heartbeats[0]
+      return series.to_heartbeats(hi - 1, hi)[0]
 
     def __convert_node_id_address(self, network_heartbeats):
       """
@@ -491,14 +502,16 @@ class NetworkMonitor(DecentrAIObject):
   if True:
     def __network_node_past_available_memory_by_number(self, addr, nr=1, norm=True):
       machine_mem = self.__network_node_machine_memory(addr=addr)
-      lst_heartbeats = self.__network_node_past_hearbeats_by_number(addr=addr, nr=nr)
-      lst = [h[ct.HB.AVAILABLE_MEMORY] / machine_mem if norm else h[ct.HB.AVAILABLE_MEMORY] for h in lst_heartbeats]
+      lst_values = self.__network_node_past_values_by_number(addr=addr, column='avail_mem', nr=nr)
+      lst = [x / machine_mem if norm else x for x in lst_values]
       return lst
 
-    def __network_node_past_available_memory_by_interval(self, addr, minutes=60, norm=True, reverse_order=True):
+    def __network_node_past_available_memory_by_interval(self, addr, minutes=60, norm=True, reverse_order=True, dt_now=None):
       machine_mem = self.__network_node_machine_memory(addr=addr)
-      lst_heartbeats = self.__network_node_past_heartbeats_by_interval(addr=addr, minutes=minutes, reverse_order=reverse_order)
-      lst = [h[ct.HB.AVAILABLE_MEMORY] / machine_mem if norm else h[ct.HB.AVAILABLE_MEMORY] for h in lst_heartbeats]
+      lst_values = self.__network_node_past_values_by_interval(
+        addr=addr, column='avail_mem', minutes=minutes, dt_now=dt_now, reverse_order=reverse_order
+      )
+      lst = [x / machine_mem if norm else x for x in lst_values]
       return lst
 
     def __network_node_last_available_memory(self, addr, norm=True):
@@ -511,14 +524,14 @@ class NetworkMonitor(DecentrAIObject):
   if True:
     def __network_node_past_process_memory_by_number(self, addr, nr=1, norm=True):
       machine_mem = self.__network_node_machine_memory(addr=addr)
-      lst_heartbeats = self.__network_node_past_hearbeats_by_number(addr=addr, nr=nr)
-      lst = [h[ct.HB.PROCESS_MEMORY] / machine_mem if norm else h[ct.HB.PROCESS_MEMORY] for h in lst_heartbeats]
+      lst_values = self.__network_node_past_values_by_number(addr=addr, column='proc_mem', nr=nr)
+      lst = [x / machine_mem if norm else x for x in lst_values]
       return lst
 
     def __network_node_past_process_memory_by_interval(self, addr, minutes=60, norm=True):
       machine_mem = self.__network_node_machine_memory(addr=addr)
-      lst_heartbeats = self.__network_node_past_heartbeats_by_interval(addr=addr, minutes=minutes)
-      lst = [100*h[ct.HB.PROCESS_MEMORY] / machine_mem if norm else h[ct.HB.PROCESS_MEMORY] for h in lst_heartbeats]
+      lst_values = self.__network_node_past_values_by_interval(addr=addr, column='proc_mem', minutes=minutes)
+      lst = [100*x / machine_mem if norm else x for x in lst_values]
       return lst
 
     def __network_node_last_process_memory(self, addr, norm=True):
@@ -530,24 +543,23 @@ class NetworkMonitor(DecentrAIObject):
   # "CPU_USED" section (protected methods)
   if True:
     def __network_node_past_cpu_used_by_number(self, addr, nr=1):
-      lst_heartbeats = self.__network_node_past_hearbeats_by_number(addr=addr, nr=nr)
-      lst = [h[ct.HB.CPU_USED] for h in lst_heartbeats]
+      lst = self.__network_node_past_values_by_number(addr=addr, column='cpu', nr=nr)
       return lst
     
-    def __get_timestamps(self, lst_heartbeats):
-      timestamps = [h[ct.HB.CURRENT_TIME].split('.')[0] for h in lst_heartbeats]
+    def __get_timestamps(self, lst_current_times):
+      timestamps = [x.split('.')[0] for x in lst_current_times]
       return timestamps
 
     def __network_node_past_cpu_used_by_interval(
       self, addr, minutes=60, dt_now=None, 
       return_timestamps=False, reverse_order=True
     ):
-      lst_heartbeats = self.__network_node_past_heartbeats_by_interval(
-        addr=addr, minutes=minutes, dt_now=dt_now, reverse_order=reverse_order
-      )
-      lst = [h[ct.HB.CPU_USED] for h in lst_heartbeats]
+      series, lo, hi = self.__network_node_past_window_by_interval(addr=addr, minutes=minutes, dt_now=dt_now)
+      if series is None:
+        return ([], []) if return_timestamps else []
+      lst = series.column('cpu', lo, hi, reverse_order=reverse_order)
       if return_timestamps:
-        timestamps = self.__get_timestamps(lst_heartbeats)
+        timestamps = self.__get_timestamps(series.column('current_time', lo, hi, reverse_order=reverse_order))
         return lst, timestamps
       else:
         return lst
@@ -559,27 +571,21 @@ class NetworkMonitor(DecentrAIObject):
 
   # "GPUS" section (protected methods)
   if True:
-    def __network_node_past_gpus_by_number(self, addr, nr=1):
-      lst_heartbeats = self.__network_node_past_hearbeats_by_number(addr=addr, nr=nr)
-      lst = [h[ct.HB.GPUS] for h in lst_heartbeats]
-      for i in range(len(lst)):
-        if isinstance(lst[i], str):
-          lst[i] = {}
-      return lst
-
-    def __network_node_past_gpus_by_interval(
+    def __network_node_past_default_gpu_by_interval(
       self, addr, minutes=60, dt_now=None, 
       return_timestamps=False, reverse_order=True
     ):
-      lst_heartbeats = self.__network_node_past_heartbeats_by_interval(
-        addr=addr, minutes=minutes, dt_now=dt_now, reverse_order=reverse_order,
-      )
-      lst = [h[ct.HB.GPUS] for h in lst_heartbeats]
-      for i in range(len(lst)):
-        if isinstance(lst[i], str):
-          lst[i] = {}
+      """
+      Returns the default gpu status dicts (only the monitored values) of the heartbeats received in the
+      last `minutes`. If any of these heartbeats has no default gpu info the list is empty.
+      """
+      series, lo, hi = self.__network_node_past_window_by_interval(addr=addr, minutes=minutes, dt_now=dt_now)
+      lst, timestamps = [], []
+      if series is not None:
+        lst = series.default_gpu_statuses(lo, hi, reverse_order=reverse_order) or []
+        if return_timestamps:
+          timestamps = self.__get_timestamps(series.column('current_time', lo, hi, reverse_order=reverse_order))
       if return_timestamps:
-        timestamps = self.__get_timestamps(lst_heartbeats)
         return lst, timestamps
       else:
         return lst
@@ -605,13 +611,11 @@ class NetworkMonitor(DecentrAIObject):
   # "DEVICE_STATUS" section (protected methods)
   if True:
     def __network_node_past_device_status_by_number(self, addr, nr=1):
-      lst_heartbeats = self.__network_node_past_hearbeats_by_number(addr=addr, nr=nr)
-      lst = [h[ct.HB.DEVICE_STATUS] for h in lst_heartbeats]
+      lst = self.__network_node_past_values_by_number(addr=addr, column='status', nr=nr)
       return lst
 
     def __network_node_past_device_status_by_interval(self, addr, minutes=60):
-      lst_heartbeats = self.__network_node_past_heartbeats_by_interval(addr=addr, minutes=minutes)
-      lst = [h[ct.HB.DEVICE_STATUS] for h in lst_heartbeats]
+      lst = self.__network_node_past_values_by_interval(addr=addr, column='status', minutes=minutes)
       return lst
 
     def __network_node_last_device_status(self, addr):
@@ -621,16 +625,6 @@ class NetworkMonitor(DecentrAIObject):
 
   # "ACTIVE_PLUGINS" section (protected methods)
   if True:
-    def __network_node_past_active_plugins_by_number(self, addr, nr=1):
-      lst_heartbeats = self.__network_node_past_hearbeats_by_number(addr=addr, nr=nr)
-      lst = [h[ct.HB.ACTIVE_PLUGINS] for h in lst_heartbeats]
-      return lst
-
-    def __network_node_past_active_plugins_by_interval(self, addr, minutes=60):
-      lst_heartbeats = self.__network_node_past_heartbeats_by_interval(addr=addr, minutes=minutes)
-      lst = [h[ct.HB.ACTIVE_PLUGINS] for h in lst_heartbeats]
-      return lst
-
     def __network_node_last_active_plugins(self, addr):
       hearbeat = self.__network_node_last_heartbeat(addr=addr)
       return hearbeat[ct.HB.ACTIVE_PLUGINS]
@@ -647,14 +641,14 @@ class NetworkMonitor(DecentrAIObject):
   if True:
     def __network_node_past_available_disk_by_number(self, addr, nr=1, norm=True):
       total_disk = self.__network_node_total_disk(addr=addr)
-      lst_heartbeats = self.__network_node_past_hearbeats_by_number(addr=addr, nr=nr)
-      lst = [h[ct.HB.AVAILABLE_DISK] / total_disk if norm else h[ct.HB.AVAILABLE_DISK] for h in lst_heartbeats]
+      lst_values = self.__network_node_past_values_by_number(addr=addr, column='avail_disk', nr=nr)
+      lst = [x / total_disk if norm else x for x in lst_values]
       return lst
 
     def __network_node_past_available_disk_by_interval(self, addr, minutes=60, norm=True):
       total_disk = self.__network_node_total_disk(addr=addr)
-      lst_heartbeats = self.__network_node_past_heartbeats_by_interval(addr=addr, minutes=minutes)
-      lst = [h[ct.HB.AVAILABLE_DISK] / total_disk if norm else h[ct.HB.AVAILABLE_DISK] for h in lst_heartbeats]
+      lst_values = self.__network_node_past_values_by_interval(addr=addr, column='avail_disk', minutes=minutes)
+      lst = [x / total_disk if norm else x for x in lst_values]
       return lst
 
     def __network_node_last_available_disk(self, addr, norm=True):
@@ -665,16 +659,6 @@ class NetworkMonitor(DecentrAIObject):
 
   # "SERVING_PIDS" section (protected methods)
   if True:
-    def __network_node_past_serving_pids_by_number(self, addr, nr=1):
-      lst_heartbeats = self.__network_node_past_hearbeats_by_number(addr=addr, nr=nr)
-      lst = [h[ct.HB.SERVING_PIDS] for h in lst_heartbeats]
-      return lst
-
-    def __network_node_past_serving_pids_by_interval(self, addr, minutes=60):
-      lst_heartbeats = self.__network_node_past_heartbeats_by_interval(addr=addr, minutes=minutes)
-      lst = [h[ct.HB.SERVING_PIDS] for h in lst_heartbeats]
-      return lst
-
     def __network_node_last_serving_pids(self, addr):
       hearbeat = self.__network_node_last_heartbeat(addr=addr)
       return hearbeat[ct.HB.SERVING_PIDS]
@@ -682,16 +666,6 @@ class NetworkMonitor(DecentrAIObject):
 
   # "LOOPS_TIMINGS" section (protected methods)
   if True:
-    def __network_node_past_loops_timings_by_number(self, addr, nr=1):
-      lst_heartbeats = self.__network_node_past_hearbeats_by_number(addr=addr, nr=nr)
-      lst = [h[ct.HB.LOOPS_TIMINGS] for h in lst_heartbeats]
-      return lst
-
-    def __network_node_past_loops_timings_by_interval(self, addr, minutes=60):
-      lst_heartbeats = self.__network_node_past_heartbeats_by_interval(addr=addr, minutes=minutes)
-      lst = [h[ct.HB.LOOPS_TIMINGS] for h in lst_heartbeats]
-      return lst
-
     def __network_node_last_loops_timings(self, addr):
       hearbeat = self.__network_node_last_heartbeat(addr=addr)
       return hearbeat[ct.HB.LOOPS_TIMINGS]
@@ -1184,21 +1158,52 @@ class NetworkMonitor(DecentrAIObject):
       return ret
     
     
-    def network_save_status(self):
+    def network_save_status(self, force_snapshot=False):
+      """
+      Saves the network map status. Usually only the heartbeats received since the previous save are
+      appended to the journal; a full snapshot (that resets the journal) is written when the journal
+      grows too large, when there is no snapshot yet, after a failed append or after the whole history
+      was replaced.
+      The network lock is held only to swap the pending heartbeats (and copy the node windows for
+      snapshots) so the heartbeat registration is not blocked by the disk writes.
+      """
       self.P("Saving network map status...")
-      with self.log.managed_lock_resource(NETMON_MUTEX):
-
+      with self.log.managed_lock_resource(NETMON_SAVE_MUTEX):
         self.start_timer("network_save_status")
-        self.log.save_pickle_to_data(
-          data=self.__network_heartbeats, 
-          fn=NETMON_DB,
-          subfolder_path='network_monitor'
+        journal = self.__get_journal()
+        snapshot = None
+        compact = (
+          force_snapshot or self.__journal_failed or 
+          not os.path.isfile(journal.snapshot_path) or journal.needs_compaction()
         )
+        with self.log.managed_lock_resource(NETMON_MUTEX):
+          lst_pending = self.__journal_pending
+          self.__journal_pending = []
+          # history replaced (`_set_network_heartbeats`) since the last save
+          compact = compact or self.__snapshot_needed
+          self.__snapshot_needed = False
+          if compact:
+            # the node series are saved in columnar form (see `HeartbeatSeries.__getstate__`)
+            snapshot = {addr: series.copy() for addr, series in self.__network_heartbeats.items()}
+        # endwith network lock
+        try:
+          if compact:
+            journal.write_snapshot(snapshot)
+            str_saved = "snapshot of {} nodes".format(len(snapshot))
+          else:
+            nr_bytes = journal.append(lst_pending) if len(lst_pending) > 0 else 0
+            str_saved = "{} heartbeats ({:.1f} KB) journaled".format(len(lst_pending), nr_bytes / 1024)
+          self.__journal_failed = False
+        except Exception as exc:
+          # the next save will write a full snapshot
+          self.__journal_failed = True
+          str_saved = "failed: {}".format(exc)
+          self.P("Error saving network map status: {}".format(exc), color='r')
         # now we add epoch manager save
         self.epoch_manager.save_status()
         elapsed = self.end_timer("network_save_status")
-        self.P("Network map status saved in {:.2f} seconds".format(elapsed))
-      # endwith lock
+        self.P("Network map status saved ({}) in {:.2f} seconds".format(str_saved, elapsed))
+      # endwith save lock
       return
     
     
@@ -1211,13 +1216,19 @@ class NetworkMonitor(DecentrAIObject):
       if external_db is None:
         _fn = os.path.join(NETMON_DB_SUBFOLDER, NETMON_DB)
         db_file = self.log.get_data_file(_fn)
+        journal = self.__get_journal()
       else:
         db_file = external_db if os.path.isfile(external_db) else None
+        journal = StateJournal(snapshot_path=external_db)
       #endif external_db is not None
 
       if db_file is not None:
         self.P("Previous nodes states found. Loading network map status...")
         __network_heartbeats = self.log.load_pickle(db_file)
+        # the snapshot plus the heartbeats journaled after it
+        __network_heartbeats, lst_journaled, discarded = journal.recover(__network_heartbeats)
+        if discarded > 0:
+          self.P("Discarded {} bytes of incomplete network map journal".format(discarded), color='r')
         __network_heartbeats = self.__maybe_convert_node_id_address(__network_heartbeats)
         if __network_heartbeats is not None:
           # update the current network info with the loaded info
@@ -1225,6 +1236,15 @@ class NetworkMonitor(DecentrAIObject):
           # will be appended after the loaded ones 
           current_heartbeats = self.__network_heartbeats # save current heartbeats maybe already received
           self._set_network_heartbeats(__network_heartbeats) # load the history
+          nr_journaled = 0
+          for lst_records in lst_journaled:
+            for addr, data, received_ts in lst_records:
+              # already in the journal so not added to the pending heartbeats
+              self.__register_heartbeat(addr, data, received_ts=received_ts, journal=False)
+              nr_journaled += 1
+          #endfor journal records
+          if nr_journaled > 0:
+            self.P("Replayed {} journaled heartbeats".format(nr_journaled))
           nr_loaded = len(self.__network_heartbeats)
           nr_received = len(current_heartbeats)
           previous_keys = set(self.__network_heartbeats.keys())
@@ -1232,7 +1252,7 @@ class NetworkMonitor(DecentrAIObject):
           not_present_keys = previous_keys - current_keys
           
           # keys are without prefix, so we add it
-          not_present_addrs = [self.__network_heartbeats[x][-1].get(ct.HB.EE_ADDR, None) for x in not_present_keys]
+          not_present_addrs = [self.__network_heartbeats[x].last.get(ct.HB.EE_ADDR, None) for x in not_present_keys]
           not_present_addrs = [x for x in not_present_addrs if x is not None]
           not_present_eeids = [self.__network_node_last_heartbeat(x).get(ct.EE_ID) for x in not_present_addrs]
           not_present_nodes = [f"{node_id}: {node_addr}" for node_id, node_addr in zip(not_present_eeids, not_present_addrs)]
@@ -1243,7 +1263,7 @@ class NetworkMonitor(DecentrAIObject):
           # lock the NETMON_MUTEX
           # now put back the newest heartbeats we received before loading the history
           for addr in current_heartbeats:
-            for data in current_heartbeats[addr]:
+            for data in current_heartbeats[addr].to_heartbeats():
               # TODO: replace register_heartbeat with something simpler
               self.__register_heartbeat(addr, data)
           # unlock the NETMON_MUTEX
@@ -1336,10 +1356,9 @@ class NetworkMonitor(DecentrAIObject):
       """
       result = None
 
-      lst_heartbeats = self.__network_node_past_heartbeats_by_interval(
-        addr=addr, minutes=minutes, dt_now=dt_now, reverse_order=reverse_order,
+      temperatures = self.__network_node_past_values_by_interval(
+        addr=addr, column='temp_info', minutes=minutes, dt_now=dt_now, reverse_order=reverse_order,
       )
-      temperatures = [x[ct.HB.TEMPERATURE_INFO] for x in lst_heartbeats if x is not None]
       max_temps = [x['max_temp'] for x in temperatures if x is not None]
       temps = [x['temperatures'] for x in temperatures if x is not None]
       max_temp_sensor = [x['max_temp_sensor'] for x in temperatures if x is not None]
@@ -1359,20 +1378,14 @@ class NetworkMonitor(DecentrAIObject):
       device_id = self.__network_node_default_cuda(addr=addr)
       lst_statuses, timestamps = [], []
       if device_id is not None:
-        result = self.__network_node_past_gpus_by_interval(
+        result = self.__network_node_past_default_gpu_by_interval(
           addr=addr, minutes=minutes, dt_now=dt_now, 
           reverse_order=reverse_order, return_timestamps=return_timestamps,
         )
         if return_timestamps:
-          lst_all_statuses, timestamps = result
+          lst_statuses, timestamps = result
         else:
-          lst_all_statuses = result
-          
-        try:
-          # TODO: fix this bug !
-          lst_statuses = [x[device_id] for x in lst_all_statuses]
-        except:
-          pass
+          lst_statuses = result
       
       if return_timestamps:
         return lst_statuses, timestamps
@@ -1438,6 +1451,14 @@ class NetworkMonitor(DecentrAIObject):
 
       return min(lst_last_seen, key=lambda x: x[1])[0]
 
+    def network_node_wire_formats(self, addr):
+      """Returns the wire formats advertised by a remote node (JSON only for nodes that do not advertise any)."""
+      hb = self.__network_node_last_heartbeat(addr=addr, return_empty_dict=True)
+      formats = hb.get(ct.WIRE_FORMAT.HB_KEY)
+      if not isinstance(formats, list):
+        formats = [ct.WIRE_FORMAT.JSON]
+      return formats
+
     def network_node_eeid(self, addr):
       hb = self.__network_node_last_heartbeat(addr=addr, return_empty_dict=True)
       return hb.get(ct.EE_ID, MISSING_ID)
@@ -1468,12 +1489,11 @@ class NetworkMonitor(DecentrAIObject):
       if dt_now is None:
         dt_now = dt.now()
       dt_now = dt_now.replace(hour=0, minute=0, second=0, microsecond=0)
-      hbs = self.__network_heartbeats[addr]
-      for hb in hbs:
-        ts = hb[ct.PAYLOAD_DATA.EE_TIMESTAMP]
-        dt_ts = self.log.utc_to_local(ts, fmt=ct.HB.TIMESTAMP_FORMAT)
-        if dt_ts >= dt_now:
-          yield hb
+      series = self.__network_heartbeats[addr]
+      minutes = (dt.now() - dt_now).total_seconds() / 60
+      lo, hi = series.interval(minutes=minutes)
+      for hb in series.to_heartbeats(lo, hi):
+        yield hb
       
             
     def network_node_is_secured(self, addr):
@@ -1645,32 +1665,20 @@ class NetworkMonitor(DecentrAIObject):
     
     
     def network_node_history(self, addr, minutes=8*60, dt_now=None, reverse_order=True, hb_step=4):
-      # TODO: set HIST_DEBUG to False
-      HIST_DEBUG = True
-      lst_heartbeats = self.__network_node_past_heartbeats_by_interval(
-        addr=addr, minutes=minutes, dt_now=dt_now,
-        reverse_order=True,
-      )
-      last_hb = lst_heartbeats[0]
-        
-      timestamps = self.__get_timestamps(lst_heartbeats)
+      # all the histories are read from the same window of the node columnar series (newest first)
+      series, lo, hi = self.__network_node_past_window_by_interval(addr=addr, minutes=minutes, dt_now=dt_now)
+      if series is None or hi <= lo:
+        raise ValueError("`network_node_history`: no heartbeats in the last {} minutes for ADDR '{}'".format(minutes, addr))
+
+      timestamps = self.__get_timestamps(series.column('current_time', lo, hi))
       hb = self.__network_node_last_heartbeat(addr)
-      
-      cpu_hist = self.__network_node_past_cpu_used_by_interval(
-        addr=addr, minutes=minutes,  dt_now=dt_now, return_timestamps=HIST_DEBUG,
-        reverse_order=True,
-      )
-            
-      mem_avail_hist = self.__network_node_past_available_memory_by_interval(
-        addr=addr, minutes=minutes, 
-        reverse_order=True, norm=False,
-        # dt_now=dt_now, # must implement
-      )
 
-      gpu_hist = self.network_node_default_gpu_history(
-        addr=addr, minutes=minutes, dt_now=dt_now, return_timestamps=HIST_DEBUG,        
-        reverse_order=True, 
-      )
+      cpu_hist = series.column('cpu', lo, hi)
+      mem_avail_hist = series.column('avail_mem', lo, hi)
+
+      gpu_hist = []
+      if self.__network_node_default_cuda(addr=addr) is not None:
+        gpu_hist = series.default_gpu_statuses(lo, hi) or []
       
       current_disk = self.__network_node_last_available_disk(
         addr=addr, norm=False
@@ -1684,14 +1692,6 @@ class NetworkMonitor(DecentrAIObject):
       temperatures = temp_hist['all_sensors'] # this is unused for the moment and show ALL sensors
       max_temperature = temp_hist['max_temp'] # get pre-processed max temperatures
       max_temp_sensor = temp_hist['max_temp_sensor'] # get last max-temp sensor
-      
-      if HIST_DEBUG: # debug / sanity-checks
-        cpu_hist, cpu_timestamps = cpu_hist
-        gpu_hist, gpu_timestamps = gpu_hist
-        assert hb == last_hb
-        assert timestamps == cpu_timestamps      
-        assert timestamps == gpu_timestamps
-      # endif debug
 
       gpu_load_hist = [x['GPU_USED'] for x in gpu_hist]
       gpu_mem_avail_hist = [x['FREE_MEM'] for x in gpu_hist]
@@ -5,6 +5,8 @@ import traceback
 import numpy as np
 
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from time import perf_counter, sleep, time
 from threading import Thread
 from copy import deepcopy
@@ -28,6 +30,8 @@ from naeural_core.serving import ServingManager
 from naeural_core.io_formatters import IOFormatterManager
 from naeural_core.heavy_ops import HeavyOpsManager
 from naeural_core.main.main_loop_data_handler import MainLoopDataHandler
+from naeural_core.main.main_loop_pipeline import MainLoopPipeline
+from naeural_core.utils.video_recorder import shutdown_video_writer_service
 from naeural_core.remote_file_system import FileSystemManager
 from naeural_core.bc import DefaultBlockEngine
 
@@ -106,6 +110,8 @@ class Orchestrator(DecentrAIObject,
     self._r1fs_engine : R1FSEngine                      = None
 
     self._data_handler : MainLoopDataHandler = None
+    self._main_loop_pipeline : MainLoopPipeline = None
+    self._heartbeat_executor : ThreadPoolExecutor = None
 
     self._app_shmem = {}
     self._app_monitor = None
@@ -141,6 +147,9 @@ class Orchestrator(DecentrAIObject,
 
 
   def set_loop_stage(self, stage, is_dangerous=True):
+    if self._main_loop_pipeline is not None and self._main_loop_pipeline.is_stage_thread():
+      # the pipelined collection stage must not mask the main loop stage
+      return
     with self.log.managed_lock_resource('set_loop_stage_for_logging'):
       self.__is_mlstop_dangerous = is_dangerous
       if not self.__loop_stage != stage:
@@ -602,6 +611,21 @@ class Orchestrator(DecentrAIObject,
   def cfg_compress_heartbeat(self):
     return self.config_data.get('COMPRESS_HEARTBEAT', True)
 
+  @property
+  def cfg_heartbeat_delta(self):
+    # send only the fields changed since the last full snapshot - all the receivers must support it
+    return self.config_data.get('HEARTBEAT_DELTA', False)
+
+  @property
+  def cfg_heartbeat_full_every(self):
+    # with delta heartbeats a full snapshot is sent every this many heartbeats
+    return self.config_data.get('HEARTBEAT_FULL_EVERY', 10)
+
+  @property
+  def cfg_heartbeat_async_encoding(self):
+    # delta encoding, serialization and compression of the heartbeats on a worker thread
+    return self.config_data.get('HEARTBEAT_ASYNC_ENCODING', False)
+
   @property
   def cfg_config_retrieve(self):
     return self.config_data.get(ct.CONFIG_STARTUP_v2.K_CONFIG_RETRIEVE, [])
@@ -610,6 +634,10 @@ class Orchestrator(DecentrAIObject,
   def cfg_io_formatter(self):
     return self.config_data.get('IO_FORMATTER', '')
 
+  @property
+  def cfg_wire_format(self):
+    return self.config_data.get('WIRE_FORMAT', ct.WIRE_FORMAT.JSON)
+
   @property
   def cfg_heartbeat_timers(self):
     return self.config_data.get('HEARTBEAT_TIMERS', False)
@@ -630,6 +658,18 @@ class Orchestrator(DecentrAIObject,
   def cfg_main_loop_resolution(self):
     return self.config_data.get('MAIN_LOOP_RESOLUTION', 20)
 
+  @property
+  def main_loop_pipeline(self):
+    return self._main_loop_pipeline
+
+  @property
+  def cfg_pipelined_main_loop(self):
+    return self.config_data.get('PIPELINED_MAIN_LOOP', False)
+
+  @property
+  def cfg_pipeline_queue_size(self):
+    return self.config_data.get('PIPELINE_QUEUE_SIZE', 2)
+
   @property
   def cfg_sequential_streams(self):
     """
@@ -718,6 +758,11 @@ class Orchestrator(DecentrAIObject,
 
   def _stop(self):    
     self.__done = True
+    if self._main_loop_pipeline is not None:
+      self._main_loop_pipeline.stop()
+    if self._heartbeat_executor is not None:
+      # the last heartbeats must reach the communication queue before the comm thread stops
+      self._heartbeat_executor.shutdown(wait=True)
     _thread_async_comm = vars(self).get('_thread_async_comm')
     if _thread_async_comm is not None and _thread_async_comm.is_alive():
       _thread_async_comm.join()
@@ -884,6 +929,16 @@ class Orchestrator(DecentrAIObject,
     return "v{}".format(versions)
 
 
+  def __encode_and_send_heartbeat(self, hb_payload, force_full, initiator_id):
+    try:
+      hb_payload = self._app_monitor.encode_status(hb_payload, force_full=force_full)
+      hb_payload[ct.HB.INITIATOR_ID] = initiator_id
+      self._comm_manager.send(data=hb_payload, event_type=ct.HEARTBEAT)
+    except Exception as exc:
+      self.P("ERROR: Could not encode and send heartbeat: {}\n{}".format(exc, traceback.format_exc()), color='error')
+    return
+
+
   def _maybe_send_heartbeat(self, status=None, full_info=True, send_log=False, force=False, initiator_id=None, session_id=None, **kwargs):
     
     if self._comm_manager is None:
@@ -903,8 +958,12 @@ class Orchestrator(DecentrAIObject,
       self._maybe_send_periodic_notifications()
       self._check_for_other_issues() # maybe inprocess issues or other stuff
       # now prepare status info
+      async_encoding = self.cfg_heartbeat_async_encoding
+      # requested heartbeats and status changes are always sent as full snapshots
+      force_full = force or status is not None
       hb_payload = self._app_monitor.get_status(
         status=status, full=full_info, send_log=send_log,
+        encode=not async_encoding, force_full=force_full,
       )
       whitelist = hb_payload.get(ct.HB.EE_WHITELIST, [])
       nr_allowed = len(whitelist)
@@ -922,7 +981,8 @@ class Orchestrator(DecentrAIObject,
         )
       ## end debug
       
-      hb_payload[ct.HB.INITIATOR_ID] = initiator_id
+      if not async_encoding:
+        hb_payload[ct.HB.INITIATOR_ID] = initiator_id
       n_inferences = hb_payload[ct.HB.NR_INFERENCES]
       n_comms = hb_payload[ct.HB.NR_PAYLOADS]
       n_upstream = hb_payload[ct.HB.NR_STREAMS_DATA]
@@ -932,7 +992,15 @@ class Orchestrator(DecentrAIObject,
       
       if not self.in_mlstop or (self.in_mlstop and (not self.__is_mlstop_dangerous)):
         # send HB only if not stopped or if stopped but NOT dangerous
-        self._comm_manager.send(data=hb_payload, event_type=ct.HEARTBEAT)
+        if async_encoding:
+          # the status holds live references (e.g. the pipelines configs) that the main loop keeps
+          # changing while the worker serializes it, so the worker gets its own copy
+          hb_payload = deepcopy(hb_payload)
+          if self._heartbeat_executor is None:
+            self._heartbeat_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=ct.THREADS_PREFIX + 'hb')
+          self._heartbeat_executor.submit(self.__encode_and_send_heartbeat, hb_payload, force_full, initiator_id)
+        else:
+          self._comm_manager.send(data=hb_payload, event_type=ct.HEARTBEAT)
         hb_sent = True
       else:
         hb_sent = False
@@ -1170,6 +1238,8 @@ class Orchestrator(DecentrAIObject,
       self._capture_manager.close()
     if self._business_manager is not None:
       self._business_manager.close()
+    # the videos still encoded in background must be finalized before the process exits
+    shutdown_video_writer_service()
     if self._serving_manager is not None:
       self._serving_manager.stop_all_servers()
     return
@@ -1225,12 +1295,20 @@ class Orchestrator(DecentrAIObject,
     Main loop step:
       Collects data from all streams
     """
+    # in pipelined mode the captures are collected on the pipeline thread so the captures
+    # must not be changed while they are collected
+    capture_lock = self._main_loop_pipeline.lock if self._main_loop_pipeline is not None else nullcontext()
+
     # update the streams to know which captures are done
     self.__loop_stage = '4.collect.update_streams'
-    self._capture_manager.update_streams(self._current_dct_config_streams)
+    with capture_lock:
+      self._capture_manager.update_streams(self._current_dct_config_streams)
     
     self.__loop_stage = '4.collect.get_all_cap'
-    dct_captures = self._capture_manager.get_all_captured_data()
+    if self._main_loop_pipeline is not None:
+      dct_captures = self._main_loop_pipeline.get_captures(timeout=1 / self.cfg_main_loop_resolution)
+    else:
+      dct_captures = self._capture_manager.get_all_captured_data()
 
     self.__loop_stage = '4.collect.add_data_info'
     self._app_monitor.add_data_info(val=len(dct_captures), stage=ct.NR_STREAMS_DATA)
@@ -1238,7 +1316,8 @@ class Orchestrator(DecentrAIObject,
     # after capturing, archive the streams that are completely finished (excluded those)    
     # that are keep-alive
     self.__loop_stage = '4.collect.get_finished_streams'
-    finished_stream_names = self._capture_manager.get_finished_streams()
+    with capture_lock:
+      finished_stream_names = self._capture_manager.get_finished_streams()
     
     self.__loop_stage = '4.collect.archive_streams'
     self._config_manager.archive_streams(finished_stream_names, initiator_id="SELF", session_id="MAIN_LOOP")
@@ -1356,10 +1435,18 @@ class Orchestrator(DecentrAIObject,
     # dct_servers_inputs_filtered = {k:v for k,v in dct_servers_inputs.items() if len(v) > 0} 
     dct_servers_inputs_filtered = dct_servers_inputs
 
-    dct_servers_outputs = self._serving_manager.predict_parallel(
-      dct_servers_inputs_filtered,
-      inprocess=self.in_process_serving, # default is paralel!
-    )
+    if self._serving_manager.async_predict:
+      # list of (ticket, server, output) completed so far - maybe for previous iterations
+      dct_servers_outputs = self._serving_manager.predict_parallel_async(
+        dct_servers_inputs_filtered,
+        ticket=self._main_loop_counts['ITER'],
+        inprocess=self.in_process_serving,
+      )
+    else:
+      dct_servers_outputs = self._serving_manager.predict_parallel(
+        dct_servers_inputs_filtered,
+        inprocess=self.in_process_serving, # default is paralel!
+      )
     self.set_loop_stage('6.1.serve.run.add_data_info')
     self._app_monitor.add_data_info(val=len(dct_servers_outputs), stage=ct.NR_INFERENCES)
     return dct_servers_outputs
@@ -1368,7 +1455,11 @@ class Orchestrator(DecentrAIObject,
     """
     Main loop step:
       Append inferences (servers outputs) to the corresponding plugins
+      For async serving the result is a list of business inputs (older iterations first)
     """
+    if self._serving_manager.async_predict:
+      self._data_handler.defer_business_inputs(ticket=self._main_loop_counts['ITER'])
+      return self._data_handler.append_async_inferences(dct_servers_outputs)
     self._data_handler.append_inferences(dct_servers_outputs)
     dct_business_inputs = self._data_handler.dct_business_inputs
     return dct_business_inputs
@@ -1378,7 +1469,12 @@ class Orchestrator(DecentrAIObject,
     Main loop step:
       Plugins are executed
     """
-    self._business_manager.execute_all_plugins(dct_business_inputs)
+    if isinstance(dct_business_inputs, list):
+      # async serving - inputs from previous iterations that just received their inferences come first
+      for dct_inputs in dct_business_inputs:
+        self._business_manager.execute_all_plugins(dct_inputs)
+    else:
+      self._business_manager.execute_all_plugins(dct_business_inputs)
     return
   
 
@@ -1600,8 +1696,20 @@ class Orchestrator(DecentrAIObject,
       send_log=False,
     )
     self.maybe_start_serving_processes(warmup=True)
+    if self.cfg_pipelined_main_loop:
+      self._main_loop_pipeline = MainLoopPipeline(
+        owner=self,
+        queue_size=self.cfg_pipeline_queue_size,
+        log=self.log,
+      )
+      self._main_loop_pipeline.start()
     return
 
+  def _add_stage_timing(self, stage, start_time):
+    crt_time = perf_counter()
+    self._app_monitor.add_stage_timing(stage, crt_time - start_time)
+    return crt_time
+
 
   @property
   def _main_loop_timer_name(self):
@@ -1705,9 +1813,11 @@ class Orchestrator(DecentrAIObject,
         self.__loop_stage = '3.serving.start'
         self.maybe_start_serving_processes(in_use_ai_engines=in_use_ai_engines)
 
-        #4. Collect data from all streams
+        #4. Collect data from all streams (pre-collected on own thread if pipelined)
         self.__loop_stage = '4.collect'
+        stage_start = perf_counter()
         dct_captures = self.collect_data()
+        stage_start = self._add_stage_timing('loop_collect', stage_start)
 
         #5. Update the main loop data handler
         self.__loop_stage = '5.handle'
@@ -1716,10 +1826,12 @@ class Orchestrator(DecentrAIObject,
         #6. Inference step - all collected data are aggregated for inference and needed serving processes are run
         self.__loop_stage = '6.serve.data'
         dct_servers_inputs = self.aggregate_collected_data_for_serving_manager()
+        stage_start = self._add_stage_timing('loop_aggregate', stage_start)
         
         #   WARNING: potentially blocking if inprocess == True
         self.__loop_stage = '6.1.serve.run'
         dct_servers_outputs = self.run_serving_manager(dct_servers_inputs=dct_servers_inputs)
+        stage_start = self._add_stage_timing('loop_serving', stage_start)
 
         #7. Business plugins inputs preparation step
         #   - Append captures to the corresponding business plugins
@@ -1729,10 +1841,12 @@ class Orchestrator(DecentrAIObject,
                 
         self.__loop_stage = '7.1.bp.serve'
         dct_business_inputs = self.append_servers_outputs_for_business_plugins(dct_servers_outputs=dct_servers_outputs)
+        stage_start = self._add_stage_timing('loop_bp_prep', stage_start)
 
         #8. Business Plugins are executed
         self.__loop_stage = '8.bp.run'
         self.run_business_manager(dct_business_inputs=dct_business_inputs)
+        stage_start = self._add_stage_timing('loop_business', stage_start)
 
         #9. Comm info, timers, ... - later we gonna check for total comm failures
         self.__loop_stage = '9.logs'
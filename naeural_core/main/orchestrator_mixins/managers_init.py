@@ -122,6 +122,11 @@ class _ManagersInitMixin(object):
       # create default (output) formatter
       self._io_formatter_manager.create_formatter(formatter_name)
 
+    wire_format = self.cfg_wire_format
+    if isinstance(wire_format, str) and wire_format.lower() != ct.WIRE_FORMAT.JSON:
+      # optional binary envelope for the payloads sent to capable nodes
+      self._io_formatter_manager.create_wire_envelope(wire_format)
+
     self._app_shmem['io_formatter_manager'] = self._io_formatter_manager
     return
 
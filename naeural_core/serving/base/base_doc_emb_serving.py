@@ -1,7 +1,12 @@
 from naeural_core.serving.base.base_llm_serving import BaseLlmServing as BaseServingProcess
 from transformers import AutoTokenizer, AutoModel
+from collections import OrderedDict
+import hashlib
+import os
 import re
 
+import numpy as np
+
 from docarray import BaseDoc, DocList
 from docarray.typing import NdArray
 from vectordb import HNSWVectorDB
@@ -25,12 +30,16 @@ MAX_SEGMENT_SIZE = 300
 MAX_SEGMENT_OVERLAP = 30
 WORD_FIND_REGEX = r'\b(?:[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}|[a-zA-Z]+(?:\'[a-z]+)?|[0-9]+(?:\.[0-9]+)?|[^\s\w])\b'
 DEFAULT_NUMBER_OF_RESULTS = 10
+EMBEDDING_CACHE_FN = 'embeddings_cache.npz'
+EMBEDDING_CACHE_SAVE_INTERVAL = 300
 
 _CONFIG = {
   **BaseServingProcess.CONFIG,
 
   'MAX_BATCH_SIZE': 32,
   'MAX_EMB_SIZE': EMBEDDING_SIZE,
+  # number of text embeddings kept (LRU) and persisted next to the vectordb workspaces, 0 disables it
+  'EMBEDDING_CACHE_SIZE': 20000,
   'RUNS_ON_EMPTY_INPUT': True,
 
   'VALIDATION_RULES': {
@@ -175,12 +184,86 @@ class DocSplitter:
 # endclass DocSplitter
 
 
+class DocEmbeddingCache:
+  """
+  LRU cache of text embeddings keyed by the hash of the text content.
+  """
+  def __init__(self, max_size: int, key_prefix: str = ''):
+    """
+    Parameters
+    ----------
+    max_size : int - the maximum number of cached embeddings
+    key_prefix : str - added to each text before hashing (embedding parameters that change the result)
+    """
+    self.max_size = max_size
+    self.key_prefix = key_prefix
+    self.dirty = False
+    self.hits = 0
+    self.misses = 0
+    self.__entries = OrderedDict()
+    return
+
+  def __len__(self):
+    return len(self.__entries)
+
+  def text_key(self, text: str):
+    return hashlib.sha256((self.key_prefix + text).encode('utf-8')).hexdigest()
+
+  def get(self, key: str):
+    emb = self.__entries.get(key)
+    if emb is None:
+      self.misses += 1
+      return None
+    self.__entries.move_to_end(key)
+    self.hits += 1
+    return emb
+
+  def put(self, key: str, embedding: np.ndarray):
+    if self.max_size <= 0:
+      return
+    self.__entries[key] = embedding
+    self.__entries.move_to_end(key)
+    while len(self.__entries) > self.max_size:
+      self.__entries.popitem(last=False)
+    self.dirty = True
+    return
+
+  def save(self, path: str):
+    """
+    Saves the cache (oldest first, so the LRU order is preserved) by atomically replacing `path`.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    keys = list(self.__entries.keys())
+    embeddings = np.stack(list(self.__entries.values())) if len(keys) > 0 else np.zeros((0, 0), dtype=np.float32)
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, keys=np.array(keys, dtype='U64'), embeddings=embeddings)
+    os.replace(tmp_path, path)
+    self.dirty = False
+    return
+
+  def load(self, path: str):
+    if not os.path.isfile(path):
+      return 0
+    with np.load(path, allow_pickle=False) as data:
+      keys, embeddings = data['keys'], data['embeddings']
+      for key, emb in zip(keys.tolist(), embeddings):
+        self.__entries[key] = emb
+    # endwith npz file
+    while len(self.__entries) > self.max_size:
+      self.__entries.popitem(last=False)
+    self.dirty = False
+    return len(self.__entries)
+# endclass DocEmbeddingCache
+
+
 class BaseDocEmbServing(BaseServingProcess):
   CONFIG = _CONFIG
   def __init__(self, **kwargs):
     super(BaseDocEmbServing, self).__init__(**kwargs)
     self.__dbs = {}
     self.__doc_splitter = DocSplitter()
+    self.__emb_cache = None
+    self.__emb_cache_last_save = 0
     return
 
   def __context_identifier(self, context):
@@ -189,6 +272,41 @@ class BaseDocEmbServing(BaseServingProcess):
   def __db_cache_workspace(self, context):
     return self.os_path.join(self.get_models_folder(), 'vectordb', self.cfg_model_name, context)
 
+  def __emb_cache_path(self):
+    return self.os_path.join(self.get_models_folder(), 'vectordb', self.cfg_model_name, EMBEDDING_CACHE_FN)
+
+  def __maybe_load_emb_cache(self):
+    self.__emb_cache = DocEmbeddingCache(
+      max_size=int(self.cfg_embedding_cache_size or 0),
+      key_prefix=f'{self.cfg_max_emb_size}:',
+    )
+    if self.__emb_cache.max_size > 0:
+      try:
+        nr_loaded = self.__emb_cache.load(self.__emb_cache_path())
+        self.P(f"Loaded {nr_loaded} cached embeddings")
+      except Exception as exc:
+        self.P(f"Error loading the embeddings cache: {exc}", color='r')
+      # end try-except
+    # endif cache enabled
+    self.__emb_cache_last_save = self.time()
+    return
+
+  def __maybe_save_emb_cache(self, force=False):
+    """
+    Persists the embeddings cache if changed (immediately after new documents, otherwise periodically).
+    """
+    if self.__emb_cache is None or not self.__emb_cache.dirty:
+      return
+    if not force and (self.time() - self.__emb_cache_last_save) < EMBEDDING_CACHE_SAVE_INTERVAL:
+      return
+    try:
+      self.__emb_cache.save(self.__emb_cache_path())
+    except Exception as exc:
+      self.P(f"Error saving the embeddings cache: {exc}", color='r')
+    # end try-except
+    self.__emb_cache_last_save = self.time()
+    return
+
   def __backup_contexts(self):
     """
     Backup the contexts to ensure their persistence.
@@ -218,6 +336,7 @@ class BaseDocEmbServing(BaseServingProcess):
   def on_init(self):
     super(BaseDocEmbServing, self).on_init()
     self.__maybe_load_backup()
+    self.__maybe_load_emb_cache()
     return
 
   def _setup_llm(self):
@@ -587,6 +706,43 @@ class BaseDocEmbServing(BaseServingProcess):
       # endfor each batch
       return self.th.cat(embeddings, dim=0)
 
+    def embed_texts_cached(self, texts):
+      """
+      Same as `embed_texts`, but the texts already embedded (or repeated in `texts`) are taken from the
+      embeddings cache and all the others are embedded together.
+      Parameters
+      ----------
+      texts : str or list[str] - the text or the list of texts to be embedded
+
+      Returns
+      -------
+      torch.Tensor (len(texts), embedding_size) with the embeddings
+      """
+      if not isinstance(texts, list):
+        texts = [texts]
+      # endif texts is not a list
+      if self.__emb_cache is None or self.__emb_cache.max_size <= 0:
+        return self.embed_texts(texts)
+      keys = [self.__emb_cache.text_key(text) for text in texts]
+      found = {}
+      missing = OrderedDict()
+      for key, text in zip(keys, texts):
+        if key in found or key in missing:
+          continue
+        emb = self.__emb_cache.get(key)
+        if emb is None:
+          missing[key] = text
+        else:
+          found[key] = emb
+      # endfor each text
+      if len(missing) > 0:
+        new_embeddings = self.embed_texts(list(missing.values())).numpy()
+        for key, emb in zip(missing.keys(), new_embeddings):
+          found[key] = emb
+          self.__emb_cache.put(key, emb)
+      # endif missing embeddings
+      return self.th.from_numpy(np.stack([found[key] for key in keys]))
+
     def __add_docs(self, docs, context: str = None):
       """
       Add the documents to the context.
@@ -602,7 +758,7 @@ class BaseDocEmbServing(BaseServingProcess):
         self.__backup_contexts()
       # endif context not in dbs
       segments = self.__doc_splitter.split_documents(docs)
-      segments_embeddings = self.embed_texts(segments)
+      segments_embeddings = self.embed_texts_cached(segments)
       curr_size = self.__dbs[context].num_docs()['num_docs']
       lst_docs = [
         NaeuralDoc(text=segment, embedding=emb, idx=curr_size + i)
@@ -666,6 +822,11 @@ class BaseDocEmbServing(BaseServingProcess):
           - ERROR_MESSAGE : str - the error message, if any
           - additional keys can be added
       """
+      # the consecutive queries (up to the next ADD_DOC) are embedded together and searched with one call
+      # per context, so each query still sees the documents added by the requests before it
+      query_results = {}
+      batched_until = 0
+      has_new_docs = False
       results = []
       for i, req in enumerate(preprocessed_requests):
         req_id = req[DocEmbCt.REQUEST_ID]
@@ -682,34 +843,32 @@ class BaseDocEmbServing(BaseServingProcess):
           # TODO: with this implementation a context may be influenced by multiple sets of users.
           #  This can lead to a context that is not representative for any of the users.
           self.__add_docs(docs, context)
+          has_new_docs = True
           results.append(self.get_result_dict(request_id=req_id))
         elif req_type == DocEmbCt.QUERY:
           # TODO: maybe support the following query:
           #  query + temporary context => the context will not be saved, but will be
           #  segmented and used for the query.
+          if i >= batched_until:
+            batched_until = next(
+              (j for j in range(i + 1, len(preprocessed_requests))
+               if preprocessed_requests[j][DocEmbCt.REQUEST_TYPE] == DocEmbCt.ADD_DOC),
+              len(preprocessed_requests)
+            )
+            query_results = self.__batch_queries(preprocessed_requests, start=i, end=batched_until)
+          # endif new run of queries
           req_params = req[DocEmbCt.REQUEST_PARAMS]
           query = req_params['query']
-          context = req_params.get('context', None)
-          context = self.__context_identifier(context)
-          k = req_params.get('k', DEFAULT_NUMBER_OF_RESULTS)
+          context = self.__context_identifier(req_params.get('context', None))
           # In case the context is not available, return an error message.
-          if context not in self.__dbs:
+          if i not in query_results:
             results.append(
               self.get_result_dict(request_id=req_id, error_message=f"Error! Context {context} not found.")
             )
             continue
           # endif context not in dbs
-          # Embed the query.
-          query_embedding = self.embed_texts(query)
-          query_doc = NaeuralDoc(text=query, embedding=query_embedding, idx=-1)
-          # Search for the closest documents.
-          search_results = self.__dbs[context].search(inputs=DocList[NaeuralDoc]([query_doc]), limit=k)
-          # Sort the results by the index.
-          result_texts = [
-            res.text for res in sorted(search_results, key=lambda x: x.idx)
-          ]
           results.append(
-            self.get_result_dict(request_id=req_id, docs=result_texts, query=query)
+            self.get_result_dict(request_id=req_id, docs=query_results[i], query=query)
           )
         elif req_type == DocEmbCt.BAD_REQUEST:
           err_msg = req[DocEmbCt.ERROR_MESSAGE]
@@ -718,7 +877,59 @@ class BaseDocEmbServing(BaseServingProcess):
           )
         # endif request type
       # endfor each preprocessed request
+      self.__maybe_save_emb_cache(force=has_new_docs)
       return results
+
+    def __batch_queries(self, preprocessed_requests, start=0, end=None):
+      """
+      Embeds the QUERY requests with an available context in a single pass and runs one search per
+      context for all of them.
+      Parameters
+      ----------
+      preprocessed_requests : list[dict] - the preprocessed requests
+      start, end : int - only the requests in [start, end) are batched (there must be no ADD_DOC between them)
+
+      Returns
+      -------
+      dict - {request index: list of result texts sorted by their index in the context}
+      """
+      lst_queries = []
+      end = len(preprocessed_requests) if end is None else end
+      for i in range(start, end):
+        req = preprocessed_requests[i]
+        if req[DocEmbCt.REQUEST_TYPE] != DocEmbCt.QUERY:
+          continue
+        req_params = req[DocEmbCt.REQUEST_PARAMS]
+        context = self.__context_identifier(req_params.get('context', None))
+        if context not in self.__dbs:
+          continue
+        k = req_params.get('k', DEFAULT_NUMBER_OF_RESULTS)
+        lst_queries.append((i, req_params['query'], context, k))
+      # endfor each request
+      if len(lst_queries) == 0:
+        return {}
+      query_embeddings = self.embed_texts_cached([query for _, query, _, _ in lst_queries])
+      dct_context_queries = {}
+      for (i, query, context, k), emb in zip(lst_queries, query_embeddings):
+        query_doc = NaeuralDoc(text=query, embedding=emb, idx=-1)
+        dct_context_queries.setdefault(context, []).append((i, k, query_doc))
+      # endfor each query
+      query_results = {}
+      for context, lst_context_queries in dct_context_queries.items():
+        max_k = max(k for _, k, _ in lst_context_queries)
+        # Search for the closest documents of all the context queries.
+        search_results = self.__dbs[context].search(
+          inputs=DocList[NaeuralDoc]([query_doc for _, _, query_doc in lst_context_queries]),
+          limit=max_k
+        )
+        for (i, k, _), res in zip(lst_context_queries, search_results):
+          # The matches are sorted by score so the first k are the closest; these are sorted by the index.
+          query_results[i] = [
+            match.text for match in sorted(res.matches[:k], key=lambda x: x.idx)
+          ]
+        # endfor each context query
+      # endfor each context
+      return query_results
   """END PROCESSING OF REQUESTS"""
 
   def _post_process(self, preds_batch):
@@ -75,6 +75,7 @@ import accelerate
 
 from naeural_core.serving.mixins_llm import LlmTokenizerMixin
 from naeural_core.serving.mixins_llm import LlmModelMixin
+from naeural_core.serving.mixins_llm import LlmBatchingMixin
 from naeural_core.serving.mixins_llm.llm_utils import LlmCT
 
 from naeural_core.serving.base import ModelServingProcess as BaseServingProcess
@@ -106,6 +107,17 @@ _CONFIG = {
 
   "REPETITION_PENALTY"    : 1.1,
 
+  # default generation limit - can be overridden per request via `SERVING_PARAMS`
+  "MAX_NEW_TOKENS"        : 512,
+
+  # continuous batching decode loop (see `LlmBatchingMixin`) instead of a single `model.generate`
+  # on the whole padded batch. Also enables the prefix KV cache.
+  "CONTINUOUS_BATCHING"   : False,
+  # number of sequences decoded together, the others wait for a free slot
+  "MAX_BATCH_SIZE"        : 8,
+  # total number of prompt tokens whose KV state is kept for reuse (0 disables the cache)
+  "PREFIX_CACHE_MAX_TOKENS": 16384,
+
   "ADD_SPECIAL_TOKENS": False,
   "ADD_GENERATION_PROMPT": False,
 
@@ -136,6 +148,7 @@ class BaseLlmServing(
   BaseServingProcess,
   LlmTokenizerMixin,
   LlmModelMixin,
+  LlmBatchingMixin,
 ):
   CONFIG = _CONFIG
 
@@ -363,9 +376,40 @@ class BaseLlmServing(
     return [batch_tokens, attn_mask, predict_kwargs_lst, prompt_lst]
 
 
+  def _predict_continuous(self, batch_tokens, attn_mask, lst_generation_params):
+    """
+    Continuous batching version of `_predict` - returns the same padded [prompt + generated] layout
+    as `model.generate`.
+    """
+    lst_tokens = [
+      batch_tokens[i, :int(attn_mask[i].sum().item())].tolist()
+      for i in range(batch_tokens.shape[0])
+    ]
+    with th.no_grad():
+      lst_generated, nr_reused = self._llm_continuous_generate(
+        lst_tokens=lst_tokens,
+        lst_max_new_tokens=[x[0] for x in lst_generation_params],
+        lst_repetition_penalty=[x[1] for x in lst_generation_params],
+      )
+    # endwith
+    nr_prompt = sum(len(x) for x in lst_tokens)
+    self.P("Prefix cache reused {}/{} prompt tokens ({} entries)".format(
+      nr_reused, nr_prompt, len(self.llm_prefix_cache)
+    ))
+    max_generated = max(len(x) for x in lst_generated)
+    yhat = th.ones(
+      (batch_tokens.shape[0], batch_tokens.shape[1] + max_generated), dtype=th.int64
+    ) * self.padding_id
+    yhat[:, :batch_tokens.shape[1]] = batch_tokens.cpu()
+    for i, generated in enumerate(lst_generated):
+      yhat[i, batch_tokens.shape[1]:batch_tokens.shape[1] + len(generated)] = th.tensor(generated, dtype=th.int64)
+    return yhat
+
+
   def _predict(self, preprocessed_batch):
     self._counter += 1
     batch_tokens, attn_mask, predict_kwargs_lst, prompt_lst = preprocessed_batch
+    lst_generation_params = [self._get_request_generation_params(x) for x in predict_kwargs_lst]
     # Perform generation using tokens and parameters.
     # Note that it's not appropriate to call the forward function
     # here unless we want to re-implement the wheel (various searching
@@ -382,24 +426,31 @@ class BaseLlmServing(
 
     self.P("Running with repetition penalty {}".format(self.cfg_repetition_penalty))
 
-    # TODO: test if some gpu mem can be freed after this
-    with th.no_grad():
-      t0 = self.time()
-      # Note that there's no need to set the padding ID since we've passed
-      # the appropriate attention mask.
-      # TODO: maybe explore assistant_model parameter from
-      #  https://huggingface.co/docs/transformers/v4.44.2/en/llm_optims
-      yhat = self.model.generate(
-        inputs=batch_tokens,
-        max_new_tokens=512,
-        repetition_penalty=self.cfg_repetition_penalty,
-        **model_args
-      )
-      elapsed = self.time() - t0
-    # endwith
+    t0 = self.time()
+    if self.cfg_continuous_batching:
+      yhat = self._predict_continuous(batch_tokens, attn_mask, lst_generation_params)
+    else:
+      # TODO: test if some gpu mem can be freed after this
+      with th.no_grad():
+        # Note that there's no need to set the padding ID since we've passed
+        # the appropriate attention mask.
+        # TODO: maybe explore assistant_model parameter from
+        #  https://huggingface.co/docs/transformers/v4.44.2/en/llm_optims
+        yhat = self.model.generate(
+          inputs=batch_tokens,
+          max_new_tokens=max(x[0] for x in lst_generation_params),
+          repetition_penalty=self.cfg_repetition_penalty,
+          **model_args
+        )
+      # endwith
+    # endif continuous batching
+    elapsed = self.time() - t0
     self.P(f'Done inference in {elapsed} seconds')
     yhat = yhat.cpu().numpy()
     batch_tokens = batch_tokens.cpu().numpy()
+    # each request keeps at most its own number of new tokens
+    for i, (max_new_tokens, _) in enumerate(lst_generation_params):
+      yhat[i, batch_tokens.shape[1] + max_new_tokens:] = self.padding_id
     self.th_utils.clear_cache()
     # Calculate number of generated token per seconds and add it to __tps
     # in order to track inference performance. Generated padding is not
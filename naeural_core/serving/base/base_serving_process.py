@@ -15,6 +15,7 @@ from naeural_core.serving.mixins_base import (
   _InferenceUtilsMixin,
 )
 from naeural_core.utils.system_shared_memory import NumpySharedMemory, replace_shm_with_ndarray, replace_ndarray_with_shm
+from naeural_core.utils.shm_frame_ring import close_attached_frame_rings
 
 # from naeural_core.serving.base.serving_utils import CommEngine
 
@@ -27,6 +28,9 @@ _CONFIG = {
   "SERVING_TIMERS_PREDICT_DUMP_DEFAULT"   : 601,
 
   "CLOSE_IF_UNUSED"                       : False,
+
+  # `cfg_` handlers return cached read-only views of the dict values instead of copies
+  "CONFIG_READONLY_VIEWS"                 : False,
   
   "MAX_WAIT_TIME"                         : 5,
   
@@ -346,7 +350,7 @@ class ModelServingProcess(
       res[ct.INFERENCES] = results
     else:
       res[ct.INFERENCES] = []
-      for stream_name, indexes in self._stream_index_mapping.items():
+      for stream_idx, indexes in self._stream_index_mapping.items():
         crt_stream_results = []
         for i in indexes:
           crt_stream_results.append(results[i])
@@ -409,11 +413,13 @@ class ModelServingProcess(
       'EMPTY' : False
     }
 
-    for stream_input in inputs:
+    # the mapping is keyed by the position of the stream input in the batch as the same stream can
+    # appear multiple times (different SERVING_PARAMS or micro-batched consecutive captures)
+    for stream_idx, stream_input in enumerate(inputs):
       stream_name = stream_input.get('STREAM_NAME')
       if stream_name is None:
         continue
-      self._stream_index_mapping[stream_name] = []
+      self._stream_index_mapping[stream_idx] = []
       lst_sub_stream_inputs = stream_input.get('INPUTS') or []
       _serving_params = stream_input.get('SERVING_PARAMS', {})
 
@@ -427,7 +433,7 @@ class ModelServingProcess(
           dct_picked['SERVING_PARAMS'].append(_serving_params)
           dct_picked['INIT_DATA'].append(_input.get('INIT_DATA'))
           dct_picked['STREAM_NAME'].append(stream_name)
-          self._stream_index_mapping[stream_name].append(len(dct_picked['DATA'])-1)
+          self._stream_index_mapping[stream_idx].append(len(dct_picked['DATA'])-1)
         #endif
       #endfor
     #endfor
@@ -683,6 +689,8 @@ class ModelServingProcess(
       self.P("Shutting down parallel process!")
     if self.npy_shm is not None:
       self.npy_shm.shutdown()
+    if not self.inprocess:
+      close_attached_frame_rings()
     self._shutdown()
     return
 
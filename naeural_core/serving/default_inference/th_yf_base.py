@@ -1,5 +1,6 @@
 from naeural_core.serving.base.basic_th import UnifiedFirstStage as ParentServingProcess
 from naeural_core.local_libraries.nn.th.utils import th_resize_with_pad
+from naeural_core.utils.detection_batch import DetectionBatch
 
 _CONFIG = {
   **ParentServingProcess.CONFIG,
@@ -20,6 +21,10 @@ _CONFIG = {
 
   'MAX_BATCH_FIRST_STAGE': 8,
 
+  # if True each image result is a `DetectionBatch` (numpy columns) instead of a list of dicts.
+  # The dicts are materialized by the data API only for the plugins that need them
+  'COLUMNAR_DETECTIONS': False,
+
   'VALIDATION_RULES': {
     **ParentServingProcess.CONFIG['VALIDATION_RULES'],
   },
@@ -147,8 +152,35 @@ class YfBase(ParentServingProcess):
 
     return th_preds_batch, th_preds_n_det
 
+  @property
+  def use_columnar_detections(self):
+    # second stage results are attached to the individual objects so they need the dicts
+    return self.cfg_columnar_detections and not self.has_second_stage_classifier
+
+  def _post_process_columnar(self, np_pred_nms_cpu):
+    # order is [left, top, right, bottom, proba, class, RP1, RC1, ...]
+    np_tlbr = np_pred_nms_cpu[:, [1, 0, 3, 2]].astype(self.np.int32)
+    extra = None
+    if self.cfg_debug_serving:
+      np_cand = np_pred_nms_cpu[:, 6:].astype(float)
+      extra = {
+        'CANDIDATES': [
+          [[x, self.class_names[int(y)] if self.class_names is not None else y] for (x, y) in zip(row[::2], row[1::2])]
+          for row in np_cand.tolist()
+        ]
+      }
+    #endif debug
+    return DetectionBatch(
+      tlbr=np_tlbr,
+      prob=self.np.round(np_pred_nms_cpu[:, 4].astype(float), 2),
+      class_ids=np_pred_nms_cpu[:, 5].astype(self.np.int32),
+      class_names=self.class_names,
+      extra=extra,
+    )
+
   def _post_process(self, preds):
     pred_nms_cpu, _ = preds
+    use_columnar = self.use_columnar_detections
     nr_images = len(self._lst_original_shapes)
     lst_results = []
     for i in range(nr_images):
@@ -162,6 +194,10 @@ class YfBase(ParentServingProcess):
         coords=np_pred_nms_cpu[:, :4],
         img0_shape=original_shape,
       ).round()
+      if use_columnar:
+        lst_results.append(self._post_process_columnar(np_pred_nms_cpu))
+        continue
+      #endif columnar
       lst_inf = []
       for det in np_pred_nms_cpu:
         det = [float(x) for x in det]
@@ -1,2 +1,3 @@
 from .llm_model_mixin import LlmModelMixin
 from .llm_tokenizer_mixin import LlmTokenizerMixin
+from .llm_batching_mixin import LlmBatchingMixin
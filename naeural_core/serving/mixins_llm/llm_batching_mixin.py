@@ -0,0 +1,303 @@
+"""
+Continuous batching decode loop with prefix KV caching for the LLM serving processes.
+
+The requests of a `_predict` batch are scheduled on a fixed number of decode slots: each request is
+prefilled individually (reusing the KV state of the longest cached token prefix - usually the system
+prompt and the conversation history), then joins the running batch between two decode steps. Sequences
+that reach their end-of-sequence token or their own `MAX_NEW_TOKENS` leave the batch immediately and
+their slots are given to the waiting requests.
+
+The KV state is handled in the "legacy" per-layer `(key, value)` format with the shape
+(batch, heads, seq, head_dim); rows of different lengths are left padded and masked.
+"""
+from collections import OrderedDict, deque
+
+import numpy as np
+import torch as th
+
+try:
+  from transformers import DynamicCache
+except ImportError:
+  DynamicCache = None
+
+
+class LlmPrefixCache:
+  def __init__(self, max_tokens, min_prefix=16):
+    """
+    LRU cache of prompt KV states keyed by their token ids.
+
+    Parameters
+    ----------
+    max_tokens : int
+      maximum total number of cached tokens (the GPU memory is proportional to it).
+
+    min_prefix : int
+      minimum common prefix length for a cache hit.
+    """
+    self.max_tokens = max_tokens
+    self.min_prefix = min_prefix
+    self._entries = OrderedDict()
+    self._total_tokens = 0
+    self.hits = 0
+    self.misses = 0
+    self.reused_tokens = 0
+    return
+
+  def __len__(self):
+    return len(self._entries)
+
+  @staticmethod
+  def _common_prefix_len(np_a, np_b):
+    n = min(np_a.shape[0], np_b.shape[0])
+    diff = np.flatnonzero(np_a[:n] != np_b[:n])
+    return int(diff[0]) if diff.shape[0] > 0 else n
+
+  def lookup(self, tokens):
+    """
+    Returns `(kv, prefix_len)` for the longest cached prefix of `tokens` (at least one token is always
+    left to be prefilled) or `(None, 0)` on a miss.
+    """
+    np_tokens = np.asarray(tokens)
+    best_key, best_len = None, 0
+    for key, (np_cached, _) in self._entries.items():
+      common = self._common_prefix_len(np_tokens, np_cached)
+      if common > best_len:
+        best_key, best_len = key, common
+    #endfor entries
+    best_len = min(best_len, np_tokens.shape[0] - 1)
+    if best_key is None or best_len < self.min_prefix:
+      self.misses += 1
+      return None, 0
+    self._entries.move_to_end(best_key)
+    _, kv = self._entries[best_key]
+    self.hits += 1
+    self.reused_tokens += best_len
+    return tuple(tuple(t[:, :, :best_len] for t in layer) for layer in kv), best_len
+
+  def add(self, tokens, kv):
+    if self.max_tokens <= 0 or len(tokens) > self.max_tokens:
+      return
+    key = tuple(tokens)
+    np_tokens = np.asarray(tokens)
+    if key in self._entries:
+      self._entries.move_to_end(key)
+      return
+    # entries that are a prefix of the new prompt are superseded by it
+    for old_key in [k for k, (np_cached, _) in self._entries.items() if len(k) < len(key)]:
+      if self._common_prefix_len(np_tokens, self._entries[old_key][0]) == len(old_key):
+        self._remove(old_key)
+    self._entries[key] = (np_tokens, kv)
+    self._total_tokens += len(key)
+    while self._total_tokens > self.max_tokens:
+      self._remove(next(iter(self._entries)))
+    return
+
+  def _remove(self, key):
+    self._entries.pop(key)
+    self._total_tokens -= len(key)
+    return
+
+  def clear(self):
+    self._entries.clear()
+    self._total_tokens = 0
+    return
+
+
+class LlmBatchingMixin(object):
+  def __init__(self, *args, **kwargs):
+    self._prefix_cache = None
+    super(LlmBatchingMixin, self).__init__(*args, **kwargs)
+    return
+
+  @property
+  def llm_prefix_cache(self):
+    if self._prefix_cache is None:
+      self._prefix_cache = LlmPrefixCache(max_tokens=int(self.cfg_prefix_cache_max_tokens or 0))
+    return self._prefix_cache
+
+  def _get_request_generation_params(self, predict_kwargs):
+    """
+    Returns the generation limits of a request: its `SERVING_PARAMS` override the serving config.
+    """
+    predict_kwargs = {str(k).upper(): v for k, v in (predict_kwargs or {}).items()}
+    max_new_tokens = predict_kwargs.get('MAX_NEW_TOKENS', self.cfg_max_new_tokens)
+    repetition_penalty = predict_kwargs.get('REPETITION_PENALTY', self.cfg_repetition_penalty)
+    return max(int(max_new_tokens), 1), float(repetition_penalty or 1.0)
+
+  def _llm_eos_ids(self):
+    eos_ids = set()
+    generation_config = getattr(self.model, 'generation_config', None)
+    for eos in [getattr(generation_config, 'eos_token_id', None), self.tokenizer.eos_token_id]:
+      if isinstance(eos, (list, tuple)):
+        eos_ids.update(eos)
+      elif eos is not None:
+        eos_ids.add(eos)
+    return eos_ids
+
+  @staticmethod
+  def _kv_to_legacy(past_key_values):
+    if hasattr(past_key_values, 'to_legacy_cache'):
+      return past_key_values.to_legacy_cache()
+    if hasattr(past_key_values, 'layers'):
+      # transformers 5 caches do not have the legacy conversion anymore
+      return tuple((layer.keys, layer.values) for layer in past_key_values.layers)
+    return past_key_values
+
+  @staticmethod
+  def _kv_from_legacy(kv):
+    if kv is None or DynamicCache is None:
+      return kv
+    if hasattr(DynamicCache, 'from_legacy_cache'):
+      return DynamicCache.from_legacy_cache(kv)
+    return DynamicCache(kv)
+
+  @staticmethod
+  def _kv_left_pad(kv, nr):
+    if nr <= 0:
+      return kv
+    return tuple(
+      tuple(th.cat([t.new_zeros(t.shape[0], t.shape[1], nr, *t.shape[3:]), t], dim=2) for t in layer)
+      for layer in kv
+    )
+
+  def _llm_kv_join(self, kv, mask, new_kv, new_mask):
+    """
+    Appends a (left padded) row to the batched KV state and attention mask.
+    """
+    if kv is None:
+      return new_kv, new_mask
+    len_old, len_new = mask.shape[1], new_mask.shape[1]
+    size = max(len_old, len_new)
+    kv = self._kv_left_pad(kv, size - len_old)
+    new_kv = self._kv_left_pad(new_kv, size - len_new)
+    kv = tuple(
+      tuple(th.cat([t_old, t_new], dim=0) for t_old, t_new in zip(layer_old, layer_new))
+      for layer_old, layer_new in zip(kv, new_kv)
+    )
+    mask = th.cat([
+      th.nn.functional.pad(mask, (size - len_old, 0)),
+      th.nn.functional.pad(new_mask, (size - len_new, 0)),
+    ], dim=0)
+    return kv, mask
+
+  @staticmethod
+  def _llm_kv_select(kv, mask, rows):
+    """
+    Keeps only the `rows` of the batch and drops the padding columns that are no longer needed.
+    """
+    idxs = th.tensor(rows, dtype=th.long, device=mask.device)
+    mask = mask.index_select(0, idxs)
+    start = int(mask.any(dim=0).to(th.int8).argmax().item())
+    kv = tuple(tuple(t.index_select(0, idxs)[:, :, start:] for t in layer) for layer in kv)
+    return kv, mask[:, start:]
+
+  @staticmethod
+  def _llm_next_token(logits, seen_ids, repetition_penalty):
+    """
+    Greedy selection of the next token with the same repetition penalty as `model.generate`.
+    """
+    if repetition_penalty != 1.0:
+      logits = logits.clone()
+      score = logits[seen_ids]
+      logits[seen_ids] = th.where(score < 0, score * repetition_penalty, score / repetition_penalty)
+    return int(logits.argmax().item())
+
+  def _llm_prefill(self, tokens):
+    """
+    Computes the KV state of a prompt (only the tokens that are not covered by the prefix cache) and
+    returns it together with the logits of the last prompt token.
+    """
+    prefix_kv, prefix_len = self.llm_prefix_cache.lookup(tokens)
+    input_ids = th.tensor([tokens[prefix_len:]], dtype=th.long, device=self.device)
+    attn_mask = th.ones((1, len(tokens)), dtype=th.long, device=self.device)
+    position_ids = th.arange(prefix_len, len(tokens), dtype=th.long, device=self.device).unsqueeze(0)
+    out = self.model(
+      input_ids=input_ids,
+      attention_mask=attn_mask,
+      position_ids=position_ids,
+      past_key_values=self._kv_from_legacy(prefix_kv),
+      use_cache=True,
+    )
+    kv = self._kv_to_legacy(out.past_key_values)
+    self.llm_prefix_cache.add(tokens, kv)
+    return kv, attn_mask, out.logits[0, -1, :], prefix_len
+
+  def _llm_continuous_generate(self, lst_tokens, lst_max_new_tokens, lst_repetition_penalty):
+    """
+    Generates the completions of all the requests with a continuous batching decode loop.
+
+    Parameters
+    ----------
+    lst_tokens : list[list[int]]
+      the prompt token ids of each request.
+
+    lst_max_new_tokens, lst_repetition_penalty : list
+      the generation limits of each request.
+
+    Returns
+    -------
+    tuple(list[list[int]], int)
+      the generated token ids of each request and the number of prompt tokens served from the prefix
+      cache.
+    """
+    max_batch_size = max(int(self.cfg_max_batch_size), 1)
+    eos_ids = self._llm_eos_ids()
+    results = [[] for _ in lst_tokens]
+    seen = [th.tensor(x, dtype=th.long, device=self.device) for x in lst_tokens]
+    waiting = deque(range(len(lst_tokens)))
+    active, positions = [], []
+    kv, mask = None, None
+    nr_reused = 0
+
+    def is_done(idx):
+      return results[idx][-1] in eos_ids or len(results[idx]) >= lst_max_new_tokens[idx]
+
+    while len(waiting) > 0 or len(active) > 0:
+      # new requests join the running batch
+      while len(waiting) > 0 and len(active) < max_batch_size:
+        idx = waiting.popleft()
+        req_kv, req_mask, logits, prefix_len = self._llm_prefill(lst_tokens[idx])
+        nr_reused += prefix_len
+        token = self._llm_next_token(logits, seen[idx], lst_repetition_penalty[idx])
+        results[idx].append(token)
+        if is_done(idx):
+          continue
+        seen[idx] = th.cat([seen[idx], seen[idx].new_tensor([token])])
+        kv, mask = self._llm_kv_join(kv, mask, req_kv, req_mask)
+        active.append(idx)
+        positions.append(len(lst_tokens[idx]))
+      #endwhile admissions
+      if len(active) == 0:
+        continue
+
+      # one decode step for all the running sequences
+      input_ids = th.tensor([[results[idx][-1]] for idx in active], dtype=th.long, device=self.device)
+      mask = th.cat([mask, mask.new_ones((len(active), 1))], dim=1)
+      position_ids = th.tensor(positions, dtype=th.long, device=self.device).unsqueeze(1)
+      out = self.model(
+        input_ids=input_ids,
+        attention_mask=mask,
+        position_ids=position_ids,
+        past_key_values=self._kv_from_legacy(kv),
+        use_cache=True,
+      )
+      kv = self._kv_to_legacy(out.past_key_values)
+      logits = out.logits[:, -1, :]
+
+      # finished sequences leave the batch
+      keep = []
+      for row, idx in enumerate(active):
+        token = self._llm_next_token(logits[row], seen[idx], lst_repetition_penalty[idx])
+        results[idx].append(token)
+        if not is_done(idx):
+          seen[idx] = th.cat([seen[idx], seen[idx].new_tensor([token])])
+          keep.append(row)
+      #endfor active rows
+      if len(keep) == 0:
+        kv, mask = None, None
+      elif len(keep) < len(active):
+        kv, mask = self._llm_kv_select(kv, mask, keep)
+      active = [active[row] for row in keep]
+      positions = [positions[row] + 1 for row in keep]
+    #endwhile requests
+    return results, nr_reused
@@ -21,7 +21,7 @@ import traceback
 
 
 from time import sleep, time, strftime, gmtime
-from collections import OrderedDict, defaultdict
+from collections import OrderedDict, defaultdict, deque
 
 # os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 
@@ -71,6 +71,10 @@ class SMConst:
   SERVING_MAX_TRIES = "SERVING_MAX_TRIES"
   SERVING_MAX_TRIES_DEFAULT = 5
   
+  MAX_BATCH_SIZE_DEFAULT = 16 # stream inputs
+  MAX_BATCH_LATENCY_DEFAULT = 0 # seconds - 0 means dispatch as soon as the server is idle
+  MAX_PENDING_REQUESTS_DEFAULT = 4 # per server, oldest requests are dropped above this
+  
   
 def get_raw_server(log, server_name):
   """
@@ -147,6 +151,9 @@ class ServingManager(Manager):
       
       `predict_parallel(dct)`                     : run all given {server:input} pairs in parallel
       
+      `predict_parallel_async(dct, ticket)`       : same as `predict_parallel` but with continuous micro-batching
+                                                    and non-blocking collection of the results
+      
       `get_predict_time(name)`                    : get mean timing for the given serving process - depends on
                                                     individual calls and individual batch sizes
       
@@ -185,6 +192,10 @@ class ServingManager(Manager):
     self._server_names = server_names
     self.inprocess_predict = None
     self._main_tid = threading.get_ident()
+    # async predict state - keyed by the actual (not covered) server
+    self._async_pending = defaultdict(deque)
+    self._async_in_flight = {}
+    self._async_completed = []
     prefix_log = kwargs.pop('prefix_log','[SMGR]')
     super(ServingManager, self).__init__(prefix_log=prefix_log, **kwargs)
     return
@@ -259,6 +270,22 @@ class ServingManager(Manager):
   @property
   def max_wait_time_multiplier(self):
     return self.cfg_serving_environment.get(ct.SERVING.MAX_WAIT_TIME_MULTIPLIER, SMConst.MAX_WAIT_TIME_MULTIPLIER_DEFAULT)
+
+  @property
+  def async_predict(self):
+    return self.cfg_serving_environment.get(ct.SERVING.ASYNC_PREDICT, False)
+
+  @property
+  def _max_batch_size(self):
+    return self.cfg_serving_environment.get(ct.SERVING.MAX_BATCH_SIZE, SMConst.MAX_BATCH_SIZE_DEFAULT)
+
+  @property
+  def _max_batch_latency(self):
+    return self.cfg_serving_environment.get(ct.SERVING.MAX_BATCH_LATENCY, SMConst.MAX_BATCH_LATENCY_DEFAULT)
+
+  @property
+  def _max_pending_requests(self):
+    return self.cfg_serving_environment.get(ct.SERVING.MAX_PENDING_REQUESTS, SMConst.MAX_PENDING_REQUESTS_DEFAULT)
   
   ###
   ### PRIVATE/PROTECTED
@@ -696,6 +723,7 @@ class ServingManager(Manager):
       if self._servers[server_name].get(SMConst.SHM) is not None:
         self._servers[server_name][SMConst.SHM].shutdown()
     
+    self._async_fail_requests(server_name)
     del self._servers[server_name]
     remaining_servers = list(self._servers.keys())
     for svr in remaining_servers:
@@ -830,6 +858,124 @@ class ServingManager(Manager):
     if SMConst.CREATED_DATE not in dct_server:
       dct_server[SMConst.CREATED_DATE] = self.log.now_str(nice_print=True, short=True)
     return
+
+
+  def _get_physical_server(self, server_name):
+    """
+    Returns the name of the server that actually runs the process (and owns the comm pipe) for
+    `server_name` - that is the covering server for aliases.
+    """
+    server_name = self.get_server_name(server_name)
+    covered_by = self._servers.get(server_name, {}).get(SMConst.COVERED_BY)
+    return covered_by or server_name
+
+
+  def _async_fail_requests(self, server_name):
+    """
+    Marks all the async requests queued or in flight on `server_name` as failed (None output) so that
+    the upstream consumers waiting for them are released.
+    """
+    in_flight = self._async_in_flight.pop(server_name, None)
+    if in_flight is not None:
+      _, lst_tickets, _, _ = in_flight
+      for ticket, server_key, _ in lst_tickets:
+        self._async_completed.append((ticket, server_key, None))
+    for ticket, server_key, _, _, _ in self._async_pending.pop(server_name, []):
+      self._async_completed.append((ticket, server_key, None))
+    return
+
+
+  def _async_split_result(self, lst_tickets, output):
+    if len(lst_tickets) == 1:
+      ticket, server_key, _ = lst_tickets[0]
+      self._async_completed.append((ticket, server_key, output))
+      return
+    inferences = output.get(ct.INFERENCES) if isinstance(output, dict) else None
+    nr_inputs = sum(x[2] for x in lst_tickets)
+    if inferences is None or len(inferences) != nr_inputs:
+      if output is not None:
+        self.P("Cannot split micro-batch result: {} inferences for {} inputs".format(
+          None if inferences is None else len(inferences), nr_inputs), color='r'
+        )
+      for ticket, server_key, _ in lst_tickets:
+        self._async_completed.append((ticket, server_key, None))
+      return
+    start = 0
+    for ticket, server_key, nr_ticket_inputs in lst_tickets:
+      self._async_completed.append((ticket, server_key, {
+        **output,
+        ct.INFERENCES: inferences[start:start + nr_ticket_inputs],
+      }))
+      start += nr_ticket_inputs
+    #endfor
+    return
+
+
+  def _async_collect(self, server_name, block=False):
+    """
+    Collects the result of the request in flight on (physical) `server_name` if available. Unless `block` is
+    set this does not wait - a request older than the server max wait time is handled as a timeout.
+    """
+    in_flight = self._async_in_flight.get(server_name)
+    if in_flight is None:
+      return
+    predict_server_name, lst_tickets, send_time, _ = in_flight
+    elapsed = time() - send_time
+    max_wait_time = self._server_wait_time(predict_server_name)
+    if block:
+      max_wait_time = max(0, max_wait_time - elapsed)
+    elif not self._servers[server_name][SMConst.COMM].poll(0):
+      if elapsed <= max_wait_time:
+        # still running
+        return
+      max_wait_time = 0
+    #endif wait or not
+    res = self._wait_for_result(server_name=predict_server_name, max_wait_time=max_wait_time)
+    self.log.stop_timer('remote_pred_' + predict_server_name)
+    # the batch (and its frame ring slots) is released only now - the server reads the frames in place
+    if self._async_in_flight.pop(server_name, None) is None:
+      # the requests were already failed by the server cleanup (timeout)
+      return
+    self._async_split_result(lst_tickets, res[1] if res is not None else None)
+    return
+
+
+  def _async_dispatch(self, server_name):
+    """
+    Sends the next micro-batch to (physical) `server_name` if it is idle and either the batch is full or
+    the oldest queued request waited more than `MAX_BATCH_LATENCY`.
+    """
+    pending = self._async_pending.get(server_name)
+    if not pending or server_name in self._async_in_flight or not self.is_avail(server_name):
+      return
+    nr_pending = sum(len(x[3]) for x in pending)
+    if nr_pending < self._max_batch_size and (time() - pending[0][4]) < self._max_batch_latency:
+      return
+    predict_server_name = pending[0][2]
+    batch, lst_tickets = [], []
+    while len(pending) > 0:
+      ticket, server_key, crt_server_name, inputs, _ = pending[0]
+      if len(lst_tickets) > 0:
+        # only consecutive non-empty requests for the same (alias) server can be merged
+        if crt_server_name != predict_server_name or len(inputs) == 0 or len(batch) == 0:
+          break
+        if len(batch) + len(inputs) > self._max_batch_size:
+          break
+      #endif
+      pending.popleft()
+      batch.extend(inputs)
+      lst_tickets.append((ticket, server_key, len(inputs)))
+    #endwhile
+    self.log.start_timer('remote_pred_' + predict_server_name)
+    self._send_message(
+      server_name=predict_server_name,
+      command=SMConst.PREDICT,
+      inputs=batch,
+    )
+    # the batch is kept as it references the frame ring slots the server reads (zero-copy) until the
+    # result is collected or the requests are failed
+    self._async_in_flight[server_name] = (predict_server_name, lst_tickets, time(), batch)
+    return
     
   
   
@@ -954,6 +1100,8 @@ class ServingManager(Manager):
     if local:      
       _config = _svr.get_config()
     else:
+      # make sure we do not read a async predict result as the config answer
+      self._async_collect(self._get_physical_server(server_name), block=True)
       self._send_message(
         server_name=server_name, 
         command=SMConst.GET_CONFIG, 
@@ -1196,6 +1344,51 @@ class ServingManager(Manager):
     return
   
   
+  def _log_timeouts(self):
+    if self.log_timeouts_last_ts is None or time() - self.log_timeouts_last_ts > self.log_timeouts_period:
+      self.log_timeouts_last_ts = time()
+      msg_str = f"Serving servers timeouts: {self.total_timeouts}"
+      details_str = '\n'.join([f"  {s_name}: {t_cnt}" for s_name, t_cnt in self._timeouts.items()])
+      msg_str = msg_str + '\n' + details_str if len(details_str) > 0 else msg_str
+      self.P(msg_str, color='y')
+    #  endif log timeouts
+    return
+
+
+  def _prepare_parallel_servers(self, dct_servers_inputs, inprocess=False):
+    """
+    Filters out the servers that have no inputs and checks/starts the needed ones.
+    Returns the filtered `dct_servers_inputs` and the list of available servers.
+    """
+    self.log.start_timer('parallel_pred_filter_inputs')
+    # this filtering has been moved from orchestrator >> {k:v for k,v in dct_servers_inputs.items() if len(v) > 0}
+    dct_servers_inputs = {
+      k:v for k,v in dct_servers_inputs.items() 
+      if len(v) > 0 or self.server_runs_on_empty_input(k)
+    }
+    self.log.stop_timer('parallel_pred_filter_inputs')
+    
+    self.log.start_timer('parallel_pred_restart')
+
+    self.owner.set_loop_stage('6.1.serve.run.parallel_pred_restart')
+    # check if servers are online
+    avail_servers = []
+    for server_name in dct_servers_inputs:
+      started = self.maybe_start_server(
+        server_name,
+        inprocess=inprocess
+      )
+      if started is not None:
+        # while `started` can be different from `server_name` as in
+        # `server_name == ('TH_MODEL','ONE')` and `started == 'TH_MODE_ONE'`
+        # we must add upstream idenfier for upstream dict matching
+        avail_servers.append(server_name)
+        self._increment_usage(server_name)
+    
+    self.log.stop_timer('parallel_pred_restart')
+    return dct_servers_inputs, avail_servers
+
+
   def predict_parallel(self, dct_servers_inputs, inprocess=False):
     """
     Multi server predict
@@ -1222,13 +1415,7 @@ class ServingManager(Manager):
       one output for each input (stream).
 
     """
-    if self.log_timeouts_last_ts is None or time() - self.log_timeouts_last_ts > self.log_timeouts_period:
-      self.log_timeouts_last_ts = time()
-      msg_str = f"Serving servers timeouts: {self.total_timeouts}"
-      details_str = '\n'.join([f"  {s_name}: {t_cnt}" for s_name, t_cnt in self._timeouts.items()])
-      msg_str = msg_str + '\n' + details_str if len(details_str) > 0 else msg_str
-      self.P(msg_str, color='y')
-    #  endif log timeouts
+    self._log_timeouts()
     dct_resp = {}
     if not isinstance(dct_servers_inputs, dict):
       self.P("WARNING: parallel predict must receive a dict with at least one server and the associated inputs", color='r')
@@ -1241,33 +1428,8 @@ class ServingManager(Manager):
 
     self.log.start_timer('parallel_pred')
     
-    self.log.start_timer('parallel_pred_filter_inputs')
-    # this filtering has been moved from orchestrator >> {k:v for k,v in dct_servers_inputs.items() if len(v) > 0}
-    dct_servers_inputs = {
-      k:v for k,v in dct_servers_inputs.items() 
-      if len(v) > 0 or self.server_runs_on_empty_input(k)
-    }
-    self.log.stop_timer('parallel_pred_filter_inputs')
-    
-    self.log.start_timer('parallel_pred_restart')
+    dct_servers_inputs, avail_servers = self._prepare_parallel_servers(dct_servers_inputs, inprocess=inprocess)
 
-    self.owner.set_loop_stage('6.1.serve.run.parallel_pred_restart')
-    # check if servers are online
-    avail_servers = []
-    for server_name in dct_servers_inputs:
-      started = self.maybe_start_server(
-        server_name,
-        inprocess=inprocess
-      )
-      if started is not None:
-        # while `started` can be different from `server_name` as in
-        # `server_name == ('TH_MODEL','ONE')` and `started == 'TH_MODE_ONE'`
-        # we must add upstream idenfier for upstream dict matching
-        avail_servers.append(server_name)
-        self._increment_usage(server_name)
-    
-    self.log.stop_timer('parallel_pred_restart')
-    
     # start predicts: at this point we have to be carefull as if a server is (somehow) 
     # called more than once (separate entries in dct_servers_inputs and avail_servers)
     # we may have a crash at the first call that will invalidate the second call
@@ -1326,6 +1488,98 @@ class ServingManager(Manager):
     return dct_resp
   
   
+  def predict_parallel_async(self, dct_servers_inputs, ticket, inprocess=False):
+    """
+    Multi server predict with continuous micro-batching (`SERVING_ENVIRONMENT.ASYNC_PREDICT`).
+    
+    Unlike `predict_parallel` this call never waits for the parallel serving processes: the inputs are
+    queued per serving process and each idle process receives the next micro-batch - consecutive requests
+    merged up to `MAX_BATCH_SIZE` stream inputs or after `MAX_BATCH_LATENCY` seconds. Only one batch is in 
+    flight per process (the shared memory buffer is reused) and at most `MAX_PENDING_REQUESTS` requests 
+    are queued, the oldest ones being dropped (returned with None output).
+
+    Parameters
+    ----------
+    dct_servers_inputs : dict
+      `server` : `inputs` dict - see `predict_parallel`.
+
+    ticket : any
+      identifier of the current request (such as the main loop iteration) returned together with the
+      outputs so the caller can match them to their inputs.
+
+    inprocess : bool, optional
+      if a particular server is not running then start it with give `inprocess`. The default is False.
+
+    Returns
+    -------
+    list of `(ticket, server, output)` for all the requests completed since the last call - including the
+    ones of previous tickets - in order for each server. Failed, timed-out or dropped requests have None output.
+    """
+    self._log_timeouts()
+    if not isinstance(dct_servers_inputs, dict):
+      self.P("WARNING: parallel predict must receive a dict with at least one server and the associated inputs", color='r')
+      dct_servers_inputs = {}
+
+    self.log.start_timer('parallel_pred_async')
+    avail_servers = []
+    if len(dct_servers_inputs) > 0:
+      dct_filtered_inputs, avail_servers = self._prepare_parallel_servers(dct_servers_inputs, inprocess=inprocess)
+      for server_name in dct_filtered_inputs:
+        if server_name not in avail_servers:
+          # server could not be started so we release the waiting consumers
+          self._async_completed.append((ticket, server_name, None))
+      #endfor
+
+      self.log.start_timer('parallel_pred_async_requests')
+      for server_name in avail_servers:
+        self.owner.set_loop_stage('6.1.serve.run.parallel_pred_async_requests.{}'.format(server_name))
+        inputs = dct_filtered_inputs[server_name]
+        if self.is_parallel(server_name):
+          physical_server = self._get_physical_server(server_name)
+          pending = self._async_pending[physical_server]
+          pending.append((ticket, server_name, self.get_server_name(server_name), inputs, time()))
+          while len(pending) > self._max_pending_requests:
+            old_ticket, old_server_name, _, _, _ = pending.popleft()
+            self._async_completed.append((old_ticket, old_server_name, None))
+          #endwhile
+        else:
+          self.log.start_timer('inprocess_pred_' + self.get_server_name(server_name))
+          output = self.simple_predict(
+            server_name=server_name,
+            inputs=inputs,
+          )
+          self._async_completed.append((ticket, server_name, output))
+          self.log.stop_timer('inprocess_pred_' + self.get_server_name(server_name))
+      #endfor
+      self.log.stop_timer('parallel_pred_async_requests')
+      
+      self.owner.set_loop_stage('6.1.serve.run.maybe_run_monitor')
+      self.maybe_run_monitor()
+    #endif any inputs
+
+    # collect finished batches and immediately feed the idle servers with the next micro-batch
+    self.log.start_timer('parallel_pred_async_collect')
+    self.owner.set_loop_stage('6.1.serve.run.parallel_pred_async_collect')
+    for physical_server in list(self._async_in_flight.keys()):
+      if physical_server in self._servers:
+        self._async_collect(physical_server)
+      else:
+        self._async_fail_requests(physical_server)
+    #endfor
+    for physical_server in list(self._async_pending.keys()):
+      self._async_dispatch(physical_server)
+    #endfor
+    self.log.stop_timer('parallel_pred_async_collect')
+
+    self.owner.set_loop_stage('6.1.serve.run.stop_idle_servers')
+    self.collect_and_stop_idle_servers(avail_servers)
+
+    lst_completed = self._async_completed
+    self._async_completed = []
+    self.log.stop_timer('parallel_pred_async')
+    return lst_completed
+
+
   def get_predict_parallel_time(self):
     if 'parallel_pred' in self.log.timers:
       return self.log.timers['parallel_pred']['MEAN']
@@ -19,7 +19,7 @@ from scipy.spatial import distance as dist
 from collections import OrderedDict, deque
 from datetime import datetime
 
-from naeural_core.utils.sort import Sort
+from naeural_core.utils.sort import Sort, VectorizedSort
 from naeural_core import constants as ct
 from decentra_vision import geometry_methods as gmt
 
@@ -37,6 +37,7 @@ class CentroidObjectTracker:
         sort_min_hits=1,
         sort_max_age=3,
         sort_min_iou=0,
+        sort_vectorized=False,
         moved_delta_ratio=0.005,
         linear_reset_minutes=60,
         **kwargs
@@ -80,6 +81,9 @@ class CentroidObjectTracker:
         sort_min_iou : float, optional
             Minimum IOU for matching in SORT tracking.
 
+        sort_vectorized : bool, optional
+            Use `VectorizedSort` (all tracks predicted/updated in a single batched step) instead of `Sort`.
+
         moved_delta_ratio : float, optional
             Not implemented yet.
 
@@ -116,6 +120,7 @@ class CentroidObjectTracker:
         self.sort_min_hits = sort_min_hits
         self.sort_max_age = sort_max_age
         self.sort_min_iou = sort_min_iou
+        self.sort_vectorized = sort_vectorized
 
         self.moved_delta_ratio = moved_delta_ratio  # TODO: Implement moved_delta_ratio functionality
 
@@ -130,7 +135,8 @@ class CentroidObjectTracker:
         Initialize the SORT tracker if it has not been initialized yet.
         """
         if self.sort_tracker is None:
-            self.sort_tracker = Sort(
+            sort_class = VectorizedSort if self.sort_vectorized else Sort
+            self.sort_tracker = sort_class(
                 min_hits=self.sort_min_hits,
                 max_age=self.sort_max_age,
                 iou_threshold=self.sort_min_iou
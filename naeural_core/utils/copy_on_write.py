@@ -0,0 +1,152 @@
+"""
+Copy-on-write containers used to share the same upstream inputs between several business plugin
+instances without deep copying them for each instance.
+
+A `CopyOnWriteDict` / `CopyOnWriteList` is a shallow copy of the original container. Nested dicts and
+lists are replaced - lazily, the first time they are accessed - with their own copy-on-write shallow
+copies, so any change made by a plugin instance stays local to that instance while untouched branches
+are never copied. Numpy arrays are handed out as read-only views of the shared data, a plugin that needs
+to draw on a frame must explicitly ask for a writable copy.
+"""
+
+import numpy as np
+
+from naeural_core.utils.shm_frame_ring import get_readonly_frame_view
+
+
+def _cow_value(value):
+  if type(value) is dict or isinstance(value, CopyOnWriteDict):
+    return CopyOnWriteDict(value)
+  if type(value) is list or isinstance(value, CopyOnWriteList):
+    return CopyOnWriteList(value)
+  if isinstance(value, np.ndarray) and value.flags.writeable:
+    return get_readonly_frame_view(value)
+  return value
+
+
+class CopyOnWriteDict(dict):
+  __slots__ = ('_shared_keys',)
+
+  def __init__(self, src=None):
+    super().__init__(src or {})
+    self._shared_keys = set(dict.keys(self))
+    return
+
+  def _own(self, key):
+    value = dict.__getitem__(self, key)
+    if key in self._shared_keys:
+      self._shared_keys.discard(key)
+      value = _cow_value(value)
+      dict.__setitem__(self, key, value)
+    return value
+
+  def __getitem__(self, key):
+    return self._own(key)
+
+  def get(self, key, default=None):
+    if key in self:
+      return self._own(key)
+    return default
+
+  def __iter__(self):
+    # overriding `__iter__` also disables the dict fast-path in `{**d}` / `dict(d)` / `d2.update(d)`
+    # so that plain copies get the wrapped values and not the shared ones
+    return iter(dict.keys(self))
+
+  def values(self):
+    return [self._own(k) for k in dict.keys(self)]
+
+  def items(self):
+    return [(k, self._own(k)) for k in dict.keys(self)]
+
+  def __setitem__(self, key, value):
+    self._shared_keys.discard(key)
+    dict.__setitem__(self, key, value)
+    return
+
+  def __delitem__(self, key):
+    self._shared_keys.discard(key)
+    dict.__delitem__(self, key)
+    return
+
+  def pop(self, key, *args):
+    if key in self:
+      value = self._own(key)
+      dict.__delitem__(self, key)
+      return value
+    return dict.pop(self, key, *args)
+
+  def popitem(self):
+    key = next(reversed(dict.keys(self)))
+    return key, self.pop(key)
+
+  def setdefault(self, key, default=None):
+    if key in self:
+      return self._own(key)
+    dict.__setitem__(self, key, default)
+    return default
+
+  def update(self, *args, **kwargs):
+    for key, value in dict(*args, **kwargs).items():
+      self[key] = value
+    return
+
+  def clear(self):
+    self._shared_keys.clear()
+    dict.clear(self)
+    return
+
+  def copy(self):
+    return {k: self._own(k) for k in dict.keys(self)}
+
+  def __reduce_ex__(self, protocol):
+    # deepcopy / pickle produce plain (fully private) dicts
+    return dict, (), None, None, iter(self.items())
+
+
+class CopyOnWriteList(list):
+  __slots__ = ('_shared_ids',)
+
+  def __init__(self, src=None):
+    super().__init__(src or [])
+    self._shared_ids = {id(x) for x in list.__iter__(self)}
+    return
+
+  def _own(self, idx):
+    value = list.__getitem__(self, idx)
+    if id(value) in self._shared_ids:
+      value = _cow_value(value)
+      list.__setitem__(self, idx, value)
+    return value
+
+  def __getitem__(self, idx):
+    if isinstance(idx, slice):
+      return [self._own(i) for i in range(*idx.indices(len(self)))]
+    return self._own(idx)
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self._own(i)
+
+  def __reversed__(self):
+    for i in range(len(self) - 1, -1, -1):
+      yield self._own(i)
+
+  def pop(self, idx=-1):
+    value = self._own(idx)
+    list.pop(self, idx)
+    return value
+
+  def copy(self):
+    return list(self)
+
+  def __reduce_ex__(self, protocol):
+    return list, (), None, iter(self)
+
+
+def cow_copy(data):
+  """
+  Returns a copy-on-write view of `data` (dict or list). Cost is O(top-level keys) regardless of
+  the size of the nested data.
+  """
+  return _cow_value(data)
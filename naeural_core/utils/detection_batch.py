@@ -0,0 +1,162 @@
+"""
+Columnar representation of the detections of a single image.
+
+A `DetectionBatch` keeps boxes, scores and class ids as numpy arrays (plus optional per-object extra
+columns) so that it is cheap to pickle through the serving pipe and can be filtered with masks. The classic
+list of per-object dicts (`TLBR_POS`, `PROB_PRC`, `TYPE`, ...) is materialized only on request - the data API
+does it transparently for plugins that are not aware of the columnar format.
+"""
+
+import numpy as np
+
+from naeural_core import constants as ct
+
+
+class DetectionBatch:
+  __slots__ = ('tlbr', 'prob', 'class_ids', 'class_names', 'extra', 'rows')
+
+  def __init__(self, tlbr, prob, class_ids, class_names=None, extra=None, rows=None):
+    """
+    Parameters
+    ----------
+    tlbr : np.ndarray (N, 4) int
+      boxes as [top, left, bottom, right].
+
+    prob : np.ndarray (N,) float
+      detection scores.
+
+    class_ids : np.ndarray (N,) int
+      class index of each detection.
+
+    class_names : list, optional
+      class names shared by all batches of the same model. If None the class id is used as `TYPE`.
+
+    extra : dict{str: np.ndarray/list}, optional
+      additional per-object columns that will be materialized as object keys (None values are skipped).
+
+    rows : np.ndarray (N,) int, optional
+      for filtered batches, the index of each object in the original (serving) batch.
+    """
+    self.tlbr = tlbr
+    self.prob = prob
+    self.class_ids = class_ids
+    self.class_names = class_names
+    self.extra = extra if extra is not None else {}
+    self.rows = rows
+    return
+
+  @staticmethod
+  def empty(class_names=None):
+    return DetectionBatch(
+      tlbr=np.zeros((0, 4), dtype=np.int32),
+      prob=np.zeros(0, dtype=np.float32),
+      class_ids=np.zeros(0, dtype=np.int32),
+      class_names=class_names,
+    )
+
+  def __len__(self):
+    return self.prob.shape[0]
+
+  def __repr__(self):
+    return "DetectionBatch({} objects, columns: {})".format(len(self), list(self.extra.keys()))
+
+  def __getstate__(self):
+    return tuple(getattr(self, k) for k in self.__slots__)
+
+  def __setstate__(self, state):
+    for k, v in zip(self.__slots__, state):
+      setattr(self, k, v)
+    return
+
+  @property
+  def types(self):
+    """
+    Returns the `TYPE` of each object as a numpy (object) array.
+    """
+    if self.class_names is None:
+      return self.class_ids.astype(float)
+    return np.asarray(self.class_names, dtype=object)[self.class_ids]
+
+  def set_column(self, key, values):
+    self.extra[key] = values
+    return
+
+  def filter(self, mask):
+    """
+    Returns a new batch with the objects selected by the boolean `mask` (or index array).
+    """
+    idxs = np.arange(len(self))[mask]
+    extra = {}
+    for key, values in self.extra.items():
+      if isinstance(values, np.ndarray):
+        extra[key] = values[idxs]
+      else:
+        extra[key] = [values[i] for i in idxs]
+    return DetectionBatch(
+      tlbr=self.tlbr[idxs],
+      prob=self.prob[idxs],
+      class_ids=self.class_ids[idxs],
+      class_names=self.class_names,
+      extra=extra,
+      rows=idxs if self.rows is None else self.rows[idxs],
+    )
+
+  def to_list(self):
+    """
+    Materializes the batch as the classic list of per-object dicts. Each call returns new dicts.
+    """
+    lst_tlbr = self.tlbr.tolist()
+    lst_prob = self.prob.tolist()
+    lst_types = self.types.tolist()
+    lst_extra = [
+      (key, values.tolist() if isinstance(values, np.ndarray) else values)
+      for key, values in self.extra.items()
+    ]
+    result = []
+    for i in range(len(lst_prob)):
+      dct_obj = {
+        ct.TLBR_POS: [int(x) for x in lst_tlbr[i]],
+        ct.PROB_PRC: lst_prob[i],
+        ct.TYPE: lst_types[i],
+      }
+      for key, values in lst_extra:
+        if values[i] is not None:
+          dct_obj[key] = values[i]
+      result.append(dct_obj)
+    return result
+
+  def select_objects(self, lst_source):
+    """
+    Returns the objects of `lst_source` (the materialized original batch) that were kept by the filters,
+    updated with the extra columns of this batch. This way the filtered objects are the same dicts as the
+    ones of the full list, exactly as when the filters work directly on the dicts.
+    """
+    rows = self.rows.tolist() if self.rows is not None else range(len(self))
+    lst_extra = [
+      (key, values.tolist() if isinstance(values, np.ndarray) else values)
+      for key, values in self.extra.items()
+    ]
+    result = []
+    for i, row in enumerate(rows):
+      dct_obj = lst_source[row]
+      for key, values in lst_extra:
+        if values[i] is not None:
+          dct_obj[key] = values[i]
+      result.append(dct_obj)
+    return result
+
+
+def materialize_inferences(dct_inferences):
+  """
+  Returns `dct_inferences` ({model: [per-image inference, ...]}) with all the `DetectionBatch` entries
+  converted to lists of dicts. Models without batches are returned as they are (no copies).
+  """
+  result = None
+  for model, lst_images in dct_inferences.items():
+    if not isinstance(lst_images, list) or not any(isinstance(x, DetectionBatch) for x in lst_images):
+      continue
+    if result is None:
+      result = dict(dct_inferences)
+    result[model] = [x.to_list() if isinstance(x, DetectionBatch) else x for x in lst_images]
+  #endfor
+  return dct_inferences if result is None else result
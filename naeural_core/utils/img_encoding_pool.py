@@ -0,0 +1,103 @@
+"""
+Shared pool of threads for the witness images encoding (resize + JPEG + base64).
+
+The images of a payload are encoded in parallel and the encodings are cached by the identity of the frame
+content: the payloads of several plugin instances on the same stream that carry the same frame (usually
+the original image or an undrawn witness) at the same quality reuse the same encoding. Requests for a frame
+that is still being encoded wait for the running encoding instead of starting a new one.
+
+The PIL resize/JPEG encoding releases the GIL so the threads run truly in parallel.
+"""
+import hashlib
+
+import numpy as np
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from naeural_core import constants as ct
+from naeural_core.utils.singletons import Singleton
+
+DEFAULT_NR_WORKERS = 4
+DEFAULT_CACHE_SIZE = 64
+
+
+def get_img_encoding_params(orig=False):
+  """
+  Returns the `(quality, max_height)` used for witness images or for original images.
+  """
+  if not orig:
+    return ct.IMAGE_COMPRESSION.QUALITY, ct.IMAGE_COMPRESSION.MAX_HEIGHT
+  return 95, ct.IMAGE_COMPRESSION.ORIG_MAX_HEIGHT
+
+
+def get_frame_key(img, quality, max_height):
+  """
+  Identity of an encoding: the frame content hash together with the encoding parameters.
+  """
+  np_img = np.ascontiguousarray(img)
+  digest = hashlib.blake2b(memoryview(np_img).cast('B'), digest_size=16).digest()
+  return (digest, np_img.shape, np_img.dtype.str, quality, max_height)
+
+
+class ImageEncodingPool(Singleton):
+  def build(self, nr_workers=DEFAULT_NR_WORKERS, cache_size=DEFAULT_CACHE_SIZE):
+    self.cache_size = cache_size
+    self._executor = ThreadPoolExecutor(max_workers=nr_workers, thread_name_prefix=ct.THREADS_PREFIX + 'img_enc')
+    self._cache = OrderedDict()
+    self._lock = Lock()
+    self.nr_requests = 0
+    self.nr_encoded = 0
+    self.nr_shared = 0
+    return
+
+  def P(self, s, color=None, **kwargs):
+    return self.log.P('[IENC] ' + s, color=color, **kwargs)
+
+  def _encode(self, img, quality, max_height):
+    h, w, _ = np.shape(img)
+    img_str = self.log.np_image_to_base64(
+      np_image=img,
+      quality=quality,
+      max_height=max_height
+    )
+    return img_str, h, w
+
+  def submit(self, img, orig=False):
+    """
+    Starts (or joins) the encoding of `img` and returns a future of `(img_str, h, w)` - same result as
+    `img_to_msg`.
+    """
+    quality, max_height = get_img_encoding_params(orig=orig)
+    key = get_frame_key(img, quality=quality, max_height=max_height)
+    with self._lock:
+      self.nr_requests += 1
+      future = self._cache.get(key)
+      if future is not None:
+        self._cache.move_to_end(key)
+        self.nr_shared += 1
+        return future
+      future = self._executor.submit(self._encode, img, quality, max_height)
+      self.nr_encoded += 1
+      self._cache[key] = future
+      while len(self._cache) > self.cache_size:
+        self._cache.popitem(last=False)
+    #endwith lock
+    # failed encodings are not shared with the next requests
+    future.add_done_callback(lambda f, key=key: f.exception() is not None and self._forget(key, f))
+    return future
+
+  def _forget(self, key, future):
+    with self._lock:
+      if self._cache.get(key) is future:
+        self._cache.pop(key)
+    return
+
+  def get_status(self):
+    return {
+      'REQUESTS'  : self.nr_requests,
+      'ENCODED'   : self.nr_encoded,
+      'SHARED'    : self.nr_shared,
+      'CACHED'    : len(self._cache),
+    }
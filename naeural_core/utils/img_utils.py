@@ -1,13 +1,40 @@
 import numpy as np
 
-from naeural_core import constants as ct
+from naeural_core.utils.img_encoding_pool import get_img_encoding_params
 
 from PIL import Image
 
 
 
-def maybe_prepare_img_payload(sender, dct, keys=['IMG', 'IMG_ORIG'], force_list=False):
+def _to_uint8(img):
+  if img.dtype != np.uint8:
+    if img.dtype == 'float' and 0 <= img.min() <= 1 and 0 <= img.max() <= 1:
+      img = img * 255.0
+    #endif
+    img = img.astype(np.uint8)
+  #endif
+  return img
+
+
+def maybe_prepare_img_payload(sender, dct, keys=['IMG', 'IMG_ORIG'], force_list=False, encoding_pool=None):
+  """
+  Encodes inplace the numpy images of the payload. If an `ImageEncodingPool` is given all the images of
+  the payload are encoded in parallel (and identical frames are encoded only once across payloads).
+  """
   dct['IMG_IN_PAYLOAD'] = False
+  dct_futures = {}
+  if encoding_pool is not None:
+    # all the images of the payload are submitted before waiting for any of them
+    for key in keys:
+      lst_img = dct.get(key, None)
+      lst_img = lst_img if isinstance(lst_img, list) else [lst_img]
+      if len(lst_img) > 0 and isinstance(lst_img[0], np.ndarray):
+        dct_futures[key] = [
+          encoding_pool.submit(_to_uint8(img), orig='ORIG' in key.upper())
+          for img in lst_img if img is not None
+        ]
+    #endfor keys
+  #endif use pool
   for key in keys:
     lst_img = dct.get(key, None)
     
@@ -19,22 +46,18 @@ def maybe_prepare_img_payload(sender, dct, keys=['IMG', 'IMG_ORIG'], force_list=
     
     sender.start_timer('all_img_to_msg')
     if isinstance(lst_img[0], np.ndarray):
+      is_original = 'ORIG' in key.upper()
+      lst_img = [_to_uint8(img) for img in lst_img if img is not None]
+      lst_futures = dct_futures.get(key)
       dct[key] = []
       dct[key + '_SIZE'] = []
-      for img in lst_img:
-        if img is None:
-          continue
-        if img.dtype != np.uint8:
-          if img.dtype == 'float' and 0 <= img.min() <= 1 and 0 <= img.max() <= 1:
-            img = img * 255.0
-          #endif
-          img = img.astype(np.uint8)
-        #endif
-  
+      for i, img in enumerate(lst_img):
         sender.start_timer('np_image_to_base64')
         try:
-          is_original = 'ORIG' in key.upper()
-          img_str, h, w = img_to_msg(sender.log, img, orig=is_original)
+          if lst_futures is not None:
+            img_str, h, w = lst_futures[i].result()
+          else:
+            img_str, h, w = img_to_msg(sender.log, img, orig=is_original)
           dct['IMG_IN_PAYLOAD'] = True
         except Exception as e:
           err_msg = str(e)
@@ -70,12 +93,7 @@ def img_to_msg(log, img, orig=False):
   # retrieving the original resolution
   h, w, _ = np.shape(img)
 
-  if not orig:
-    quality=ct.IMAGE_COMPRESSION.QUALITY
-    max_height=ct.IMAGE_COMPRESSION.MAX_HEIGHT
-  else:
-    quality=95
-    max_height=ct.IMAGE_COMPRESSION.ORIG_MAX_HEIGHT
+  quality, max_height = get_img_encoding_params(orig=orig)
 
   # resizing image and converting to string
   img_str = log.np_image_to_base64(
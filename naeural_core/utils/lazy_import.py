@@ -0,0 +1,143 @@
+"""
+Deferred loading of heavy third-party modules and import-time accounting.
+
+`lazy_import('pandas')` returns a proxy that imports the module on the first attribute access, so the
+node and each serving process only pay for the libraries they actually use. The time spent on each
+(lazy or explicitly timed) import is recorded and summarized by `get_import_report`, which is logged at
+startup.
+"""
+import importlib
+import sys
+
+from threading import Lock
+from time import perf_counter
+
+DEFAULT_IMPORT_BUDGET = 5   # seconds
+
+# heavy libraries worth reporting when they were loaded eagerly by someone
+HEAVY_MODULES = [
+  'torch', 'tensorflow', 'transformers', 'pandas', 'cv2', 'matplotlib', 'sklearn', 'scipy', 'PIL',
+  'bs4', 'yaml', 'requests',
+]
+
+_IMPORT_TIMES = {}
+_IMPORT_LOCK = Lock()
+
+
+def record_import_time(name, elapsed):
+  _IMPORT_TIMES[name] = _IMPORT_TIMES.get(name, 0) + elapsed
+  return
+
+
+class timed_import:
+  """
+  Context manager that records the time spent in a block of imports:
+
+    with timed_import('logger_mixins'):
+      from .logger_mixins import ...
+  """
+  def __init__(self, name):
+    self.name = name
+    return
+
+  def __enter__(self):
+    self._start = perf_counter()
+    return self
+
+  def __exit__(self, *args):
+    record_import_time(self.name, perf_counter() - self._start)
+    return False
+
+
+class LazyModule:
+  """
+  Module proxy that imports the module on the first attribute access.
+  """
+  def __init__(self, name, optional=False):
+    self.__dict__['_lazy_name'] = name
+    self.__dict__['_lazy_optional'] = optional
+    self.__dict__['_lazy_module'] = None
+    self.__dict__['_lazy_error'] = None
+    return
+
+  def __repr__(self):
+    state = 'loaded' if self._lazy_module is not None else 'not loaded'
+    return "<lazy module '{}' ({})>".format(self._lazy_name, state)
+
+  @property
+  def is_loaded(self):
+    return self._lazy_module is not None
+
+  def load(self):
+    """
+    Returns the module (imported now if needed) or None for a missing optional module.
+    """
+    if self._lazy_module is not None:
+      return self._lazy_module
+    with _IMPORT_LOCK:
+      if self._lazy_module is None and self._lazy_error is None:
+        already_loaded = self._lazy_name in sys.modules
+        start = perf_counter()
+        try:
+          self.__dict__['_lazy_module'] = importlib.import_module(self._lazy_name)
+          if not already_loaded:
+            record_import_time(self._lazy_name, perf_counter() - start)
+        except ImportError as exc:
+          if not self._lazy_optional:
+            raise
+          self.__dict__['_lazy_error'] = exc
+      #endif first load
+    #endwith lock
+    return self._lazy_module
+
+  def __getattr__(self, name):
+    module = self.load()
+    if module is None:
+      raise ImportError("Optional module '{}' is not available: {}".format(self._lazy_name, self._lazy_error))
+    return getattr(module, name)
+
+  def __setattr__(self, name, value):
+    setattr(self.load(), name, value)
+    return
+
+  def __dir__(self):
+    module = self.load()
+    return dir(module) if module is not None else []
+
+
+def lazy_import(name, optional=False):
+  """
+  Returns the already imported module or a `LazyModule` proxy.
+  """
+  module = sys.modules.get(name)
+  if module is not None:
+    return module
+  return LazyModule(name, optional=optional)
+
+
+def get_import_report(budget=DEFAULT_IMPORT_BUDGET):
+  """
+  Returns
+  -------
+  dict
+    TIMES: the recorded import times (descending), TOTAL: their sum, OVER_BUDGET: TOTAL > budget,
+    LOADED_HEAVY: the heavy modules already in memory.
+  """
+  times = sorted(_IMPORT_TIMES.items(), key=lambda x: -x[1])
+  total = sum(x[1] for x in times)
+  return {
+    'TIMES'         : {k: round(v, 3) for k, v in times},
+    'TOTAL'         : round(total, 3),
+    'BUDGET'        : budget,
+    'OVER_BUDGET'   : total > budget,
+    'LOADED_HEAVY'  : [x for x in HEAVY_MODULES if x in sys.modules],
+  }
+
+
+def format_import_report(budget=DEFAULT_IMPORT_BUDGET):
+  report = get_import_report(budget=budget)
+  str_times = ", ".join("{}: {:.2f}s".format(k, v) for k, v in report['TIMES'].items())
+  return "Import time {:.2f}s (budget {}s){}: {}. Heavy modules loaded: {}".format(
+    report['TOTAL'], budget, ' EXCEEDED' if report['OVER_BUDGET'] else '',
+    str_times or '-', report['LOADED_HEAVY'] or '-',
+  )
@@ -0,0 +1,99 @@
+"""
+Incremental memory accounting of the business plugins input queues.
+
+The size of each input is estimated once, when it is queued, and the queue keeps the running total so
+the memory held by a queue is available in O(1) without walking the queued objects (which for a queue of
+frames takes hundreds of milliseconds - usually exactly when the node is overloaded).
+
+The estimate counts the numpy buffers by their `nbytes` and the containers by their own (shallow) size.
+Inputs shared between several plugin instances (`SHARED_READONLY_INPUTS`) are counted in each queue that
+holds them.
+"""
+import sys
+
+import numpy as np
+
+from collections import deque
+from threading import Lock
+
+MAX_DEPTH = 8
+NDARRAY_OVERHEAD = sys.getsizeof(np.empty(0))
+
+
+def estimate_size(obj, max_depth=MAX_DEPTH):
+  """
+  Returns the estimated memory size (bytes) of an input: numpy buffers by their `nbytes`, dicts, lists
+  and tuples by their own size plus their values (up to `max_depth` levels), everything else by
+  `sys.getsizeof`.
+  """
+  if isinstance(obj, np.ndarray):
+    return obj.nbytes + NDARRAY_OVERHEAD
+  if isinstance(obj, dict):
+    size = sys.getsizeof(obj)
+    if max_depth > 0:
+      # `dict.values` does not trigger the copy of the copy-on-write inputs
+      for value in dict.values(obj):
+        size += estimate_size(value, max_depth - 1)
+    return size
+  if isinstance(obj, (list, tuple)):
+    size = sys.getsizeof(obj)
+    if max_depth > 0:
+      values = list.__iter__(obj) if isinstance(obj, list) else obj
+      for value in values:
+        size += estimate_size(value, max_depth - 1)
+    return size
+  return sys.getsizeof(obj)
+
+
+class AccountedDeque(deque):
+  """
+  Deque that keeps the total estimated size of its items. Supports the operations used for the plugin
+  input queues: `append` (including the implicit drop of the oldest item when full), `popleft` and
+  `clear`.
+  """
+  def __init__(self, iterable=(), maxlen=None, sizer=estimate_size):
+    super().__init__(maxlen=maxlen)
+    self._sizer = sizer
+    self._sizes = deque()
+    self._lock = Lock()
+    self.nbytes = 0
+    self.max_nbytes = 0
+    self.nr_added = 0
+    self.total_added_nbytes = 0
+    for item in iterable:
+      self.append(item)
+    return
+
+  def append(self, item):
+    size = self._sizer(item)
+    with self._lock:
+      if self.maxlen is not None and len(self) >= self.maxlen and len(self._sizes) > 0:
+        # the oldest item is dropped by the deque itself
+        self.nbytes -= self._sizes.popleft()
+      super().append(item)
+      self._sizes.append(size)
+      self.nbytes += size
+      self.max_nbytes = max(self.max_nbytes, self.nbytes)
+      self.nr_added += 1
+      self.total_added_nbytes += size
+    return
+
+  def popleft(self):
+    with self._lock:
+      item = super().popleft()
+      self.nbytes -= self._sizes.popleft()
+    return item
+
+  def clear(self):
+    with self._lock:
+      super().clear()
+      self._sizes.clear()
+      self.nbytes = 0
+    return
+
+  def __reduce__(self):
+    return type(self), (list(self), self.maxlen, self._sizer)
+
+  @property
+  def avg_item_nbytes(self):
+    return self.total_added_nbytes / self.nr_added if self.nr_added > 0 else 0
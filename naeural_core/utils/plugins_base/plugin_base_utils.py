@@ -2,10 +2,6 @@ import json
 import subprocess
 from threading import Thread
 import numpy as np
-import pandas as pd
-import cv2
-import PIL
-import requests
 import uuid
 import os
 import sys
@@ -13,20 +9,23 @@ import traceback
 import inspect
 import re
 import base64
-import yaml
 import zlib
 import hashlib
 
 from subprocess import Popen
 
 from naeural_core.utils.thread_raise import ctype_async_raise
+from naeural_core.utils.lazy_import import lazy_import, LazyModule
 
-try:
-  # Temporarily guard the bs4 import until we can be sure
-  # that it's available in all environments.
-  import bs4
-except ImportError as _:
-  bs4 = None
+# the heavy third-party packages are imported on first use
+pd = lazy_import('pandas')
+cv2 = lazy_import('cv2')
+PIL = lazy_import('PIL')
+requests = lazy_import('requests')
+yaml = lazy_import('yaml')
+# Temporarily guard the bs4 import until we can be sure
+# that it's available in all environments.
+bs4 = lazy_import('bs4', optional=True)
 
 
 from collections import OrderedDict, defaultdict, deque
@@ -1769,7 +1768,8 @@ class _UtilsBaseMixin(
       ```
 
     """
-    return bs4
+    # None if bs4 is not installed
+    return bs4.load() if isinstance(bs4, LazyModule) else bs4
   
   def get_gpu_info(self, device_id=0):
     """
@@ -0,0 +1,334 @@
+"""
+Per-stream shared memory frame ring.
+
+A DCT that has `USE_SHM_FRAME_RING` enabled writes (or decodes) each frame directly into a slot
+of its own shared memory ring. The frame travels through the main loop and business plugins as a
+regular ndarray view over that slot, while the `ServingManager` only sends a small `FrameSlotHandle`
+(ring, slot, generation, shape, dtype) to the serving processes instead of copying and pickling the
+actual pixels.
+
+Slot lifetime is reference counted:
+  - in the owner process the slot is held as long as any view (or sub-view) of the frame is alive,
+    so deques, business plugin queues and in-flight serving requests all keep the slot pinned;
+  - once the last reference is gone the slot goes back to the free list (O(1), no scanning);
+  - every reuse increments the slot generation (stored in the shared header) so a consumer holding a
+    stale handle gets `None` instead of somebody else's frame.
+
+Consumers in other processes (serving) receive read-only views and must not keep them after the
+request has been answered.
+"""
+
+import re
+import threading
+import uuid
+import weakref
+import numpy as np
+
+from collections import deque
+from multiprocessing import shared_memory
+
+from naeural_core import DecentrAIObject
+
+__VER__ = '0.1.0'
+
+_GEN_DTYPE = np.int64
+_SLOT_ALIGN = 64
+
+# id(view) -> FrameSlotHandle for all ring views alive in the current process
+_LOCAL_VIEWS = {}
+_LOCAL_VIEWS_LOCK = threading.RLock()
+
+# ring_name -> (stream, SharedMemory) for rings attached by consumer processes
+_ATTACHED_RINGS = {}
+
+
+class FrameSlotHandle:
+  """
+  Small picklable reference to a frame living in a `SharedFrameRing` slot.
+  """
+  __slots__ = ('ring_name', 'stream', 'slot', 'generation', 'offset', 'shape', 'dtype')
+
+  def __init__(self, ring_name, stream, slot, generation, offset, shape, dtype):
+    self.ring_name = ring_name
+    self.stream = stream
+    self.slot = slot
+    self.generation = generation
+    self.offset = offset
+    self.shape = tuple(shape)
+    self.dtype = str(dtype)
+    return
+
+  def __getstate__(self):
+    return tuple(getattr(self, k) for k in self.__slots__)
+
+  def __setstate__(self, state):
+    for k, v in zip(self.__slots__, state):
+      setattr(self, k, v)
+    return
+
+  def __repr__(self):
+    return "FrameSlotHandle({}:{}#{} {} {})".format(
+      self.stream, self.slot, self.generation, self.shape, self.dtype
+    )
+
+
+class SharedFrameRing(DecentrAIObject):
+  def __init__(self, stream, nr_slots, slot_bytes, **kwargs):
+    """
+    Shared memory ring of `nr_slots` frame slots of `slot_bytes` each, owned (created, written and
+    released) by a single process - the one running the DCT.
+
+    Parameters
+    ----------
+    stream : str
+      name of the stream (pipeline) that owns the ring.
+
+    nr_slots : int
+      number of frames that can be alive at the same time (queued in DCT, in business plugins, in flight
+      to serving processes).
+
+    slot_bytes : int
+      maximum size in bytes of a frame.
+
+    log : Logger
+      parent instance of the Logger
+    """
+    self.version = __VER__
+    self.initialized = False
+    self._stream = stream
+    self._nr_slots = int(nr_slots)
+    self._slot_bytes = int(np.ceil(slot_bytes / _SLOT_ALIGN) * _SLOT_ALIGN)
+    self._header_bytes = int(np.ceil(self._nr_slots * np.dtype(_GEN_DTYPE).itemsize / _SLOT_ALIGN) * _SLOT_ALIGN)
+    self._shm = None
+    self._generations = None
+    self._free = deque(range(self._nr_slots))
+    self._lock = threading.RLock()
+    self._closed = False
+    self._nr_writes = 0
+    self._nr_fallbacks = 0
+    self._mem_name = None
+    super(SharedFrameRing, self).__init__(**kwargs)
+    return
+
+  def startup(self):
+    super().startup()
+    self._mem_name = 'fring_{}_{}'.format(
+      re.sub(r'[^\w]', '_', self._stream)[:40], uuid.uuid4().hex[:8],
+    )
+    try:
+      self._shm = shared_memory.SharedMemory(
+        create=True,
+        name=self._mem_name,
+        size=self._header_bytes + self._nr_slots * self._slot_bytes,
+      )
+      self._generations = np.ndarray((self._nr_slots,), dtype=_GEN_DTYPE, buffer=self._shm.buf)
+      self._generations[:] = 0
+      self.initialized = True
+      self.P("Frame ring '{}' created: {} slots x {:.1f} MB".format(
+        self._mem_name, self._nr_slots, self._slot_bytes / 1024**2,
+      ))
+    except Exception as exc:
+      self.P("Failed to create frame ring for '{}': {}".format(self._stream, exc), color='error')
+      self.initialized = False
+    return
+
+  def P(self, s, **kwargs):
+    super().P(s, prefix=True, **kwargs)
+    return
+
+  def __repr__(self):
+    return "SharedFrameRing({}, {}x{})".format(self._mem_name, self._nr_slots, self._slot_bytes)
+
+  @property
+  def name(self):
+    return self._mem_name
+
+  @property
+  def slot_bytes(self):
+    return self._slot_bytes
+
+  @property
+  def nr_free(self):
+    return len(self._free)
+
+  def _slot_offset(self, slot):
+    return self._header_bytes + slot * self._slot_bytes
+
+  def _release_slot(self, slot, view_id):
+    with _LOCAL_VIEWS_LOCK:
+      _LOCAL_VIEWS.pop(view_id, None)
+    with self._lock:
+      if not self._closed:
+        self._free.append(slot)
+    return
+
+  def reserve(self, shape, dtype='uint8'):
+    """
+    Returns a writable ndarray of `shape` and `dtype` backed by a free slot of the ring, or None if the
+    ring is full, closed or the frame does not fit in a slot. Decode/convert directly into the returned
+    array and then pass it as the `img` of a DCT input - no other copy will be made.
+    """
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+    if not self.initialized or nbytes > self._slot_bytes:
+      return None
+    with self._lock:
+      if self._closed or len(self._free) == 0:
+        return None
+      slot = self._free.popleft()
+      self._generations[slot] += 1
+      generation = int(self._generations[slot])
+    offset = self._slot_offset(slot)
+    view = np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=offset)
+    handle = FrameSlotHandle(
+      ring_name=self._mem_name,
+      stream=self._stream,
+      slot=slot,
+      generation=generation,
+      offset=offset,
+      shape=view.shape,
+      dtype=dtype,
+    )
+    view_id = id(view)
+    with _LOCAL_VIEWS_LOCK:
+      _LOCAL_VIEWS[view_id] = handle
+    weakref.finalize(view, self._release_slot, slot, view_id)
+    return view
+
+  def put(self, img):
+    """
+    Moves `img` into the ring. Returns the ring view (or `img` unchanged if it already is a ring view,
+    is not a ndarray or the ring cannot accept it).
+    """
+    if not isinstance(img, np.ndarray) or get_frame_handle(img) is not None:
+      return img
+    view = self.reserve(img.shape, img.dtype)
+    if view is None:
+      self._nr_fallbacks += 1
+      return img
+    np.copyto(view, img)
+    self._nr_writes += 1
+    return view
+
+  def get_status(self):
+    return {
+      'RING'      : self._mem_name,
+      'SLOTS'     : self._nr_slots,
+      'FREE'      : len(self._free),
+      'SLOT_MB'   : round(self._slot_bytes / 1024**2, 2),
+      'WRITES'    : self._nr_writes,
+      'FALLBACKS' : self._nr_fallbacks,
+    }
+
+  def shutdown(self):
+    with self._lock:
+      if self._closed:
+        return
+      self._closed = True
+    self.P("Shutdown frame ring {} ({} of {} slots still referenced)...".format(
+      self._mem_name, self._nr_slots - len(self._free), self._nr_slots,
+    ))
+    if self._shm is not None:
+      self._generations = None
+      try:
+        self._shm.unlink()
+      except Exception:
+        pass
+      try:
+        self._shm.close()
+      except BufferError:
+        # views are still alive somewhere - the mapping will be freed when they are collected
+        pass
+    return
+
+
+"""FRAME RING CLASS END"""
+
+
+def get_frame_handle(data):
+  """
+  Returns the `FrameSlotHandle` if `data` is a frame ring view created in this process, None otherwise.
+  Copies or sub-views of a ring view are NOT ring views and will return None.
+  """
+  if not _LOCAL_VIEWS:
+    return None
+  return _LOCAL_VIEWS.get(id(data))
+
+
+def _attach_ring(handle):
+  ring = _ATTACHED_RINGS.get(handle.ring_name)
+  if ring is None:
+    # a new ring for a known stream means the owner re-created it so we drop the old mapping
+    for ring_name, (stream, shm) in list(_ATTACHED_RINGS.items()):
+      if stream == handle.stream:
+        _ATTACHED_RINGS.pop(ring_name)
+        _close_shm(shm)
+    ring = (handle.stream, shared_memory.SharedMemory(create=False, name=handle.ring_name))
+    _ATTACHED_RINGS[handle.ring_name] = ring
+  return ring[1]
+
+
+def _close_shm(shm):
+  try:
+    shm.close()
+  except Exception:
+    pass
+  return
+
+
+def frame_handle_to_ndarray(handle: FrameSlotHandle, log=None):
+  """
+  Consumer side: returns a read-only ndarray view of the frame referred by `handle` or None if the ring is
+  gone or the slot has been recycled in the meantime.
+  """
+  try:
+    shm = _attach_ring(handle)
+    generations = np.ndarray((handle.slot + 1,), dtype=_GEN_DTYPE, buffer=shm.buf)
+    if int(generations[handle.slot]) != handle.generation:
+      if log is not None:
+        log.P("Stale frame handle {} (current generation {})".format(
+          handle, int(generations[handle.slot])), color='r'
+        )
+      return None
+    view = np.ndarray(handle.shape, dtype=handle.dtype, buffer=shm.buf, offset=handle.offset)
+    view.flags.writeable = False
+    return view
+  except Exception as exc:
+    if log is not None:
+      log.P("Failed to resolve frame handle {}: {}".format(handle, exc), color='r')
+    return None
+
+
+def close_attached_frame_rings():
+  """
+  Closes all the rings attached by the current (consumer) process.
+  """
+  for ring_name in list(_ATTACHED_RINGS.keys()):
+    _, shm = _ATTACHED_RINGS.pop(ring_name)
+    _close_shm(shm)
+  return
+
+
+def get_readonly_frame_view(img):
+  """
+  Returns a read-only view of `img` sharing its memory. If `img` is a frame ring view the new view is
+  registered under the same handle so it can still be passed by handle to serving processes (the view
+  keeps the original alive, so the slot stays pinned).
+  """
+  if not isinstance(img, np.ndarray):
+    return img
+  view = img.view()
+  view.flags.writeable = False
+  handle = get_frame_handle(img)
+  if handle is not None:
+    view_id = id(view)
+    with _LOCAL_VIEWS_LOCK:
+      _LOCAL_VIEWS[view_id] = handle
+    weakref.finalize(view, _forget_view, view_id)
+  return view
+
+
+def _forget_view(view_id):
+  with _LOCAL_VIEWS_LOCK:
+    _LOCAL_VIEWS.pop(view_id, None)
+  return
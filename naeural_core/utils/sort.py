@@ -250,6 +250,157 @@ class Sort(object):
       return np.concatenate(ret)
     return np.empty((0,5))
 
+class VectorizedSort(object):
+  """
+  Drop-in replacement of `Sort` that keeps the constant velocity Kalman state of all the tracks in
+  stacked arrays (x: N x 7, P: N x 7 x 7) so predict and update run as single batched numpy operations
+  instead of one `KalmanFilter` per track. Model, noise setup, association (`associate_detections_to_trackers`),
+  track ids and output are the same as in `Sort` + `KalmanBoxTracker`.
+  """
+  DIM_X = 7
+  DIM_Z = 4
+
+  F = np.array([
+    [1,0,0,0,1,0,0],[0,1,0,0,0,1,0],[0,0,1,0,0,0,1],[0,0,0,1,0,0,0],
+    [0,0,0,0,1,0,0],[0,0,0,0,0,1,0],[0,0,0,0,0,0,1]
+  ], dtype=float)
+  H = np.array([[1,0,0,0,0,0,0],[0,1,0,0,0,0,0],[0,0,1,0,0,0,0],[0,0,0,1,0,0,0]], dtype=float)
+
+  def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3):
+    self.max_age = max_age
+    self.min_hits = min_hits
+    self.iou_threshold = iou_threshold
+    self.frame_count = 0
+
+    # same noise setup as `KalmanBoxTracker`
+    self._R = np.eye(self.DIM_Z)
+    self._R[2:, 2:] *= 10.
+    self._Q = np.eye(self.DIM_X)
+    self._Q[-1, -1] *= 0.01
+    self._Q[4:, 4:] *= 0.01
+    self._P0 = np.eye(self.DIM_X)
+    self._P0[4:, 4:] *= 1000.
+    self._P0 *= 10.
+    self._I = np.eye(self.DIM_X)
+
+    self._x = np.zeros((0, self.DIM_X))
+    self._P = np.zeros((0, self.DIM_X, self.DIM_X))
+    self._ids = np.zeros(0, dtype=int)
+    self._time_since_update = np.zeros(0, dtype=int)
+    self._hits = np.zeros(0, dtype=int)
+    self._hit_streak = np.zeros(0, dtype=int)
+    self._age = np.zeros(0, dtype=int)
+    return
+
+  @property
+  def nr_tracks(self):
+    return self._x.shape[0]
+
+  @staticmethod
+  def _bboxes_to_z(bboxes):
+    w = bboxes[:, 2] - bboxes[:, 0]
+    h = bboxes[:, 3] - bboxes[:, 1]
+    return np.stack([bboxes[:, 0] + w / 2., bboxes[:, 1] + h / 2., w * h, w / h.astype(float)], axis=1)
+
+  @staticmethod
+  def _x_to_bboxes(x):
+    w = np.sqrt(x[:, 2] * x[:, 3])
+    h = x[:, 2] / w
+    return np.stack([x[:, 0] - w / 2., x[:, 1] - h / 2., x[:, 0] + w / 2., x[:, 1] + h / 2.], axis=1)
+
+  def _keep(self, mask):
+    self._x = self._x[mask]
+    self._P = self._P[mask]
+    self._ids = self._ids[mask]
+    self._time_since_update = self._time_since_update[mask]
+    self._hits = self._hits[mask]
+    self._hit_streak = self._hit_streak[mask]
+    self._age = self._age[mask]
+    return
+
+  def _predict(self):
+    x = self._x
+    x[(x[:, 6] + x[:, 2]) <= 0, 6] = 0.
+    self._x = x @ self.F.T
+    self._P = self.F @ self._P @ self.F.T + self._Q
+    self._age += 1
+    self._hit_streak[self._time_since_update > 0] = 0
+    self._time_since_update += 1
+    return self._x_to_bboxes(self._x)
+
+  def _update(self, idxs, bboxes):
+    z = self._bboxes_to_z(bboxes)
+    x = self._x[idxs]
+    P = self._P[idxs]
+    y = z - x @ self.H.T
+    PHT = P @ self.H.T
+    S = self.H @ PHT + self._R
+    K = PHT @ np.linalg.inv(S)
+    self._x[idxs] = x + (K @ y[:, :, None])[:, :, 0]
+    I_KH = self._I - K @ self.H
+    self._P[idxs] = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ self._R @ K.transpose(0, 2, 1)
+    self._time_since_update[idxs] = 0
+    self._hits[idxs] += 1
+    self._hit_streak[idxs] += 1
+    return
+
+  def _create(self, bboxes):
+    n = bboxes.shape[0]
+    x = np.zeros((n, self.DIM_X))
+    x[:, :4] = self._bboxes_to_z(bboxes)
+    ids = np.arange(KalmanBoxTracker.count, KalmanBoxTracker.count + n)
+    KalmanBoxTracker.count += n
+    zeros = np.zeros(n, dtype=int)
+    self._x = np.concatenate([self._x, x])
+    self._P = np.concatenate([self._P, np.repeat(self._P0[None], n, axis=0)])
+    self._ids = np.concatenate([self._ids, ids])
+    self._time_since_update = np.concatenate([self._time_since_update, zeros])
+    self._hits = np.concatenate([self._hits, zeros])
+    self._hit_streak = np.concatenate([self._hit_streak, zeros])
+    self._age = np.concatenate([self._age, zeros])
+    return
+
+  def update(self, dets=np.empty((0, 5))):
+    """
+    Same contract as `Sort.update`: dets is [[x1,y1,x2,y2,score],...] and the result is [[x1,y1,x2,y2,id],...]
+    """
+    self.frame_count += 1
+    dets = np.asarray(dets, dtype=float)
+    if dets.size == 0:
+      dets = np.empty((0, 5))
+    if self.nr_tracks > 0:
+      pred = self._predict()
+      valid = ~np.any(np.isnan(pred), axis=1)
+      if not valid.all():
+        self._keep(valid)
+        pred = pred[valid]
+      trks = np.concatenate([pred, np.zeros((pred.shape[0], 1))], axis=1)
+    else:
+      trks = np.empty((0, 5))
+    #endif predict
+
+    matched, unmatched_dets, _ = associate_detections_to_trackers(dets, trks, self.iou_threshold)
+
+    if len(matched) > 0:
+      self._update(matched[:, 1], dets[matched[:, 0], :4])
+    if len(unmatched_dets) > 0:
+      self._create(dets[unmatched_dets.astype(int), :4])
+
+    if self.nr_tracks == 0:
+      return np.empty((0, 5))
+
+    # same ordering as `Sort` - tracks are reported in reverse creation order
+    show = (self._time_since_update < 1) & ((self._hit_streak >= self.min_hits) | (self.frame_count <= self.min_hits))
+    show_idxs = np.nonzero(show)[0][::-1]
+    ret = np.concatenate([self._x_to_bboxes(self._x[show_idxs]), (self._ids[show_idxs] + 1)[:, None]], axis=1)
+    # remove dead tracklets
+    alive = self._time_since_update <= self.max_age
+    if not alive.all():
+      self._keep(alive)
+    if ret.shape[0] > 0:
+      return ret
+    return np.empty((0,5))
+
 def parse_args():
     """Parse input arguments."""
     parser = argparse.ArgumentParser(description='SORT demo')
@@ -0,0 +1,156 @@
+"""
+Append-only journal with compacted snapshots for the persistence of large, slowly changing states
+(network monitor heartbeat history, epochs availability data).
+
+The state is persisted as:
+  - a snapshot file: a plain pickle of `{JOURNAL_SEQ: <seq>, JOURNAL_DATA: <state>}` written to a temporary
+    file and atomically moved over the previous snapshot
+  - a journal file (`<snapshot>.journal`): a sequence of records, each one being the pickle of
+    `(seq, payload)` prefixed by its length and crc32. The payloads are the state deltas accumulated
+    between two saves.
+
+Recovery loads the snapshot and returns the payloads of the journal records that are newer than the
+snapshot so the owner can replay them. A torn or corrupted tail (crash during an append) is detected
+via the crc and truncated. A crash between the snapshot move and the journal truncation is harmless as
+the records already included in the snapshot are skipped based on their sequence number.
+"""
+
+import os
+import pickle
+import struct
+import zlib
+
+from threading import Lock
+
+JOURNAL_SEQ = 'JOURNAL_SEQ'
+JOURNAL_DATA = 'JOURNAL_DATA'
+
+JOURNAL_EXT = '.journal'
+
+DEFAULT_MAX_JOURNAL_SIZE = 64 * 1024 ** 2
+
+_HEADER = struct.Struct('<II')  # record length, crc32
+
+
+class StateJournal:
+  def __init__(self, snapshot_path, max_journal_size=DEFAULT_MAX_JOURNAL_SIZE):
+    """
+    Parameters
+    ----------
+    snapshot_path : str
+      full path of the snapshot file. The journal is kept next to it.
+
+    max_journal_size : int
+      journal size in bytes above which `needs_compaction` returns True.
+    """
+    self.snapshot_path = snapshot_path
+    self.journal_path = snapshot_path + JOURNAL_EXT
+    self.max_journal_size = max_journal_size
+    self._seq = 0
+    self._lock = Lock()
+    return
+
+  @property
+  def seq(self):
+    return self._seq
+
+  @property
+  def journal_size(self):
+    return os.path.getsize(self.journal_path) if os.path.isfile(self.journal_path) else 0
+
+  def needs_compaction(self):
+    return self.journal_size >= self.max_journal_size
+
+  @staticmethod
+  def unwrap_snapshot(obj):
+    """
+    Returns `(state, seq)` for a loaded snapshot. Legacy snapshots (the plain state) get seq 0.
+    """
+    if isinstance(obj, dict) and JOURNAL_SEQ in obj and JOURNAL_DATA in obj:
+      return obj[JOURNAL_DATA], obj[JOURNAL_SEQ]
+    return obj, 0
+
+  def _read_records(self):
+    records, valid_size = [], 0
+    if not os.path.isfile(self.journal_path):
+      return records, valid_size
+    with open(self.journal_path, 'rb') as fh:
+      raw = fh.read()
+    pos = 0
+    while pos + _HEADER.size <= len(raw):
+      size, crc = _HEADER.unpack_from(raw, pos)
+      start, end = pos + _HEADER.size, pos + _HEADER.size + size
+      if end > len(raw) or zlib.crc32(raw[start:end]) != crc:
+        break
+      try:
+        records.append(pickle.loads(raw[start:end]))
+      except Exception:
+        break
+      pos = end
+    #endwhile records
+    return records, pos
+
+  def recover(self, snapshot_obj):
+    """
+    Unwraps the loaded snapshot and reads the journal.
+
+    Parameters
+    ----------
+    snapshot_obj : any
+      the content of the snapshot file or None if there is no snapshot.
+
+    Returns
+    -------
+    tuple(any, list, int)
+      the state, the payloads that must be replayed over it (oldest first) and the number of bytes
+      discarded from the end of the journal.
+    """
+    with self._lock:
+      state, snapshot_seq = self.unwrap_snapshot(snapshot_obj)
+      records, valid_size = self._read_records()
+      discarded = self.journal_size - valid_size
+      if discarded > 0:
+        with open(self.journal_path, 'r+b') as fh:
+          fh.truncate(valid_size)
+      payloads = [payload for seq, payload in records if seq > snapshot_seq]
+      last_seq = records[-1][0] if len(records) > 0 else 0
+      self._seq = max(self._seq, snapshot_seq, last_seq)
+    return state, payloads, discarded
+
+  def append(self, payload):
+    """
+    Appends a delta record to the journal. Returns the number of bytes written.
+    """
+    with self._lock:
+      seq = self._seq + 1
+      raw = pickle.dumps((seq, payload), protocol=pickle.HIGHEST_PROTOCOL)
+      folder = os.path.dirname(self.journal_path)
+      if folder:
+        os.makedirs(folder, exist_ok=True)
+      with open(self.journal_path, 'ab') as fh:
+        fh.write(_HEADER.pack(len(raw), zlib.crc32(raw)))
+        fh.write(raw)
+        fh.flush()
+        os.fsync(fh.fileno())
+      self._seq = seq
+    return _HEADER.size + len(raw)
+
+  def write_snapshot(self, state):
+    """
+    Atomically replaces the snapshot with `state` (that must include all the journaled deltas) and resets
+    the journal.
+    """
+    with self._lock:
+      folder = os.path.dirname(self.snapshot_path)
+      if folder:
+        os.makedirs(folder, exist_ok=True)
+      tmp_path = self.snapshot_path + '.tmp'
+      with open(tmp_path, 'wb') as fh:
+        pickle.dump({JOURNAL_SEQ: self._seq, JOURNAL_DATA: state}, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        fh.flush()
+        os.fsync(fh.fileno())
+      os.replace(tmp_path, self.snapshot_path)
+      if os.path.isfile(self.journal_path):
+        with open(self.journal_path, 'r+b') as fh:
+          fh.truncate(0)
+    return
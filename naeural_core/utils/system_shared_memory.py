@@ -10,6 +10,7 @@ import sys
 import traceback
 
 from naeural_core import DecentrAIObject
+from naeural_core.utils.shm_frame_ring import FrameSlotHandle, get_frame_handle, frame_handle_to_ndarray
 
 __VER__ = '0.2.1.3'
 MAXLEN = 50
@@ -472,6 +473,9 @@ class NumpySharedMemoryPlaceholder:
     return self.__shm_idx
 
 
+_SHM_REFERENCES = (NumpySharedMemoryPlaceholder, FrameSlotHandle)
+
+
 def ndarray_to_shm(data: np.ndarray, shm: NumpySharedMemory, debug: bool = False) -> NumpySharedMemoryPlaceholder:
   """
   Helper function to replace a numpy ndarray with a shared memory object.
@@ -483,8 +487,14 @@ def ndarray_to_shm(data: np.ndarray, shm: NumpySharedMemory, debug: bool = False
 
   Returns
   -------
-  res - NumpySharedMemoryPlaceholder - the placeholder object
+  res - NumpySharedMemoryPlaceholder or FrameSlotHandle - the placeholder object
   """
+  frame_handle = get_frame_handle(data)
+  if frame_handle is not None:
+    # the frame already lives in a shared frame ring so we just pass its handle
+    if debug:
+      shm.log.P(f"Data of shape {data.shape} already in shared frame ring as {frame_handle}")
+    return frame_handle
   if debug:
     shm.log.P(f"Writing data of shape {data.shape if isinstance(data, np.ndarray) else None} to shared memory.")
   idx = shm.add_data_to_buffer(data)
@@ -536,14 +546,19 @@ def shm_to_ndarray(data: NumpySharedMemoryPlaceholder, shm: NumpySharedMemory, d
   Helper function to replace a shared memory object with a numpy ndarray.
   Parameters
   ----------
-  data - NumpySharedMemoryPlaceholder - the placeholder object to be replaced
+  data - NumpySharedMemoryPlaceholder or FrameSlotHandle - the placeholder object to be replaced
   shm - NumpySharedMemory - the shared memory object to be used
   debug - bool - if True, the function will print debug information
 
   Returns
   -------
-  res - np.ndarray - the numpy array
+  res - np.ndarray - the numpy array (read-only view for FrameSlotHandle)
   """
+  if isinstance(data, FrameSlotHandle):
+    res = frame_handle_to_ndarray(data, log=shm.log)
+    if debug:
+      shm.log.P(f"Read data of shape {res.shape if isinstance(res, np.ndarray) else None} from {data}.")
+    return res
   shm_idx = data.get_shm_idx()
   if debug:
     shm.log.P(f"Reading data from shared memory index {shm_idx}")
@@ -571,7 +586,7 @@ def replace_shm_with_ndarray(data: any, shm: NumpySharedMemory, debug: bool = Fa
   if isinstance(data, list):
     res = [None] * len(data)
     for i in range(len(data)):
-      if isinstance(data[i], NumpySharedMemoryPlaceholder):
+      if isinstance(data[i], _SHM_REFERENCES):
         res[i] = shm_to_ndarray(data[i], shm, debug)
       else:
         res[i] = replace_shm_with_ndarray(data[i], shm, debug)
@@ -579,12 +594,12 @@ def replace_shm_with_ndarray(data: any, shm: NumpySharedMemory, debug: bool = Fa
   elif isinstance(data, dict):
     res = {}
     for k in data:
-      if isinstance(data[k], NumpySharedMemoryPlaceholder):
+      if isinstance(data[k], _SHM_REFERENCES):
         res[k] = shm_to_ndarray(data[k], shm, debug)
       else:
         res[k] = replace_shm_with_ndarray(data[k], shm, debug)
     # endfor data
-  elif isinstance(data, NumpySharedMemoryPlaceholder):
+  elif isinstance(data, _SHM_REFERENCES):
     res = shm_to_ndarray(data, shm, debug)
   else:
     res = data
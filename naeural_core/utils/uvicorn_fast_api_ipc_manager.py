@@ -1,7 +1,34 @@
+"""
+Communication between the uvicorn/FastAPI web server process and its business plugin.
+
+Two channels are available:
+  - the `multiprocessing` manager queues (default) - each `put`/`get`/`empty` is a round-trip to the
+    manager process and both sides poll the queues
+  - a direct socket channel (`PluginIpcServer` on the plugin side, enabled by the plugin `DIRECT_IPC`
+    config) - a Unix domain socket (loopback TCP where not available) with length-prefixed pickled
+    frames. The uvicorn side reads the replies with an asyncio-native reader and any number of
+    requests can be in flight (pipelining), the plugin side reader threads wake up the plugin loop as
+    soon as a request arrives.
+"""
 import asyncio
+import hmac
+import os
+import pickle
+import shutil
+import socket
+import struct
+import tempfile
 import uuid
 import multiprocessing
+
+from collections import deque
 from multiprocessing.managers import SyncManager
+from threading import Lock, Thread
+
+FRAME_HEADER = struct.Struct('!I')
+MAX_FRAME_SIZE = 1024 ** 3
+AUTH_OK = b'OK'
+USE_UNIX_SOCKET = hasattr(socket, 'AF_UNIX') and os.name != 'nt'
 
 # The following need to be global due to the multiprocessing
 # method being set to spawn.
@@ -45,6 +72,173 @@ def get_client_manager(port, auth):
     manager.connect()
     return manager
 
+def _encode_frame(obj):
+  payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+  return FRAME_HEADER.pack(len(payload)), payload
+
+
+def _recv_exact(sock, size):
+  buffer = bytearray(size)
+  view = memoryview(buffer)
+  pos = 0
+  while pos < size:
+    nr = sock.recv_into(view[pos:], size - pos)
+    if nr == 0:
+      raise ConnectionError("IPC connection closed")
+    pos += nr
+  return buffer
+
+
+def _recv_frame(sock, max_size=MAX_FRAME_SIZE):
+  size, = FRAME_HEADER.unpack(_recv_exact(sock, FRAME_HEADER.size))
+  if size > max_size:
+    raise ConnectionError("IPC frame of {} bytes exceeds the maximum size".format(size))
+  return _recv_exact(sock, size)
+
+
+class PluginIpcServer:
+  """
+  Plugin side of the direct channel. Each connection of the web server gets a reader thread that queues
+  the requests (see `get_requests`) and calls `on_request` so the plugin loop can be woken up. The
+  replies are sent with `send_response` on the connection the request came from.
+  """
+  def __init__(self, auth, on_request=None, log_func=None):
+    """
+    Parameters
+    ----------
+    auth: bytes or str, secret the clients must send before anything else.
+    on_request: callable, called (from the reader threads) when requests are available.
+    log_func: callable, used to log the connections and the errors.
+    """
+    self.auth = auth.encode() if isinstance(auth, str) else auth
+    self.on_request = on_request
+    self.log_func = log_func
+    self.address = None
+    self._sock = None
+    self._tmp_dir = None
+    self._requests = deque()
+    self._origins = {}
+    self._connections = []
+    self._lock = Lock()
+    self._done = False
+    self.nr_requests = 0
+    return
+
+  def _log(self, msg, color=None):
+    if self.log_func is not None:
+      self.log_func(msg, color=color)
+    return
+
+  def start(self):
+    """
+    Starts listening and returns the address to be given to `UvicornPluginComms` (the socket path or
+    the loopback TCP port).
+    """
+    if USE_UNIX_SOCKET:
+      # private folder so only this user can connect
+      self._tmp_dir = tempfile.mkdtemp(prefix='ee_ipc_')
+      path = os.path.join(self._tmp_dir, 'plugin.sock')
+      self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+      self._sock.bind(path)
+      self.address = path
+    else:
+      self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+      self._sock.bind(('127.0.0.1', 0))
+      self.address = self._sock.getsockname()[1]
+    self._sock.listen()
+    Thread(target=self._accept_loop, name='ipc_accept', daemon=True).start()
+    return self.address
+
+  def _accept_loop(self):
+    while not self._done:
+      try:
+        conn, _ = self._sock.accept()
+      except OSError:
+        break
+      Thread(target=self._connection_loop, args=(conn,), name='ipc_conn', daemon=True).start()
+    #endwhile accepting
+    return
+
+  def _connection_loop(self, conn):
+    try:
+      # the auth frame is read with its own size limit so unauthenticated peers cannot make us allocate
+      # large buffers
+      if not hmac.compare_digest(bytes(_recv_frame(conn, max_size=len(self.auth))), self.auth):
+        self._log("IPC connection rejected: invalid auth", color='r')
+        conn.close()
+        return
+      conn.sendall(FRAME_HEADER.pack(len(AUTH_OK)) + AUTH_OK)
+      if not USE_UNIX_SOCKET:
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+      record = {'conn': conn, 'lock': Lock()}
+      with self._lock:
+        self._connections.append(record)
+      self._log("IPC connection established with the web server")
+      while not self._done:
+        request = pickle.loads(_recv_frame(conn))
+        with self._lock:
+          self._origins[request['id']] = record
+          self._requests.append(request)
+          self.nr_requests += 1
+        if self.on_request is not None:
+          self.on_request()
+      #endwhile reading requests
+    except (ConnectionError, OSError):
+      pass
+    except Exception as exc:
+      self._log("IPC connection error: {}".format(exc), color='r')
+    finally:
+      with self._lock:
+        self._connections = [x for x in self._connections if x['conn'] is not conn]
+        # the responses of the requests received on this connection cannot be delivered anymore
+        self._origins = {k: v for k, v in self._origins.items() if v['conn'] is not conn}
+      conn.close()
+    return
+
+  def get_requests(self):
+    """
+    Returns (and removes) all the received requests.
+    """
+    requests = []
+    with self._lock:
+      while len(self._requests) > 0:
+        requests.append(self._requests.popleft())
+    return requests
+
+  def send_response(self, response):
+    """
+    Sends the `{'id', 'value'}` reply on the connection of the request with the same id.
+    """
+    with self._lock:
+      record = self._origins.pop(response['id'], None)
+    if record is None:
+      self._log("IPC reply {} has no pending request".format(response['id']), color='r')
+      return False
+    header, payload = _encode_frame(response)
+    try:
+      with record['lock']:
+        record['conn'].sendall(header)
+        record['conn'].sendall(payload)
+    except OSError as exc:
+      self._log("IPC reply {} could not be sent: {}".format(response['id'], exc), color='r')
+      return False
+    return True
+
+  def stop(self):
+    self._done = True
+    if self._sock is not None:
+      self._sock.close()
+    with self._lock:
+      for record in self._connections:
+        try:
+          record['conn'].shutdown(socket.SHUT_RDWR)
+        except OSError:
+          pass
+    if self._tmp_dir is not None:
+      shutil.rmtree(self._tmp_dir, ignore_errors=True)
+    return
+
+
 class UvicornPluginComms:
   """
   Communicator for Uvicorn/FastAPI with an instance of the fastapi plugin.
@@ -55,7 +249,7 @@ class UvicornPluginComms:
   FastAPI endpoints can call the call_plugin method to deliver and receive
   requests from the associated business plugin.
   """
-  def __init__(self, port, auth):
+  def __init__(self, port, auth, ipc_address=None):
     """
     Initializer for the UvicornPluginComms.
 
@@ -64,15 +258,24 @@ class UvicornPluginComms:
     port: int, port value used for commuication with the business plugin
     auth: str, string value used for authenticating and establishing
       communications with the business plugin.
+    ipc_address: str or int, address of the plugin `PluginIpcServer`. If
+      provided the direct channel is used instead of the manager queues.
     Returns
     -------
     None
     """
-    self.manager = get_client_manager(
-      port=port, auth=auth
-    )
+    self.ipc_address = ipc_address
+    self.auth = auth
+    self.manager = None
+    if ipc_address is None:
+      self.manager = get_client_manager(
+        port=port, auth=auth
+      )
     self._commands = {}
     self._reads_messages = False
+    self._reader = None
+    self._writer = None
+    self._connect_lock = None
     return
 
   async def call_plugin(self, *request):
@@ -94,6 +297,9 @@ class UvicornPluginComms:
     await comms.call_plugin('foo', 'bar', 'baz') will call the
     business plugin method 'foo' with arguments 'bar' and 'baz'.
     """
+    if self.ipc_address is not None:
+      return await self._call_direct(request)
+
     # Generate a uuid for the current message and an event that can be
     # used to signal that the request has been completed.
     event = asyncio.Event()
@@ -166,3 +372,75 @@ class UvicornPluginComms:
     #endwhile communicator loop
     return
 
+  async def _connect(self):
+    """
+    Opens (once) the direct connection and starts the reader task.
+    """
+    if self._connect_lock is None:
+      self._connect_lock = asyncio.Lock()
+    async with self._connect_lock:
+      if self._writer is not None:
+        return
+      if isinstance(self.ipc_address, str):
+        reader, writer = await asyncio.open_unix_connection(self.ipc_address)
+      else:
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.ipc_address)
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+      auth = self.auth.encode() if isinstance(self.auth, str) else self.auth
+      writer.write(FRAME_HEADER.pack(len(auth)) + auth)
+      await writer.drain()
+      try:
+        size, = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+        accepted = await reader.readexactly(size) == AUTH_OK
+      except asyncio.IncompleteReadError:
+        accepted = False
+      if not accepted:
+        writer.close()
+        raise ConnectionError("IPC connection refused by the plugin")
+      self._reader, self._writer = reader, writer
+      asyncio.ensure_future(self._read_direct(reader))
+    return
+
+  async def _call_direct(self, request):
+    """
+    Sends the request on the direct channel and waits for its reply. Any number of requests can be in
+    flight on the connection, the replies are matched by id.
+    """
+    await self._connect()
+    ee_uuid = uuid.uuid4().hex
+    future = asyncio.get_running_loop().create_future()
+    self._commands[ee_uuid] = future
+    try:
+      header, payload = _encode_frame({
+        'id' : ee_uuid,
+        'value' : request
+      })
+      self._writer.writelines([header, payload])
+      await self._writer.drain()
+      return await future
+    finally:
+      self._commands.pop(ee_uuid, None)
+
+  async def _read_direct(self, reader):
+    """
+    Reads the replies of the plugin as soon as they arrive and resolves the
+    pending requests. When the connection is lost the pending requests fail
+    and the next request reconnects.
+    """
+    try:
+      while True:
+        size, = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+        message = pickle.loads(await reader.readexactly(size))
+        future = self._commands.get(message['id'])
+        if future is not None and not future.done():
+          future.set_result(message['value'])
+      #endwhile reading replies
+    except Exception as exc:
+      if self._reader is reader:
+        self._writer.close()
+        self._reader, self._writer = None, None
+      for future in list(self._commands.values()):
+        if not future.done():
+          future.set_exception(ConnectionError("IPC connection lost: {}".format(exc)))
+      #endfor fail pending
+    return
@@ -1,8 +1,372 @@
 import cv2
 import os
 
+from collections import deque
+from queue import Queue, Empty
+from threading import Lock, Event, Thread
+from time import time
+
 from naeural_core import DecentrAIObject
 from naeural_core import Logger
+from naeural_core.utils.singletons import Singleton
+
+
+EXPIRY_CHECK_INTERVAL = 0.5   # seconds between two checks of the handles close times
+WAIT_ON_SHUTDOWN = 30         # max seconds to wait for the open videos to be finalized on shutdown
+
+
+class DropPolicy:
+  DROP_OLDEST = 'drop_oldest'   # keep the most recent frames
+  DROP_NEWEST = 'drop_newest'   # keep the queued frames, reject the new one
+  BLOCK = 'block'               # wait (with timeout) for room in the queue, then drop the new frame
+  POLICIES = [DROP_OLDEST, DROP_NEWEST, BLOCK]
+
+
+class AsyncVideoHandle:
+  """
+  Writer-like handle (`write`, `release`, `isOpened`) returned to the plugins. The frames are queued in a
+  bounded per-handle queue and encoded by the `VideoWriterService` worker threads.
+  """
+  def __init__(self, service, writer, path=None, max_queue=64, drop_policy=DropPolicy.DROP_OLDEST,
+               block_timeout=1.0, copy_frames=True):
+    assert drop_policy in DropPolicy.POLICIES, "Unknown drop policy '{}'".format(drop_policy)
+    self.service = service
+    self.writer = writer
+    self.path = path
+    self.max_queue = max_queue
+    self.drop_policy = drop_policy
+    self.block_timeout = block_timeout
+    self.copy_frames = copy_frames
+
+    self.nr_queued = 0
+    self.nr_written = 0
+    self.nr_dropped = 0
+    # the service closes the handle after this time even if `release` is not called (e.g. stalled stream)
+    self.close_at = None
+
+    self._frames = deque()
+    self._lock = Lock()
+    self._room = Event()
+    self._room.set()
+    self._scheduled = False
+    self._closing = False
+    self._released = False
+    self._closed = Event()
+    return
+
+  def __repr__(self):
+    return "<AsyncVideoHandle '{}' q:{} w:{} d:{}>".format(
+      self.path, len(self._frames), self.nr_written, self.nr_dropped
+    )
+
+  @property
+  def qsize(self):
+    return len(self._frames)
+
+  @property
+  def is_closing(self):
+    return self._closing
+
+  def set_close_time(self, close_at):
+    """
+    Sets the time when the service closes the handle. Returns False if the handle is already closing.
+    """
+    with self._lock:
+      if self._closing:
+        return False
+      self.close_at = close_at
+    return True
+
+  def isOpened(self):
+    return not self._closing and self.writer.isOpened()
+
+  def write(self, frame, copy=None):
+    """
+    Queues the frame for encoding. Returns False if the frame was dropped.
+    """
+    if self._closing:
+      return False
+    if self.drop_policy == DropPolicy.BLOCK and len(self._frames) >= self.max_queue:
+      self._room.wait(timeout=self.block_timeout)
+    with self._lock:
+      if len(self._frames) >= self.max_queue:
+        if self.drop_policy == DropPolicy.DROP_OLDEST:
+          self._frames.popleft()
+          self.nr_dropped += 1
+        else:
+          self.nr_dropped += 1
+          return False
+      #endif queue full
+      # the plugin may draw over the same buffer after this call
+      copy = self.copy_frames if copy is None else copy
+      self._frames.append(frame.copy() if copy else frame)
+      self.nr_queued += 1
+      if len(self._frames) >= self.max_queue:
+        self._room.clear()
+      schedule = not self._scheduled
+      self._scheduled = True
+    #endwith lock
+    if schedule:
+      self.service.schedule(self)
+    return True
+
+  def release(self, wait=False, timeout=None):
+    """
+    Closes the handle: the already queued frames are still written then the writer is released by the
+    service. If `wait` is True blocks until the file is finalized.
+    """
+    with self._lock:
+      self._closing = True
+      schedule = not self._scheduled
+      self._scheduled = True
+    if schedule:
+      self.service.schedule(self)
+    if wait:
+      self._closed.wait(timeout=timeout)
+    return
+
+  def wait_closed(self, timeout=None):
+    return self._closed.wait(timeout=timeout)
+
+  def _process(self, max_frames):
+    """
+    Called only by the service workers - at most one worker runs it for a handle at any given time.
+    Returns True if the handle must be scheduled again.
+    """
+    for _ in range(max_frames):
+      with self._lock:
+        if len(self._frames) == 0:
+          break
+        frame = self._frames.popleft()
+        if len(self._frames) < self.max_queue:
+          self._room.set()
+      #endwith lock
+      self.writer.write(frame)
+      self.nr_written += 1
+    #endfor frames
+    with self._lock:
+      if len(self._frames) > 0:
+        return True
+      self._scheduled = False
+      closing = self._closing and not self._released
+      self._released = self._released or closing
+    #endwith lock
+    if closing:
+      self.writer.release()
+      self._closed.set()
+      self.service._on_handle_closed(self)
+    return False
+
+
+class VideoWriterService(Singleton):
+  """
+  Process-wide pool of threads that encode the frames of all the `AsyncVideoHandle`s so the business
+  plugin loops only pay for queueing the frames.
+  """
+  def build(self, nr_workers=2, frames_per_turn=8):
+    self.frames_per_turn = frames_per_turn
+    self._ready = Queue()
+    self._handles = set()
+    self._handles_lock = Lock()
+    self._last_expiry_check = 0
+    self._stop = Event()
+    self._workers = []
+    for i in range(nr_workers):
+      thread = Thread(target=self._run, name='video_writer_{}'.format(i), daemon=True)
+      thread.start()
+      self._workers.append(thread)
+    return
+
+  def P(self, s, color=None, **kwargs):
+    return self.log.P('[VWRS] ' + s, color=color, **kwargs)
+
+  def create_handle(self, writer, path=None, **kwargs):
+    handle = AsyncVideoHandle(service=self, writer=writer, path=path, **kwargs)
+    with self._handles_lock:
+      self._handles.add(handle)
+    return handle
+
+  def schedule(self, handle):
+    self._ready.put(handle)
+    return
+
+  def _on_handle_closed(self, handle):
+    with self._handles_lock:
+      self._handles.discard(handle)
+    return
+
+  def _maybe_close_expired(self):
+    now = time()
+    with self._handles_lock:
+      if (now - self._last_expiry_check) < EXPIRY_CHECK_INTERVAL:
+        return
+      self._last_expiry_check = now
+      expired = [x for x in self._handles if x.close_at is not None and now >= x.close_at]
+    for handle in expired:
+      handle.release()
+    return
+
+  def shutdown(self, timeout=WAIT_ON_SHUTDOWN):
+    """
+    Closes all the open handles, waits (at most `timeout` seconds) until their queued frames are written
+    and their files finalized, then stops the workers. A later `VideoWriterService(...)` call creates a
+    new service.
+    """
+    with self._handles_lock:
+      handles = list(self._handles)
+    if len(handles) > 0:
+      self.P("Flushing {} open videos...".format(len(handles)))
+    for handle in handles:
+      handle.release()
+    deadline = time() + timeout
+    not_closed = [x for x in handles if not x.wait_closed(timeout=max(deadline - time(), 0))]
+    if len(not_closed) > 0:
+      self.P("Videos not finalized in {}s: {}".format(timeout, not_closed), color='r')
+    self._stop.set()
+    for thread in self._workers:
+      thread.join(timeout=max(deadline - time(), 0.1))
+    with type(self)._lock:
+      if getattr(type(self), '_instance', None) is self:
+        del type(self)._instance
+    return
+
+  def _run(self):
+    while not self._stop.is_set():
+      self._maybe_close_expired()
+      try:
+        handle = self._ready.get(timeout=EXPIRY_CHECK_INTERVAL)
+      except Empty:
+        continue
+      try:
+        # a handle with many queued frames gets a turn and goes back in line so the others are not starved
+        if handle._process(self.frames_per_turn):
+          self._ready.put(handle)
+      except Exception as exc:
+        self.P("Error writing video '{}': {}".format(handle.path, exc), color='r')
+        with handle._lock:
+          handle._frames.clear()
+          handle._scheduled = False
+          handle._closing = True
+          release = not handle._released
+          handle._released = True
+        if release:
+          try:
+            handle.writer.release()
+          except Exception:
+            pass
+        handle._room.set()
+        handle._closed.set()
+        self._on_handle_closed(handle)
+      #end try-except
+    #endwhile
+    return
+
+
+class PreEventBuffer:
+  """
+  Ring buffer of the most recent frames of a stream (at most `seconds` old and `seconds * fps` frames).
+  """
+  def __init__(self, seconds=10, fps=25):
+    self.seconds = seconds
+    self._frames = deque(maxlen=max(int(seconds * fps), 1))
+    return
+
+  def __len__(self):
+    return len(self._frames)
+
+  def append(self, frame, ts=None):
+    ts = time() if ts is None else ts
+    self._frames.append((ts, frame))
+    while len(self._frames) > 0 and self._frames[0][0] < ts - self.seconds:
+      self._frames.popleft()
+    return
+
+  def drain(self):
+    """
+    Returns the buffered frames (oldest first) and empties the buffer.
+    """
+    frames = [frame for _, frame in self._frames]
+    self._frames.clear()
+    return frames
+
+
+class EventVideoRecorder:
+  """
+  Records clips around events: the frames of a stream are kept in a `PreEventBuffer` and when an event is
+  triggered an asynchronous writer is opened, the buffered frames are written first and then the next
+  frames for `post_seconds`, after which the writer is released. Events triggered while a clip is being
+  recorded extend the clip. The clip is closed by the service at the end of the post-event window even if
+  no more frames arrive (stalled stream).
+  """
+  def __init__(self, pre_seconds=10, post_seconds=20, fps=25):
+    self.post_seconds = post_seconds
+    self.buffer = PreEventBuffer(seconds=pre_seconds, fps=fps)
+    self.handle = None
+    self._stop_ts = None
+    return
+
+  @property
+  def is_recording(self):
+    return self.handle is not None
+
+  def add_frame(self, frame, ts=None):
+    """
+    Adds the frame to the pre-event buffer or, during a clip, writes it. Returns the handle of a clip that
+    was just finished (released) or None.
+    """
+    ts = time() if ts is None else ts
+    finished = self.maybe_close(ts=ts)
+    if self.handle is None:
+      # frames are only referenced: a plugin that draws in place must pass a copy
+      self.buffer.append(frame, ts=ts)
+      return finished
+    self.handle.write(frame)
+    return None
+
+  def maybe_close(self, ts=None):
+    """
+    Releases the clip if its post-event window ended (or the service already closed it). Returns the
+    handle of the finished clip or None.
+    """
+    if self.handle is None:
+      return None
+    ts = time() if ts is None else ts
+    if not self.handle.is_closing and ts < self._stop_ts:
+      return None
+    finished = self.handle
+    finished.release()
+    self.handle = None
+    return finished
+
+  def trigger(self, handle_factory, ts=None):
+    """
+    Starts a clip (or extends the current one). `handle_factory` is called only when a new clip starts and
+    must return an `AsyncVideoHandle`.
+    """
+    ts = time() if ts is None else ts
+    self._stop_ts = ts + self.post_seconds
+    if self.handle is not None and not self.handle.set_close_time(self._stop_ts):
+      # closed by the service in the meantime - a new clip is started
+      self.handle = None
+    if self.handle is None:
+      self.handle = handle_factory()
+      frames = self.buffer.drain()
+      # the whole pre-event buffer must fit in the queue on top of the usual headroom
+      self.handle.max_queue += len(frames)
+      for frame in frames:
+        self.handle.write(frame, copy=False)
+      self.handle.set_close_time(self._stop_ts)
+    return self.handle
+
+  def stop(self, wait=False, timeout=None):
+    """
+    Closes the current clip (if any). If `wait` is True blocks until the file is finalized.
+    """
+    if self.handle is not None:
+      self.handle.release(wait=wait, timeout=timeout)
+      self.handle = None
+    return
+
 
 class VideoRecorder(DecentrAIObject):
   """
@@ -13,11 +377,15 @@ class VideoRecorder(DecentrAIObject):
   1. initilize
   2. call `maybe_start` and `write` whenever the input data comes
   3. call `stop` when the recording is done (in the most cases, when an Exception occurs)
+
+  With `use_async=True` the frames are encoded in background by the `VideoWriterService` (frames are
+  dropped if the encoding falls behind); by default they are written synchronously and none is lost.
   """
 
-  def __init__(self, log : Logger, name, **kwargs):
+  def __init__(self, log : Logger, name, use_async=False, **kwargs):
     self._recording = None
     self._name = name
+    self._use_async = use_async
 
     self.__force_stopped = False
     super(VideoRecorder, self).__init__(log=log, prefix_log='[VREC]', **kwargs)
@@ -46,6 +414,8 @@ class VideoRecorder(DecentrAIObject):
     fourcc = cv2.VideoWriter_fourcc(*'XVID')
     fps = 25
     out = cv2.VideoWriter(path, fourcc, fps, (width, height))
+    if self._use_async:
+      out = VideoWriterService(log=self.log).create_handle(writer=out, path=path)
     self._recording = {
       'CODEC': out,
       'PATH': path
@@ -69,7 +439,7 @@ class VideoRecorder(DecentrAIObject):
   def write(self, frame):
     self._recording['CODEC'].write(frame)
 
-    size_gb = os.path.getsize(self._recording['PATH']) / (2**30)
+    size_gb = os.path.getsize(self._recording['PATH']) / (2**30) if os.path.isfile(self._recording['PATH']) else 0
     thr_gb = 10.0
 
     if size_gb >= thr_gb:
@@ -79,3 +449,12 @@ class VideoRecorder(DecentrAIObject):
     #endif
     return
 
+
+def shutdown_video_writer_service(timeout=WAIT_ON_SHUTDOWN):
+  """
+  Flushes and closes the open videos of the service (if it was started) and stops its workers.
+  """
+  instance = getattr(VideoWriterService, '_instance', None)
+  if instance is not None:
+    instance.shutdown(timeout=timeout)
+  return
@@ -0,0 +1,44 @@
+"""
+Check of the meta types NMS on the columnar detections: the result must be the same as on the
+classic lists of dicts and the upstream (shared) inferences must not be modified - the filtered batch
+rows refer to them when the objects are materialized.
+"""
+import numpy as np
+
+from naeural_core import constants as ct
+from naeural_core.business.base.cv_plugin_executor import CVPluginExecutor
+from naeural_core.utils.detection_batch import DetectionBatch, materialize_inferences
+
+if __name__ == '__main__':
+  AI_ENGINE = 'DETECTOR'
+  META_TYPE_MAPPING = {'vehicle': ['car', 'truck']}
+  CLASS_NAMES = ['person', 'car', 'truck']
+
+  # two overlapping vehicles (the truck is dropped by the meta type NMS) and a person
+  batch = DetectionBatch(
+    tlbr=np.array([[0, 0, 100, 100], [2, 2, 101, 101], [200, 200, 300, 300], [5, 5, 95, 95]]),
+    prob=np.array([0.9, 0.6, 0.8, 0.7], dtype=np.float32),
+    class_ids=np.array([1, 2, 0, 0]),
+    class_names=CLASS_NAMES,
+  )
+  # CONFIDENCE_THRESHOLD=0 and OBJECT_TYPE=[] return the upstream dict as the plugin inferences
+  dct_global = {AI_ENGINE: [batch]}
+  dct_plugin = CVPluginExecutor._maybe_process_meta_types(
+    dct_global, meta_type_mapping=META_TYPE_MAPPING, ai_engine=AI_ENGINE,
+  )
+  assert dct_global[AI_ENGINE][0] is batch, "upstream inferences were modified"
+
+  lst_global = materialize_inferences(dct_global)[AI_ENGINE][0]
+  lst_columnar = dct_plugin[AI_ENGINE][0].select_objects(lst_global)
+
+  dct_classic = CVPluginExecutor._maybe_process_meta_types(
+    {AI_ENGINE: [batch.to_list()]}, meta_type_mapping=META_TYPE_MAPPING, ai_engine=AI_ENGINE,
+  )
+  lst_classic = dct_classic[AI_ENGINE][0]
+
+  assert len(lst_columnar) == len(lst_classic) == 3, (lst_columnar, lst_classic)
+  for obj_columnar, obj_classic in zip(lst_columnar, lst_classic):
+    assert obj_columnar[ct.TLBR_POS] == obj_classic[ct.TLBR_POS]
+    assert obj_columnar[ct.TYPE] == obj_classic[ct.TYPE]
+    assert obj_columnar.get(ct.META_TYPE) == obj_classic.get(ct.META_TYPE)
+  print("Columnar meta types NMS OK: {}".format(lst_columnar))